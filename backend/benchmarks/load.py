@@ -0,0 +1,191 @@
+"""
+Load generator for the main routes of a running instance (local Postgres/Redis, Google Books replaced by
+`src.integrations.api.books.fake_google_books`). Every endpoint is loaded on its own for `--duration`
+seconds by `--concurrency` clients; throughput and latency percentiles per endpoint are written to a JSON
+file that can be compared with the file of another commit:
+
+    python -m benchmarks.load --api-key KEY --duration 30 --concurrency 32 --output load-after.json
+    python -m benchmarks.load --compare load-before.json load-after.json
+
+`--no-cache` sends `Cache-Control: no-store`, so the response cache is bypassed and the database is measured.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import random
+import subprocess
+import time
+from collections import Counter
+from typing import Callable
+
+import aiohttp
+
+from src.integrations.api.books.fake_google_books import WORDS
+
+API = '/api/v1'
+
+# endpoint name -> (path, params); `{word}`, `{isbn}` and `{api_key}` are filled in per request
+ENDPOINTS: dict[str, tuple[str, dict[str, str]]] = {
+    "search_local": (f"{API}/books/search", {"query": "{word}", "source": "local"}),
+    "search_remote": (f"{API}/books/search", {"query": "{word}", "source": "remote"}),
+    "isbn": (f"{API}/books/isbn", {"isbn": "{isbn}", "api_key": "{api_key}"}),
+    "library_page": (f"{API}/books/", {"limit": "100", "api_key": "{api_key}"}),
+    "library_stream": (f"{API}/books/", {"stream": "true", "api_key": "{api_key}"}),
+}
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(latencies: list[float], statuses: Counter, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    requests = sum(statuses.values())
+    return {
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if not 200 <= status < 300),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.,
+        },
+    }
+
+
+async def load_endpoint(session: aiohttp.ClientSession,
+                        base_url: str,
+                        make_params: Callable[[], dict[str, str]],
+                        path: str,
+                        duration: float,
+                        concurrency: int,
+                        headers: dict[str, str],
+                        ) -> dict:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def client() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.get(base_url + path, params=make_params(), headers=headers) as resp:
+                    await resp.read()
+                    status = resp.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+async def sample_isbns(session: aiohttp.ClientSession, base_url: str, api_key: str) -> list[str]:
+    """ISBNs of the user's library, so `isbn` requests hit existing books"""
+    async with session.get(f"{base_url}{API}/books/", params={"limit": "1000", "api_key": api_key}) as resp:
+        if resp.status != 200:
+            return []
+        page = await resp.json()
+    return [book["ISBN"] for book in page["items"] if book.get("ISBN")]
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rnd = random.Random(args.seed)
+    headers = {"Cache-Control": "no-store"} if args.no_cache else {}
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        isbns = await sample_isbns(session, args.base_url, args.api_key) or ['0000000000']
+
+        def make_params(template: dict[str, str]) -> Callable[[], dict[str, str]]:
+            return lambda: {
+                name: value.format(word=rnd.choice(WORDS), isbn=rnd.choice(isbns), api_key=args.api_key)
+                for name, value in template.items()
+            }
+
+        results = {}
+        for name in args.endpoints:
+            path, template = ENDPOINTS[name]
+            if args.warmup:
+                await load_endpoint(session, args.base_url, make_params(template), path, args.warmup,
+                                    args.concurrency, headers)
+            results[name] = await load_endpoint(session, args.base_url, make_params(template), path,
+                                                args.duration, args.concurrency, headers)
+            print(f"{name:<16}{results[name]['throughput_rps']:>10.1f} rps"
+                  f"{results[name]['latency_ms']['p50']:>10.1f}{results[name]['latency_ms']['p95']:>10.1f}"
+                  f"{results[name]['latency_ms']['p99']:>10.1f} ms (p50/p95/p99)"
+                  f"{results[name]['errors']:>8} errors")
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.utcnow().isoformat(),
+        "base_url": args.base_url,
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "cache": not args.no_cache,
+        "endpoints": results,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path: str, after_path: str) -> None:
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before.get('commit') or before_path} -> {after.get('commit') or after_path}")
+    print(f"{'endpoint':<16}{'metric':<16}{'before':>12}{'after':>12}{'change':>10}")
+    for name, result in after["endpoints"].items():
+        if name not in before["endpoints"]:
+            continue
+        previous = before["endpoints"][name]
+        rows = [("throughput_rps", previous["throughput_rps"], result["throughput_rps"])]
+        rows += [(f"{p}_ms", previous["latency_ms"][p], result["latency_ms"][p]) for p in ("p50", "p95", "p99")]
+        for metric, old, new in rows:
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"{name:<16}{metric:<16}{old:>12.2f}{new:>12.2f}{change:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--api-key', help="API key of a user with a populated library")
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--duration', type=float, default=30, help="seconds per endpoint")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds per endpoint before measuring")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--timeout', type=float, default=30, help="seconds per request")
+    parser.add_argument('--no-cache', action='store_true', help="bypass the response cache")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='load.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.api_key is None:
+        parser.error("--api-key is required to load the authenticated endpoints")
+    result = asyncio.run(run(args))
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
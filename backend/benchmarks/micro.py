@@ -0,0 +1,93 @@
+"""
+Microbenchmarks of the per-request CPU work: Google Books parsing, `to_DTO()`, the response cache key
+builders and password hashing. Runs with pytest-benchmark; results can be saved and compared across commits:
+
+    python -m pytest benchmarks/micro.py --benchmark-autosave
+    python -m pytest benchmarks/micro.py --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+from fastapi_cache import FastAPICache
+
+from benchmarks.serialization import make_rows, make_users
+from src.cache import key_builders
+from src.cache.invalidation import InvalidationBus
+from src.cache.tags import CacheTags
+from src.integrations.api.books.fake_google_books import volume, volume_id
+from src.integrations.api.books.google_books import GoogleBooksAPI
+from src.schemas.books import SearchSource
+from src.services.users import PasswordService
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def local_cache_tags(monkeypatch):
+    """Tag generations served from the in-process map only, so Redis round trips are not measured"""
+    monkeypatch.setattr(key_builders, 'cache_tags', CacheTags(None, InvalidationBus(None), ttl=3600))
+    monkeypatch.setattr(FastAPICache, '_prefix', 'fastapi-cache')
+
+
+def test_parse_volume(benchmark):
+    data = volume(volume_id(1))
+    book = benchmark(GoogleBooksAPI.parse_volume, data)
+    assert book.gb_id == data["id"]
+
+
+def test_parse_search_page(benchmark):
+    items = [volume(volume_id(i)) for i in range(40)]
+    books = benchmark(lambda: [GoogleBooksAPI.parse_volume(item) for item in items])
+    assert len(books) == 40
+
+
+def test_books_to_DTO(benchmark):
+    rows = make_rows(100)
+    books = benchmark(lambda: [row.to_DTO() for row in rows])
+    assert len(books) == 100
+
+
+def test_users_to_DTO(benchmark):
+    rows = make_users(100)
+    users = benchmark(lambda: [row.to_DTO() for row in rows])
+    assert len(users) == 100
+
+
+def test_canonical_params(benchmark):
+    params = {"query": "python", "categories": ["b", "a", "a"], "source": SearchSource.auto, "isbn": None}
+    assert benchmark(key_builders.canonical_params, params) == "categories=a&categories=b&query=python&source=auto"
+
+
+def test_default_key_builder(benchmark, loop, local_cache_tags):
+    async def search():
+        pass
+
+    kwargs = {"uow": object(), "query": "python", "categories": ["a", "b"], "source": SearchSource.auto}
+    key = benchmark(lambda: loop.run_until_complete(key_builders.default_key_builder(search, kwargs=kwargs)))
+    assert key.startswith('fastapi-cache:')
+
+
+def test_tagged_key_builder(benchmark, loop, local_cache_tags):
+    async def get_user_library_page():
+        pass
+
+    key_builder = key_builders.tagged_key_builder(lambda params: [f"user:{params['current_user'].id}:library"])
+    kwargs = {"uow": object(), "limit": 100, "cursor": None, "current_user": Mock(id=7)}
+    key = benchmark(lambda: loop.run_until_complete(key_builder(get_user_library_page, kwargs=kwargs)))
+    assert ':user:7:' in key
+
+
+def test_password_hash(benchmark):
+    hashed = benchmark.pedantic(PasswordService.get_password_hash, args=('correct horse',), rounds=5)
+    assert hashed
+
+
+def test_password_verify(benchmark):
+    hashed = PasswordService.get_password_hash('correct horse')
+    assert benchmark.pedantic(PasswordService.verify_password, args=('correct horse', hashed), rounds=5)
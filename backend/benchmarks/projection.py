@@ -0,0 +1,67 @@
+"""
+Rows/sec of the user library read: full ORM entities + `to_DTO()` versus the Core column projection.
+
+Runs against the configured database (DB__* settings), so the user's library must be populated first.
+
+    python -m benchmarks.projection --user-id 1 --repeat 20
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import select
+
+from src.database.database import async_session_maker, engine
+from src.models import Books, books_users_association_table
+from src.repositories import BooksRepository
+from src.schemas.books import BookDTO
+
+
+async def entities(repo: BooksRepository, user_id: int) -> list[BookDTO]:
+    stmt = select(Books).join(books_users_association_table).where(
+        books_users_association_table.c.right_id == user_id
+    )
+    res = await repo.session.execute(stmt)
+    books = [row[0].to_DTO() for row in res.all()]
+    repo.session.expunge_all()
+    return books
+
+
+async def projection(repo: BooksRepository, user_id: int) -> list[BookDTO]:
+    return await repo.get_user_library(user_id)
+
+
+async def measure(fn: Callable[[BooksRepository, int], Awaitable[list[BookDTO]]],
+                  user_id: int,
+                  repeat: int,
+                  ) -> tuple[int, float]:
+    """Rows per read and the best rows/sec"""
+    best = float('inf')
+    rows = 0
+    async with async_session_maker() as session:
+        repo = BooksRepository(session)
+        await fn(repo, user_id)  # warm up the statement cache
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = len(await fn(repo, user_id))
+            best = min(best, time.perf_counter() - start)
+    return rows, rows / best if best else 0.
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    engine.echo = False
+    print(f"{'path':<12}{'rows':>10}{'rows/sec':>14}")
+    for name, fn in (('entities', entities), ('projection', projection)):
+        rows, rate = await measure(fn, args.user_id, args.repeat)
+        print(f"{name:<12}{rows:>10}{rate:>14.0f}")
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,165 @@
+"""
+Per-row cost of turning rows into a JSON response body.
+
+`before` is the validated path: the DTO is validated in `to_DTO()`, again by FastAPI against the route's
+`response_model`, and encoded with `jsonable_encoder` + the stdlib json encoder. `after` is the trusted path:
+`to_DTO()` as it is now (`model_construct` for users) encoded by `ORJSONResponse`.
+
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import datetime
+import time
+from typing import Any, Callable
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from starlette.responses import JSONResponse
+
+from src.models import Books, Users
+from src.schemas.books import BookAPISchema, BookDTO
+from src.schemas.pagination import PageDTO
+from src.schemas.users import UserDTO
+from src.utils.responses import ORJSONResponse
+
+
+def make_rows(count: int) -> list[Books]:
+    return [
+        Books(
+            id=id,
+            gb_id=f"gb{id:014d}",
+            ISBN=f"{9780000000000 + id}",
+            title=f"Book {id}",
+            subtitle="A subtitle",
+            description="Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+            language="en",
+            pub_date="2020-01-01",
+            categories="Computers, Programming",
+            category_ids=[1, 2],
+            authors="Jane Doe, John Doe",
+            author_ids=[1, 2],
+        )
+        for id in range(1, count + 1)
+    ]
+
+
+def make_users(count: int) -> list[Users]:
+    permissions = {
+        "can_view_users": True,
+        "can_add_users": False,
+        "can_ban_users": False,
+        "can_delete_users": False,
+        "can_edit_user_profile": True,
+        "can_edit_user_permissions": False,
+        "super_user": False,
+    }
+    return [
+        Users(
+            id=id,
+            name=f"User {id}",
+            email=f"user{id}@example.com",
+            username=f"user{id}",
+            password="hash",
+            banned=False,
+            permissions=permissions,
+            excluded_category_ids=[1],
+            token_version=0,
+            created_at=datetime.datetime(2024, 1, 1),
+        )
+        for id in range(1, count + 1)
+    ]
+
+
+def validated_book_dto(row: Books) -> BookDTO:
+    return BookDTO(
+        id=row.id,
+        gb_id=row.gb_id,
+        ISBN=row.ISBN,
+        title=row.title,
+        subtitle=row.subtitle,
+        description=row.description,
+        language=row.language,
+        pub_date=row.pub_date,
+        categories=row.categories,
+        category_ids=row.category_ids,
+        authors=row.authors,
+        author_ids=row.author_ids,
+    )
+
+
+def fastapi_body(response_model: Any, content: Any) -> bytes:
+    field = create_response_field(name='response', type_=response_model, mode='serialization')
+    return JSONResponse(asyncio.run(serialize_response(field=field, response_content=content))).body
+
+
+def library_before(rows: list[Books]) -> bytes:
+    return fastapi_body(PageDTO[BookDTO], PageDTO(items=[validated_book_dto(row) for row in rows]))
+
+
+def library_after(rows: list[Books]) -> bytes:
+    return ORJSONResponse(PageDTO(items=[row.to_DTO() for row in rows])).body
+
+
+def users_before(rows: list[Users]) -> bytes:
+    return fastapi_body(list[UserDTO], [
+        UserDTO(
+            id=row.id,
+            name=row.name,
+            email=row.email,
+            username=row.username,
+            password=None,
+            banned=row.banned,
+            permissions=row.permissions,
+            excluded_category_ids=row.excluded_category_ids,
+            token_version=row.token_version,
+            created_at=row.created_at,
+        )
+        for row in rows
+    ])
+
+
+def users_after(rows: list[Users]) -> bytes:
+    return ORJSONResponse([row.to_DTO() for row in rows]).body
+
+
+def search_before(books: list[BookAPISchema]) -> bytes:
+    return fastapi_body(list[BookAPISchema], books)
+
+
+def search_after(books: list[BookAPISchema]) -> bytes:
+    return ORJSONResponse(books).body
+
+
+def measure(fn: Callable[[Any], bytes], arg: Any, rows: int, repeat: int) -> float:
+    """Best per-row time in microseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best / rows * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    books = [BookAPISchema.model_validate(validated_book_dto(row).model_dump()) for row in rows]
+
+    print(f"{'case':<20}{'before, us/row':>16}{'after, us/row':>16}{'speedup':>10}")
+    for name, before, after, arg in (
+            ('get_user_library', library_before, library_after, rows),
+            ('search', search_before, search_after, books),
+            ('users', users_before, users_after, make_users(args.rows)),
+    ):
+        before_us = measure(before, arg, args.rows, args.repeat)
+        after_us = measure(after, arg, args.rows, args.repeat)
+        print(f"{name:<20}{before_us:>16.2f}{after_us:>16.2f}{before_us / after_us:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
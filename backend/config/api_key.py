@@ -10,5 +10,8 @@ class Settings(BaseSettings):
 
     LENGTH: int
 
+    CACHE_TTL: int = 60
+    CACHE_MAX_SIZE: int = 10000
+
 
 api_key_settings = Settings()
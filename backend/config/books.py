@@ -0,0 +1,30 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        case_sensitive=True,
+        env_prefix='BOOKS__'
+    )
+
+    BULK_MAX_ITEMS: int = 1000
+    BULK_FETCH_CONCURRENCY: int = 10
+
+    LOCAL_SEARCH_LIMIT: int = 10
+    LOCAL_SEARCH_MIN_HITS: int = 5
+
+    STREAM_BATCH_SIZE: int = 500
+    STREAM_CHUNK_SIZE: int = 64 * 1024
+
+    # Redis Streams queue filling the metadata of books added to a library by gb_id
+    ENRICHMENT_BATCH_SIZE: int = 20
+    ENRICHMENT_BLOCK_MS: int = 1000
+    ENRICHMENT_MAX_ATTEMPTS: int = 10
+    # unacknowledged entries (retries, entries of a crashed worker) are claimed again after this idle time
+    ENRICHMENT_CLAIM_IDLE_MS: int = 30_000
+    ENRICHMENT_STREAM_MAXLEN: int = 100_000
+    ENRICHMENT_SWEEP_LIMIT: int = 10_000
+
+
+books_settings = Settings()
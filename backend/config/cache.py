@@ -0,0 +1,24 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        case_sensitive=True,
+        env_prefix='CACHE__'
+    )
+
+    METADATA_L1_MAX_SIZE: int = 10000
+    METADATA_BOOK_TTL: int = 24 * 60 * 60
+    METADATA_SEARCH_TTL: int = 10 * 60
+    METADATA_STALE_TTL: int = 7 * 24 * 60 * 60
+
+    TAG_GENERATION_TTL: int = 5
+
+    # responses are invalidated by their tags, so these only bound the lifetime of unreachable entries
+    LIBRARY_RESPONSE_TTL: int = 10 * 60
+    ISBN_RESPONSE_TTL: int = 60 * 60
+    SEARCH_RESPONSE_TTL: int = 5 * 60
+
+
+cache_settings = Settings()
@@ -20,11 +20,35 @@ class Settings(BaseSettings):
     MAX_POOL_OVERFLOW: int
     POOL_TIMEOUT: int
 
+    # read replica for read-only units of work; unset fields are taken from the primary,
+    # without REPLICA_HOST read-only transactions run on the primary
+    REPLICA_HOST: str | None = None
+    REPLICA_PORT: int | None = None
+    REPLICA_NAME: str | None = None
+    REPLICA_USER: str | None = None
+    REPLICA_PASS: str | None = None
+
+    REPLICA_POOL_SIZE: int | None = None
+    REPLICA_MAX_POOL_OVERFLOW: int | None = None
+
+    # statements slower than this are counted and logged (a SLOW_QUERY_LOG_SAMPLE_RATE share of them),
+    # QUERY_LOG_SAMPLE_RATE of all statements are logged at DEBUG level
+    SLOW_QUERY_MS: float = 200
+    SLOW_QUERY_LOG_SAMPLE_RATE: float = 1.
+    QUERY_LOG_SAMPLE_RATE: float = 0.
+
     DB_AND_DRIVER: str = "postgresql+asyncpg"
 
     @property
     def DSN(self):
         return f"{self.DB_AND_DRIVER}://{self.USER}:{self.PASS}@{self.HOST}:{self.PORT}/{self.NAME}"
 
+    @property
+    def REPLICA_DSN(self) -> str | None:
+        if self.REPLICA_HOST is None:
+            return None
+        return (f"{self.DB_AND_DRIVER}://{self.REPLICA_USER or self.USER}:{self.REPLICA_PASS or self.PASS}"
+                f"@{self.REPLICA_HOST}:{self.REPLICA_PORT or self.PORT}/{self.REPLICA_NAME or self.NAME}")
+
 
 db_settings = Settings()
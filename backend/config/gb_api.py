@@ -11,5 +11,25 @@ class Settings(BaseSettings):
     BASE_URL: str
     API_VERSION: str
 
+    POOL_SIZE: int = 100
+    POOL_SIZE_PER_HOST: int = 30
+    KEEPALIVE_TIMEOUT: float = 30
+    DNS_CACHE_TTL: int = 300
+    CONNECT_TIMEOUT: float = 3
+    READ_TIMEOUT: float = 10
+
+    # a call (with its retries) fails after DEADLINE seconds
+    DEADLINE: float = 8
+    MAX_RETRIES: int = 2
+    RETRY_BACKOFF_BASE: float = 0.1
+    RETRY_BACKOFF_CAP: float = 1
+    # retries (and hedged requests) allowed per call made in the last 10 seconds, on top of a minimum rate
+    RETRY_BUDGET_RATIO: float = 0.1
+    RETRY_BUDGET_MIN_PER_SECOND: float = 1
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_TIMEOUT: float = 30
+    # volume lookups still running after HEDGE_AFTER seconds are sent a second time; unset disables hedging
+    HEDGE_AFTER: float | None = None
+
 
 gb_api_settings = Settings()
@@ -13,5 +13,8 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     REFRESH_TOKEN_EXPIRE_HOURS: int
 
+    TOKEN_VERSION_CACHE_TTL: int = 5
+    TOKEN_VERSION_REDIS_TTL: int = 3600
+
 
 jwt_settings = Settings()
@@ -0,0 +1,17 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        case_sensitive=True,
+        env_prefix='PASSWORD__'
+    )
+
+    EXECUTOR: str = 'thread'
+    WORKERS: int = 4
+    MAX_QUEUE: int = 64
+    QUEUE_TIMEOUT: float = 2
+
+
+password_settings = Settings()
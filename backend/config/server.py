@@ -12,6 +12,11 @@ class Settings(BaseSettings):
     PORT: int
 
     LOG_LEVEL: str = 'DEBUG'
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_MAX_BYTES: int = 5 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 10
+    LOG_PAYLOAD_MAX_CHARS: int = 1000
+    LOG_PAYLOAD_SAMPLE_RATE: float = 0.01
 
 
 server_settings = Settings()
@@ -0,0 +1,52 @@
+import asyncio
+import contextlib
+from typing import Callable, ContextManager
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.database.database import engine
+from src.database.instrumentation import QueryStats, track_queries
+
+# issued by the test transaction around the code under test, not by the code itself
+TEST_TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+@pytest.fixture
+def query_budget() -> Callable[[int], ContextManager[QueryStats]]:
+    """
+    Fails the test when the block runs more than `max_queries` SQL statements:
+
+        with query_budget(2):
+            await LibraryService.add_one_in_user_library(uow, user, id=book_id)
+    """
+    @contextlib.contextmanager
+    def budget(max_queries: int):
+        with track_queries(QueryStats('query-budget', record=True)) as stats:
+            yield stats
+        queries = [statement for statement in stats.statements
+                   if not statement.startswith(TEST_TRANSACTION_STATEMENTS)]
+        assert len(queries) <= max_queries, (
+            f"{len(queries)} queries, the budget is {max_queries}:\n" + '\n'.join(queries)
+        )
+    return budget
+
+
+@pytest_asyncio.fixture
+async def db_session_factory():
+    """
+    Session factory bound to one connection of the configured database (DB__*) whose transaction is rolled
+    back after the test; commits only release savepoints. Skips the test when the database is not reachable.
+    """
+    try:
+        connection = await asyncio.wait_for(engine.connect(), timeout=3)
+    except (OSError, asyncio.TimeoutError, DBAPIError) as e:
+        pytest.skip(f"database is not available: {e!r}")
+    transaction = await connection.begin()
+    yield async_sessionmaker(
+        bind=connection, class_=AsyncSession, expire_on_commit=False, join_transaction_mode='create_savepoint'
+    )
+    await transaction.rollback()
+    await connection.close()
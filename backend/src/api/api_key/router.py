@@ -1,16 +1,18 @@
 import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette.responses import JSONResponse
 
 from config.api_key import api_key_settings
+from src.schemas.pagination import PageDTO
 from src.schemas.users import UserDTO, UserAPIKeyDTO
 from src.services.users import APIKeyService, JWTService
 from src.utils.oauth2 import OAuth2RefreshRequestForm
 from src.utils.session_context_manager import SessionContextManager, AbstractSessionContextManager
 from src.utils import exceptions, responses
+from src.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(
     prefix='/apikey',
@@ -43,15 +45,18 @@ async def create_api_token(
 
 @router.get(
     path='/',
-    response_model=list[UserAPIKeyDTO],
+    response_model=PageDTO[UserAPIKeyDTO],
     responses={
+        **exceptions.NotAcceptableHTTPException.docs(),
         **exceptions.ForbiddenHTTPException.docs(),
     })
 async def get_all_api_tokens(
         session_: Annotated[SessionContextManager, Depends(SessionContextManager)],
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str | None = None,
         current_user=Depends(JWTService.get_current_user)
 ):
-    return await APIKeyService.get_all(session_, current_user)
+    return responses.ORJSONResponse(await APIKeyService.get_page(session_, current_user, limit, cursor))
 
 
 @router.delete(
@@ -1,14 +1,25 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, Depends, Query, Request, Response
+from starlette.responses import StreamingResponse
 
-from src.schemas.books import BookDTO, BookAPISchema
+from config.books import books_settings
+from config.cache import cache_settings
+from src.cache.decorator import cache
+from src.cache.key_builders import tagged_key_builder
+from src.cache.tags import CATALOG_TAG, book_tag, library_tag
+from src.schemas.books import (
+    BookDTO, BookAPISchema, BooksBulkAddSchema, BookBulkAddResultSchema, CategoryDTO, SearchSource
+)
+from src.schemas.pagination import PageDTO
 from src.schemas.users import UserDTO
 from src.services.books import BooksService, LibraryService
 from src.services.users import APIKeyService
 
 from src.utils import exceptions, responses
+from src.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from src.utils.streaming import NDJSON_MEDIA_TYPE, encode_json_stream
+from src.utils.utils import normalize_isbn
 from src.utils.unitofwork import UnitOfWork
 
 router = APIRouter(
@@ -24,23 +35,40 @@ router = APIRouter(
         **exceptions.NotFoundHTTPException.docs(),
         **exceptions.ForbiddenHTTPException.docs(),
     })
-@cache(expire=3)
+@cache(expire=cache_settings.SEARCH_RESPONSE_TTL, key_builder=tagged_key_builder(lambda params: [CATALOG_TAG]))
 async def search(
+        uow: Annotated[UnitOfWork, Depends(UnitOfWork)],
         gb_id: str | None = None,
         query: str | None = None,
         intitle: str | None = None,
         inauthor: str | None = None,
         isbn: str | None = None,
         categories: list[str] | None = None,
+        source: SearchSource = SearchSource.auto,
+        current_user: UserDTO | None = Depends(APIKeyService.get_optional_user)
 ):
-    return await BooksService.search(
+    return responses.ORJSONResponse(await BooksService.search(
+        uow,
         gb_id,
         query,
         intitle,
         inauthor,
         isbn,
-        categories
-    )
+        categories,
+        source,
+        current_user
+    ))
+
+
+@router.get(
+    path='/categories',
+    response_model=list[CategoryDTO],
+)
+@cache(expire=cache_settings.SEARCH_RESPONSE_TTL, key_builder=tagged_key_builder(lambda params: [CATALOG_TAG]))
+async def get_categories(
+        uow: Annotated[UnitOfWork, Depends(UnitOfWork)],
+):
+    return responses.ORJSONResponse(await BooksService.get_categories(uow))
 
 
 @router.get(
@@ -51,28 +79,70 @@ async def search(
         **exceptions.NotAcceptableHTTPException.docs(),
         **exceptions.ForbiddenHTTPException.docs(),
     })
-@cache(expire=3)
+@cache(
+    expire=cache_settings.ISBN_RESPONSE_TTL,
+    key_builder=tagged_key_builder(lambda params: [book_tag(normalize_isbn(params['isbn']))]),
+)
 async def get_by_ISBN(
         uow: Annotated[UnitOfWork, Depends(UnitOfWork)],
         isbn: str,
         current_user: UserDTO = Depends(APIKeyService.get_current_user)
 ):
-    return await BooksService.get_by_ISBN(uow, current_user, isbn)
+    return responses.ORJSONResponse(await BooksService.get_by_ISBN(uow, current_user, isbn))
 
 
 @router.get(
     path='/',
-    response_model=list[BookDTO],
+    response_model=PageDTO[BookDTO],
     responses={
+        200: {
+            "description": "A page of the library. With `stream=true` or `Accept: application/x-ndjson` the whole "
+                           "library is streamed as a JSON array or as NDJSON and `limit`/`cursor` are ignored",
+            "content": {NDJSON_MEDIA_TYPE: {}},
+        },
         **exceptions.NotFoundHTTPException.docs(),
+        **exceptions.NotAcceptableHTTPException.docs(),
         **exceptions.ForbiddenHTTPException.docs(),
     })
-@cache(expire=3)
 async def get_user_library(
+        request: Request,
+        response: Response,
         uow: Annotated[UnitOfWork, Depends(UnitOfWork)],
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str | None = None,
+        stream: bool = False,
         current_user: UserDTO = Depends(APIKeyService.get_current_user)
 ):
-    return await LibraryService.get_user_library(uow, current_user)
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get('accept', '')
+    if stream or ndjson:
+        return StreamingResponse(
+            encode_json_stream(
+                # the stream is not cached, so it can be served from the replica
+                LibraryService.stream_user_library(UnitOfWork.read_only(request), current_user),
+                ndjson=ndjson,
+                chunk_size=books_settings.STREAM_CHUNK_SIZE,
+            ),
+            media_type=NDJSON_MEDIA_TYPE if ndjson else 'application/json',
+        )
+    return await get_user_library_page(
+        request=request, response=response, uow=uow, limit=limit, cursor=cursor, current_user=current_user
+    )
+
+
+# streamed responses can not be cached, so only the paginated variant goes through the cache
+@cache(
+    expire=cache_settings.LIBRARY_RESPONSE_TTL,
+    key_builder=tagged_key_builder(lambda params: [library_tag(params['current_user'].id)]),
+)
+async def get_user_library_page(
+        request: Request,
+        response: Response,
+        uow: UnitOfWork,
+        limit: int,
+        cursor: str | None,
+        current_user: UserDTO,
+):
+    return responses.ORJSONResponse(await LibraryService.get_user_library_page(uow, current_user, limit, cursor))
 
 
 @router.post(
@@ -85,13 +155,29 @@ async def get_user_library(
 async def add_book_in_user_library(
         uow: Annotated[UnitOfWork, Depends(UnitOfWork)],
         id: int | None = None,
-        gb_id: str | None = None,
+        # stored as is in the placeholder row (books.gb_id is String(16)) before Google Books knows about it
+        gb_id: str | None = Query(None, min_length=1, max_length=16, pattern=r'^[\w-]+$'),
         current_user: UserDTO = Depends(APIKeyService.get_current_user)
 ):
     lib_id = await LibraryService.add_one_in_user_library(uow, current_user, id, gb_id)
     return responses.ObjectCreated.response(id=lib_id)
 
 
+@router.post(
+    path='/bulk',
+    response_model=list[BookBulkAddResultSchema],
+    responses={
+        **exceptions.NotAcceptableHTTPException.docs(),
+        **exceptions.ForbiddenHTTPException.docs(),
+    })
+async def add_books_in_user_library(
+        uow: Annotated[UnitOfWork, Depends(UnitOfWork)],
+        books: BooksBulkAddSchema,
+        current_user: UserDTO = Depends(APIKeyService.get_current_user)
+):
+    return responses.ORJSONResponse(await LibraryService.add_many_in_user_library(uow, current_user, books))
+
+
 @router.delete(
     path='/',
     responses={
@@ -37,7 +37,7 @@ async def login_for_tokens(
         password=form_data.password
     )
     token_type, access_token, refresh_token = JWTService.create_tokens(
-        {"username": user.username}
+        JWTService.get_token_data(user)
     )
     return {
         "token_type": token_type,
@@ -66,7 +66,7 @@ async def get_refresh_token(
         form_data: Annotated[OAuth2RefreshRequestForm, Depends()]):
     user = await JWTService.authenticate_by_token(session, form_data.refresh_token)
     token_type, access_token, refresh_token = JWTService.create_tokens(
-        {"username": user.username}
+        JWTService.get_token_data(user)
     )
     return {
         "token_type": token_type,
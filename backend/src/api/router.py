@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+
+from src.utils.session_context_manager import request_session
 
 from .jwt.router import router as jwt_router
 from .api_key.router import router as api_key_router
@@ -7,7 +9,9 @@ from .books.router import router as books_router
 
 
 router = APIRouter(
-    prefix='/api/v1'
+    prefix='/api/v1',
+    # one DB session per request, shared by the auth dependencies and the handler
+    dependencies=[Depends(request_session)],
 )
 
 
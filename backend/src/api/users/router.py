@@ -38,11 +38,11 @@ async def create_user(
         **exceptions.ForbiddenHTTPException.docs(),
     })
 async def get_user(
-        uow: Annotated[UnitOfWork, Depends(UnitOfWork)],
+        uow: Annotated[UnitOfWork, Depends(UnitOfWork.read_only)],
         user_id: int | None = None,
         current_user: UserDTO = Depends(JWTService.get_current_user)
 ):
-    return await UsersService.get(uow, current_user, user_id)
+    return responses.ORJSONResponse(await UsersService.get(uow, current_user, user_id))
 
 
 @router.patch(
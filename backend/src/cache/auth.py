@@ -0,0 +1,82 @@
+import datetime
+import hashlib
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from config.api_key import api_key_settings
+from src.schemas.users import UserDTO
+from .invalidation import InvalidationBus, invalidation_bus
+
+
+class CachedAPIKeyUser(NamedTuple):
+    user: UserDTO
+    expire_date: datetime.date
+    cached_until: float
+
+
+class APIKeyAuthCache:
+    """
+    In-process cache of API key -> (user, key expire date) used by APIKeyService.get_current_user.
+
+    Entries live for `ttl` seconds at most and are dropped on every worker as soon as the key or its owner
+    is invalidated through the invalidation bus. Keys are stored hashed.
+    """
+    def __init__(self, bus: InvalidationBus, ttl: int, max_size: int):
+        self.bus = bus
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, CachedAPIKeyUser] = OrderedDict()
+        self._keys_by_user: dict[int, set[str]] = {}
+
+        self.bus.subscribe('api_key', self._drop_key)
+        self.bus.subscribe('user', self._drop_user)
+
+    def get(self, api_key: str) -> tuple[UserDTO, datetime.date] | None:
+        key = self._hash(api_key)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.cached_until <= time.monotonic():
+            self._drop_key(key)
+            return None
+        return entry.user, entry.expire_date
+
+    def set(self, api_key: str, user: UserDTO, expire_date: datetime.date) -> None:
+        key = self._hash(api_key)
+        self._drop_key(key)
+        self._entries[key] = CachedAPIKeyUser(user, expire_date, time.monotonic() + self.ttl)
+        self._keys_by_user.setdefault(user.id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._drop_key(next(iter(self._entries)))
+
+    async def invalidate_key(self, api_key: str) -> None:
+        await self.bus.publish('api_key', self._hash(api_key))
+
+    async def invalidate_user(self, user_id: int) -> None:
+        await self.bus.publish('user', user_id)
+
+    def _drop_key(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_user.get(entry.user.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry.user.id]
+
+    def _drop_user(self, user_id: int) -> None:
+        for key in list(self._keys_by_user.get(user_id, ())):
+            self._drop_key(key)
+
+    @staticmethod
+    def _hash(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+api_key_auth_cache = APIKeyAuthCache(
+    invalidation_bus,
+    ttl=api_key_settings.CACHE_TTL,
+    max_size=api_key_settings.CACHE_MAX_SIZE,
+)
@@ -0,0 +1,15 @@
+from typing import Tuple
+
+from fastapi_cache.backends.redis import RedisBackend
+
+from src.metrics import cache_requests
+
+
+class InstrumentedRedisBackend(RedisBackend):
+    """RedisBackend that counts response cache hits and misses per key namespace (`prefix:namespace:digest`)"""
+    async def get_with_ttl(self, key: str) -> Tuple[int, str]:
+        ttl, value = await super().get_with_ttl(key)
+        parts = key.split(':')
+        namespace = parts[1] if len(parts) > 2 else ''
+        cache_requests.inc(namespace, 'miss' if value is None else 'hit')
+        return ttl, value
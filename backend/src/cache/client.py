@@ -0,0 +1,6 @@
+from redis import asyncio as aioredis
+
+from config.redis import redis_settings
+
+
+redis_client = aioredis.from_url(redis_settings.DSN)
@@ -0,0 +1,24 @@
+from typing import Any
+
+from fastapi_cache.coder import Coder
+from starlette.responses import Response
+
+from src.utils.responses import ORJSONResponse
+
+
+class ORJSONResponseCoder(Coder):
+    """
+    Stores the encoded response body and serves cache hits as a pre-encoded `ORJSONResponse`, so a hit is
+    neither parsed nor revalidated against the route's `response_model`.
+    """
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, Response):
+            return value.body
+        return ORJSONResponse(value).body
+
+    @classmethod
+    def decode(cls, value: bytes | str) -> ORJSONResponse:
+        if isinstance(value, str):
+            value = value.encode()
+        return ORJSONResponse(value)
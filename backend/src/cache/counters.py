@@ -0,0 +1,53 @@
+import time
+from typing import Generic, Hashable, TypeVar
+
+from .invalidation import InvalidationBus
+
+K = TypeVar('K', bound=Hashable)
+
+
+class MonotonicCounters(Generic[K]):
+    """
+    In-process tier of counters that only grow (cache tag generations, token versions), in front of the
+    owner's Redis tier.
+
+    A value is fresh for `ttl` seconds, after which the owner reloads it; the last known value stays
+    available as a fallback. Every write keeps the highest value seen for its key, so a stale read or a late
+    broadcast can never move a counter back. `publish()` sends new values to every worker through the
+    invalidation bus.
+    """
+    def __init__(self, bus: InvalidationBus, topic: str, ttl: int):
+        self.bus = bus
+        self.topic = topic
+        self.ttl = ttl
+        self._values: dict[K, tuple[int, float]] = {}
+
+        self.bus.subscribe(topic, self._on_values)
+
+    def get(self, key: K) -> int | None:
+        """The value if it is still fresh"""
+        cached = self._values.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    def last(self, key: K) -> int | None:
+        """The last known value, fresh or not"""
+        cached = self._values.get(key)
+        return None if cached is None else cached[0]
+
+    def remember(self, key: K, value: int) -> int:
+        """Stores `value` unless a higher one is known and returns the value kept"""
+        cached = self._values.get(key)
+        if cached is not None:
+            value = max(value, cached[0])
+        self._values[key] = (value, time.monotonic() + self.ttl)
+        return value
+
+    async def publish(self, values: dict[K, int]) -> None:
+        # pairs rather than a mapping: JSON would turn integer keys into strings
+        await self.bus.publish(self.topic, list(values.items()))
+
+    def _on_values(self, payload: list[tuple[K, int]]) -> None:
+        for key, value in payload:
+            self.remember(key, value)
@@ -0,0 +1,33 @@
+from functools import wraps
+from typing import Any, Awaitable, Callable
+
+from fastapi_cache.decorator import cache as fastapi_cache
+from starlette.responses import Response
+
+# set by fastapi-cache on the injected `response`
+CACHE_HEADERS = ('cache-control', 'etag')
+
+
+def cache(**kwargs: Any) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """
+    fastapi-cache's `@cache` for routes that return a Response (`ORJSONResponse`, and cache hits are served
+    as one by `ORJSONResponseCoder`).
+
+    fastapi-cache puts `Cache-Control` and `ETag` on the injected `response` parameter, which FastAPI drops
+    when the route returns its own Response; they are copied onto the returned one, so clients get the ETag
+    and `If-None-Match` can be answered with 304.
+    """
+    def wrapper(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        cached = fastapi_cache(**kwargs)(func)
+
+        @wraps(cached)
+        async def inner(*args: Any, **kwargs: Any) -> Any:
+            response: Response | None = kwargs.get('response')
+            result = await cached(*args, **kwargs)
+            if response is not None and isinstance(result, Response) and result is not response:
+                for name in CACHE_HEADERS:
+                    if name in response.headers:
+                        result.headers[name] = response.headers[name]
+            return result
+        return inner
+    return wrapper
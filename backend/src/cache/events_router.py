@@ -1,11 +1,14 @@
 from fastapi import APIRouter
 
-from redis import asyncio as aioredis
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 
-from config.redis import redis_settings
+from src.utils.logger import logger
+from .backend import InstrumentedRedisBackend
+from .client import redis_client
+from .coder import ORJSONResponseCoder
+from .invalidation import invalidation_bus
 from .key_builders import default_key_builder
+from .metadata import books_metadata_cache
 
 
 router = APIRouter()
@@ -13,10 +16,18 @@ router = APIRouter()
 
 @router.on_event("startup")
 async def startup():
-    redis = aioredis.from_url(redis_settings.DSN)
     FastAPICache.init(
-        backend=RedisBackend(redis),
+        backend=InstrumentedRedisBackend(redis_client),
         prefix="fastapi-cache",
         expire=3,
-        key_builder=default_key_builder
+        key_builder=default_key_builder,
+        coder=ORJSONResponseCoder,
     )
+    invalidation_bus.start()
+
+
+@router.on_event("shutdown")
+async def shutdown():
+    logger.info(f"Books metadata cache stats: {books_metadata_cache.stats()}")
+    await invalidation_bus.stop()
+    await redis_client.aclose()
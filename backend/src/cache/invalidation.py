@@ -0,0 +1,77 @@
+import asyncio
+import json
+from collections import defaultdict
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from src.utils.logger import logger
+from .client import redis_client
+
+Handler = Callable[[Any], Awaitable[None] | None]
+
+
+class InvalidationBus:
+    """
+    Broadcasts invalidation messages to every worker over Redis pub/sub.
+
+    `publish()` runs the local handlers right away and then sends the message to the channel, so the
+    publishing worker does not depend on Redis to drop its own entries. Every worker (including the
+    publisher) runs the handlers again when the message arrives; handlers must be idempotent.
+    """
+    def __init__(self, redis: Redis | None, channel: str = 'cache-invalidation'):
+        self.redis = redis
+        self.channel = channel
+        self._handlers: dict[str, list[Handler]] = defaultdict(list)
+        self._listener: asyncio.Task | None = None
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers[topic].append(handler)
+
+    async def publish(self, topic: str, payload: Any) -> None:
+        await self._dispatch(topic, payload)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.publish(self.channel, json.dumps({"topic": topic, "payload": payload}))
+        except Exception as e:
+            logger.warning(f"Error publishing invalidation message '{topic}': {e!r}")
+
+    def start(self) -> None:
+        if self.redis is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        data = json.loads(message["data"])
+                        await self._dispatch(data["topic"], data["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Invalidation listener error, reconnecting: {e!r}")
+                await asyncio.sleep(1)
+
+    async def _dispatch(self, topic: str, payload: Any) -> None:
+        for handler in self._handlers.get(topic, []):
+            res = handler(payload)
+            if asyncio.iscoroutine(res):
+                await res
+
+
+invalidation_bus = InvalidationBus(redis_client)
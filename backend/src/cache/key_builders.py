@@ -1,13 +1,42 @@
-import hashlib
-from typing import Callable, Optional
+import enum
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from urllib.parse import urlencode
 
+import xxhash
 from starlette.requests import Request
 from starlette.responses import Response
 
-from src.utils.logger import logger
+from .tags import cache_tags, user_tag
 
+KeyBuilder = Callable[..., Awaitable[str]]
 
-def default_key_builder(
+# dependencies that never affect the response
+IGNORED_PARAMS = frozenset(('uow', 'session', 'session_', 'request', 'response'))
+
+
+def _canonical_value(value: Any) -> str:
+    if isinstance(value, enum.Enum):
+        value = value.value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def canonical_params(params: dict[str, Any]) -> str:
+    """Query string with sorted names and sorted, de-duplicated list values; `None` values are left out"""
+    items = []
+    for name in sorted(params):
+        value = params[name]
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set, frozenset)):
+            items.extend((name, item) for item in sorted({_canonical_value(item) for item in value}))
+        else:
+            items.append((name, _canonical_value(value)))
+    return urlencode(items)
+
+
+async def default_key_builder(
     func: Callable,
     namespace: Optional[str] = "",
     request: Optional[Request] = None,
@@ -15,38 +44,56 @@ def default_key_builder(
     args: Optional[tuple] = None,
     kwargs: Optional[dict] = None,
 ) -> str:
-    from fastapi_cache import FastAPICache
-    try:
-        kwargs.pop('uow')
-    except KeyError:
-        pass
-    try:
-        kwargs.pop('session')
-    except KeyError:
-        pass
-    cache_key = (
-        f"{FastAPICache.get_prefix()}:{namespace}:"
-        + hashlib.md5(
-            f"{func.__module__}:{func.__name__}:{args}:{kwargs}".encode()
-        ).hexdigest()
-    )
-    return cache_key
-
-
-def exclude_current_user_key_builder(
+    """
+    `prefix:namespace[:user:{id}:{generation}]:hash(params)`.
+
+    The namespace defaults to the cached function. Routes of an authenticated user are keyed by the user id
+    and the generation of the user's tag only, so bumping the tag drops all cached responses of the user.
+    """
+    return await _build_key(func, namespace, kwargs, None)
+
+
+def tagged_key_builder(tags: Callable[[dict[str, Any]], Iterable[str]]) -> KeyBuilder:
+    """
+    Key builder for `@cache(key_builder=...)` of a route whose responses depend on the tagged data.
+
+    `tags` gets the route arguments and returns tags like `user:{id}:library` or `book:{isbn}`. Their current
+    generations are hashed together with the params, so `cache_tags.bump(tag)` after a write makes every
+    response tagged with it unreachable and the route can be cached far longer than its data stays unchanged.
+    """
+    async def key_builder(
+        func: Callable,
+        namespace: Optional[str] = "",
+        request: Optional[Request] = None,
+        response: Optional[Response] = None,
+        args: Optional[tuple] = None,
+        kwargs: Optional[dict] = None,
+    ) -> str:
+        return await _build_key(func, namespace, kwargs, tags)
+    return key_builder
+
+
+async def _build_key(
     func: Callable,
-    namespace: Optional[str] = "",
-    request: Optional[Request] = None,
-    response: Optional[Response] = None,
-    args: Optional[tuple] = None,
-    kwargs: Optional[dict] = None,
+    namespace: Optional[str],
+    kwargs: Optional[dict],
+    tags: Optional[Callable[[dict[str, Any]], Iterable[str]]],
 ) -> str:
     from fastapi_cache import FastAPICache
-    kwargs.pop('current_user')
-    cache_key = (
-        f"{FastAPICache.get_prefix()}:{namespace}:"
-        + hashlib.md5(
-            f"{func.__module__}:{func.__name__}:{args}:{kwargs}".encode()
-        ).hexdigest()
-    )
-    return cache_key
\ No newline at end of file
+    kwargs = kwargs or {}
+    params = {name: value for name, value in kwargs.items() if name not in IGNORED_PARAMS}
+    current_user = params.pop('current_user', None)
+
+    route_tags = sorted(set(tags(kwargs))) if tags is not None else []
+    all_tags = route_tags if current_user is None else [user_tag(current_user.id), *route_tags]
+    generations = await cache_tags.get_many(all_tags) if all_tags else []
+
+    namespace = namespace or f"{func.__module__}.{func.__name__}"
+    if current_user is not None:
+        namespace = f"{namespace}:user:{current_user.id}:{generations[0]}"
+        generations = generations[1:]
+    payload = canonical_params(params)
+    if route_tags:
+        payload += '#' + urlencode(list(zip(route_tags, map(str, generations))))
+    digest = xxhash.xxh3_64_hexdigest(payload)
+    return f"{FastAPICache.get_prefix()}:{namespace}:{digest}"
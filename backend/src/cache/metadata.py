@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple, TypeVar
+
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
+
+from config.cache import cache_settings
+from src.schemas.books import BookAPISchema
+from src.utils.logger import logger
+from .client import redis_client
+
+T = TypeVar('T')
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    fresh_until: float
+    stale_until: float
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, now: float) -> CacheEntry | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry.stale_until <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, entry: CacheEntry) -> None:
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+
+class BooksMetadataCache:
+    """
+    Two-tier cache for Google Books metadata: a bounded in-process LRU (L1) in front of Redis (L2).
+
+    Every entry is fresh for its TTL and may then be served stale for `stale_ttl` more seconds. A stale hit
+    is returned immediately and a background task reloads the entry (stale-while-revalidate).
+    """
+    book_adapter = TypeAdapter(BookAPISchema)
+    search_adapter = TypeAdapter(list[BookAPISchema])
+
+    def __init__(self,
+                 redis: Redis | None,
+                 l1_max_size: int,
+                 book_ttl: int,
+                 search_ttl: int,
+                 stale_ttl: int,
+                 prefix: str = 'books-metadata',
+                 ):
+        self.redis = redis
+        self.l1 = LRUCache(l1_max_size)
+        self.book_ttl = book_ttl
+        self.search_ttl = search_ttl
+        self.stale_ttl = stale_ttl
+        self.prefix = prefix
+
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self.counters = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "l2_errors": 0,
+        }
+
+    async def get_book(self, gb_id: str, loader: Callable[[], Awaitable[BookAPISchema]]) -> BookAPISchema:
+        return await self._get_or_load(f"book:{gb_id}", loader, self.book_adapter, self.book_ttl)
+
+    async def search(self,
+                     params: dict[str, Any],
+                     loader: Callable[[], Awaitable[list[BookAPISchema]]]
+                     ) -> list[BookAPISchema]:
+        return await self._get_or_load(self.search_key(params), loader, self.search_adapter, self.search_ttl)
+
+    @staticmethod
+    def search_key(params: dict[str, Any]) -> str:
+        normalized = {
+            name: sorted(value) if isinstance(value, (list, tuple, set)) else value
+            for name, value in params.items() if value is not None
+        }
+        digest = hashlib.md5(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+        return f"search:{digest}"
+
+    def stats(self) -> dict[str, int]:
+        return {
+            **self.counters,
+            "evictions": self.l1.evictions,
+            "l1_size": len(self.l1),
+        }
+
+    async def _get_or_load(self,
+                           key: str,
+                           loader: Callable[[], Awaitable[T]],
+                           adapter: TypeAdapter,
+                           ttl: int,
+                           ) -> T:
+        now = time.time()
+        entry = self.l1.get(key, now)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self.counters["l1_hits"] += 1
+                return entry.value
+            self.counters["stale_hits"] += 1
+            self._refresh(key, loader, adapter, ttl)
+            return entry.value
+
+        entry = await self._l2_get(key, adapter, now)
+        if entry is not None:
+            self.l1.set(key, entry)
+            if now < entry.fresh_until:
+                self.counters["l2_hits"] += 1
+            else:
+                self.counters["stale_hits"] += 1
+                self._refresh(key, loader, adapter, ttl)
+            return entry.value
+
+        self.counters["misses"] += 1
+        value = await loader()
+        await self._set(key, value, adapter, ttl)
+        return value
+
+    async def _set(self, key: str, value: Any, adapter: TypeAdapter, ttl: int) -> None:
+        now = time.time()
+        entry = CacheEntry(value, now + ttl, now + ttl + self.stale_ttl)
+        self.l1.set(key, entry)
+        if self.redis is None:
+            return
+        payload = json.dumps({
+            "value": adapter.dump_python(value, mode='json'),
+            "fresh_until": entry.fresh_until,
+            "stale_until": entry.stale_until,
+        })
+        try:
+            await self.redis.set(f"{self.prefix}:{key}", payload, ex=ttl + self.stale_ttl)
+        except Exception as e:
+            self.counters["l2_errors"] += 1
+            logger.warning(f"Error setting books metadata cache key '{key}': {e!r}")
+
+    async def _l2_get(self, key: str, adapter: TypeAdapter, now: float) -> CacheEntry | None:
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(f"{self.prefix}:{key}")
+        except Exception as e:
+            self.counters["l2_errors"] += 1
+            logger.warning(f"Error retrieving books metadata cache key '{key}': {e!r}")
+            return None
+        if raw is None:
+            return None
+        payload = json.loads(raw)
+        if payload["stale_until"] <= now:
+            return None
+        return CacheEntry(adapter.validate_python(payload["value"]), payload["fresh_until"], payload["stale_until"])
+
+    def _refresh(self, key: str, loader: Callable[[], Awaitable[T]], adapter: TypeAdapter, ttl: int) -> None:
+        if key in self._refreshing:
+            return
+        self.counters["refreshes"] += 1
+        task = asyncio.create_task(self._reload(key, loader, adapter, ttl))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _reload(self, key: str, loader: Callable[[], Awaitable[T]], adapter: TypeAdapter, ttl: int) -> None:
+        try:
+            value = await loader()
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            logger.warning(f"Error refreshing books metadata cache key '{key}': {e!r}")
+            return
+        await self._set(key, value, adapter, ttl)
+
+
+books_metadata_cache = BooksMetadataCache(
+    redis_client,
+    l1_max_size=cache_settings.METADATA_L1_MAX_SIZE,
+    book_ttl=cache_settings.METADATA_BOOK_TTL,
+    search_ttl=cache_settings.METADATA_SEARCH_TTL,
+    stale_ttl=cache_settings.METADATA_STALE_TTL,
+)
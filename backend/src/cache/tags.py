@@ -0,0 +1,99 @@
+from typing import Iterable
+
+from redis.asyncio import Redis
+
+from config.cache import cache_settings
+from src.utils.logger import logger
+from .client import redis_client
+from .counters import MonotonicCounters
+from .invalidation import InvalidationBus, invalidation_bus
+
+CATALOG_TAG = 'books:catalog'
+
+
+def user_tag(user_id: int) -> str:
+    """Every cached response of the user"""
+    return f"user:{user_id}"
+
+
+def library_tag(user_id: int) -> str:
+    return f"user:{user_id}:library"
+
+
+def book_tag(isbn: str) -> str:
+    return f"book:{isbn}"
+
+
+class CacheTags:
+    """
+    Generation counters of response cache tags.
+
+    The generations of a route's tags are part of its cache keys, so `bump()` of a tag makes every response
+    tagged with it unreachable at once and the old entries simply expire. Lookups go to the in-process
+    `MonotonicCounters` first and then to a Redis hash.
+    """
+    def __init__(self, redis: Redis | None, bus: InvalidationBus, ttl: int, key: str = 'cache:tag-generations'):
+        self.redis = redis
+        self.key = key
+        self._generations: MonotonicCounters[str] = MonotonicCounters(bus, 'cache_tags', ttl)
+
+    async def get(self, tag: str) -> int:
+        return (await self.get_many([tag]))[0]
+
+    async def get_many(self, tags: Iterable[str]) -> list[int]:
+        tags = list(tags)
+        generations: dict[str, int] = {}
+        missing = []
+        for tag in tags:
+            generation = self._generations.get(tag)
+            if generation is not None:
+                generations[tag] = generation
+            else:
+                missing.append(tag)
+        if missing:
+            loaded = await self._redis_get(missing)
+            for tag in missing:
+                if loaded is not None:
+                    generations[tag] = self._generations.remember(tag, loaded[tag])
+                else:
+                    # keep serving the last known generation rather than falling back to 0
+                    generations[tag] = self._generations.last(tag) or 0
+        return [generations[tag] for tag in tags]
+
+    async def bump(self, *tags: str) -> None:
+        if not tags:
+            return
+        generations = await self._redis_incr(tags)
+        if generations is None:
+            generations = {tag: (self._generations.last(tag) or 0) + 1 for tag in tags}
+        await self._generations.publish(generations)
+
+    async def _redis_get(self, tags: list[str]) -> dict[str, int] | None:
+        if self.redis is None:
+            return {tag: 0 for tag in tags}
+        try:
+            values = await self.redis.hmget(self.key, tags)
+        except Exception as e:
+            logger.warning(f"Error retrieving cache tag generations: {e!r}")
+            return None
+        return {tag: int(value or 0) for tag, value in zip(tags, values)}
+
+    async def _redis_incr(self, tags: tuple[str, ...]) -> dict[str, int] | None:
+        if self.redis is None:
+            return None
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.hincrby(self.key, tag, 1)
+                values = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error bumping cache tag generations: {e!r}")
+            return None
+        return dict(zip(tags, values))
+
+
+cache_tags = CacheTags(
+    redis_client,
+    invalidation_bus,
+    ttl=cache_settings.TAG_GENERATION_TTL,
+)
@@ -0,0 +1,301 @@
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, Mock
+
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from src.cache.auth import APIKeyAuthCache
+from src.cache.coder import ORJSONResponseCoder
+from src.cache.tags import CacheTags
+from src.cache import key_builders
+from src.cache.invalidation import InvalidationBus
+from src.cache.metadata import BooksMetadataCache
+from src.cache.token_versions import TokenVersionStore
+from src.api.router import router as api_router
+from src.cache.tags import library_tag
+from src.schemas.books import BookAPISchema, SearchSource
+from src.schemas.users import UserDTO
+from src.services.users import APIKeyService
+from src.utils.responses import ORJSONResponse
+
+
+def make_book(gb_id: str, title: str = 'Test Book') -> BookAPISchema:
+    return BookAPISchema(gb_id=gb_id, ISBN=None, title=title, subtitle=None, description=None, language='en',
+                         pub_date=None, categories=None, authors=None)
+
+
+def make_book_row(id: int) -> dict:
+    return {"id": id, "gb_id": f"gb{id}", "ISBN": None, "title": "Test Book", "subtitle": None,
+            "description": None, "language": "en", "pub_date": None, "categories": '', "category_ids": [],
+            "authors": '', "author_ids": [], "metadata_status": 'ready'}
+
+
+def make_db_session(rows: list[dict]) -> AsyncMock:
+    """AsyncSession double whose every statement returns `rows`"""
+    session = AsyncMock()
+    session.execute.side_effect = lambda *args, **kwargs: Mock(mappings=Mock(return_value=list(rows)))
+    return session
+
+
+async def asgi_get(app, path: str, query: str = '', headers: dict[str, str] | None = None
+                   ) -> tuple[int, dict[str, str], bytes]:
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "http_version": "1.1", "scheme": "http",
+        "server": ("test", 80), "client": ("test", 1234), "state": {"session_id": "test-session"},
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start, *body = messages
+    return (start["status"], {name.decode(): value.decode() for name, value in start["headers"]},
+            b''.join(message.get("body", b'') for message in body))
+
+
+@pytest.fixture
+def cached_api(monkeypatch):
+    """The API routes with an in-memory response cache and a fixed authenticated user"""
+    tags = CacheTags(None, InvalidationBus(None), ttl=60)
+    monkeypatch.setattr(key_builders, 'cache_tags', tags)
+    for name, value in {
+        '_backend': InMemoryBackend(), '_prefix': 'fastapi-cache', '_expire': 60, '_init': True,
+        '_coder': ORJSONResponseCoder, '_key_builder': key_builders.default_key_builder, '_enable': True,
+    }.items():
+        monkeypatch.setattr(FastAPICache, name, value)
+    app = FastAPI()
+    app.include_router(api_router)
+    app.dependency_overrides[APIKeyService.get_current_user] = lambda: UserDTO.model_construct(
+        id=7, excluded_category_ids=[]
+    )
+    return app, tags
+
+
+@pytest.mark.asyncio
+async def test_books_metadata_cache_hit_and_miss():
+    cache = BooksMetadataCache(None, l1_max_size=1, book_ttl=60, search_ttl=60, stale_ttl=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        return make_book('a')
+
+    assert (await cache.get_book('a', loader)).gb_id == 'a'
+    assert (await cache.get_book('a', loader)).gb_id == 'a'
+    assert calls == 1
+
+    await cache.get_book('b', lambda: asyncio.sleep(0, make_book('b')))
+    stats = cache.stats()
+    assert stats["l1_hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_books_metadata_cache_serves_stale_while_revalidating():
+    cache = BooksMetadataCache(None, l1_max_size=10, book_ttl=0, search_ttl=0, stale_ttl=60)
+    titles = iter(['old', 'new'])
+
+    async def loader():
+        return [make_book('a', next(titles))]
+
+    params = {"query": "python", "categories": ["b", "a"]}
+    assert (await cache.search(params, loader))[0].title == 'old'
+    assert (await cache.search({"categories": ["a", "b"], "query": "python"}, loader))[0].title == 'old'
+    await asyncio.sleep(0)
+    assert cache.stats()["stale_hits"] == 1
+    assert cache.stats()["refreshes"] == 1
+    assert (await cache.search(params, loader))[0].title == 'new'
+
+
+@pytest.mark.asyncio
+async def test_api_key_auth_cache_invalidation():
+    bus = InvalidationBus(None)
+    cache = APIKeyAuthCache(bus, ttl=60, max_size=2)
+    user = Mock(id=1)
+    other_user = Mock(id=2)
+    expire_date = datetime.date.today()
+
+    cache.set('key1', user, expire_date)
+    cache.set('key2', user, expire_date)
+    assert cache.get('key1') == (user, expire_date)
+
+    await cache.invalidate_key('key1')
+    assert cache.get('key1') is None
+    assert cache.get('key2') == (user, expire_date)
+
+    cache.set('key3', other_user, expire_date)
+    await cache.invalidate_user(1)
+    assert cache.get('key2') is None
+    assert cache.get('key3') == (other_user, expire_date)
+
+    cache.set('key4', user, expire_date)
+    cache.set('key5', user, expire_date)
+    assert cache.get('key3') is None
+
+
+@pytest.mark.asyncio
+async def test_api_key_auth_cache_ttl():
+    cache = APIKeyAuthCache(InvalidationBus(None), ttl=0, max_size=10)
+    cache.set('key', Mock(id=1), datetime.date.today())
+    assert cache.get('key') is None
+
+
+@pytest.mark.asyncio
+async def test_token_version_store_keeps_highest_version():
+    bus = InvalidationBus(None)
+    store = TokenVersionStore(None, bus, ttl=60, redis_ttl=3600)
+    loader = AsyncMock(return_value=1)
+
+    assert await store.get(1, loader) == 1
+    assert await store.get(1, loader) == 1
+    loader.assert_awaited_once()
+
+    await store.set(1, 3)
+    assert await store.get(1, loader) == 3
+    await bus.publish('token_version', [[1, 2]])
+    assert await store.get(1, loader) == 3
+
+
+@pytest.mark.asyncio
+async def test_token_version_store_redis_entries_expire_and_failed_sets_are_dropped():
+    redis = AsyncMock()
+    redis.get.return_value = None
+    store = TokenVersionStore(redis, InvalidationBus(None), ttl=0, redis_ttl=3600)
+
+    assert await store.get(1, AsyncMock(return_value=2)) == 2
+    redis.eval.assert_awaited_once_with(store.set_max_script, 1, 'auth:token-version:1', 2, 3600)
+
+    # the bump could not be written: the old version is dropped so the next lookup goes to the database
+    redis.eval.side_effect = ConnectionError()
+    await store.set(1, 3)
+    redis.delete.assert_awaited_once_with('auth:token-version:1')
+    loader = AsyncMock(return_value=3)
+    assert await store.get(1, loader) == 3
+    loader.assert_awaited_once()
+
+
+def test_orjson_response_coder():
+    books = [make_book('a'), make_book('b')]
+    encoded = ORJSONResponseCoder.encode(ORJSONResponse(books))
+    assert orjson.loads(encoded) == [book.model_dump() for book in books]
+    assert ORJSONResponseCoder.encode(books) == encoded
+
+    response = ORJSONResponseCoder.decode(encoded)
+    assert isinstance(response, ORJSONResponse)
+    assert response.body == encoded
+
+
+@pytest.mark.asyncio
+async def test_default_key_builder(monkeypatch):
+    tags = CacheTags(None, InvalidationBus(None), ttl=60)
+    monkeypatch.setattr(key_builders, 'cache_tags', tags)
+    monkeypatch.setattr(FastAPICache, '_prefix', 'fastapi-cache')
+
+    async def search():
+        pass
+
+    user = Mock(id=7)
+    key = await key_builders.default_key_builder(search, kwargs={
+        "uow": object(), "query": "python", "categories": ["b", "a", "a"], "source": SearchSource.auto,
+        "isbn": None, "current_user": user,
+    })
+    same_key = await key_builders.default_key_builder(search, kwargs={
+        "current_user": Mock(id=7, name="renamed"), "source": SearchSource.auto, "categories": ["a", "b"],
+        "query": "python", "uow": object(),
+    })
+    assert key == same_key
+    assert f":{search.__module__}.search:user:7:0:" in key
+
+    await tags.bump('user:7')
+    bumped_key = await key_builders.default_key_builder(search, kwargs={
+        "query": "python", "categories": ["a", "b"], "source": SearchSource.auto, "current_user": user,
+    })
+    assert ":user:7:1:" in bumped_key
+    assert bumped_key.rsplit(':', 1)[1] == key.rsplit(':', 1)[1]
+
+    assert key_builders.canonical_params({"b": [2, 1], "a": True, "c": None}) == "a=true&b=1&b=2"
+
+
+@pytest.mark.asyncio
+async def test_tagged_key_builder(monkeypatch):
+    tags = CacheTags(None, InvalidationBus(None), ttl=60)
+    monkeypatch.setattr(key_builders, 'cache_tags', tags)
+    monkeypatch.setattr(FastAPICache, '_prefix', 'fastapi-cache')
+
+    async def get_user_library_page():
+        pass
+
+    key_builder = key_builders.tagged_key_builder(lambda params: [f"user:{params['current_user'].id}:library"])
+    user, other_user = Mock(id=7), Mock(id=8)
+    key = await key_builder(get_user_library_page, kwargs={"limit": 100, "current_user": user})
+    other_key = await key_builder(get_user_library_page, kwargs={"limit": 100, "current_user": other_user})
+    assert key == await key_builder(get_user_library_page, kwargs={"limit": 100, "current_user": user})
+
+    await tags.bump('user:7:library')
+    bumped_key = await key_builder(get_user_library_page, kwargs={"limit": 100, "current_user": user})
+    assert bumped_key != key
+    assert ":user:7:0:" in bumped_key
+    assert await key_builder(get_user_library_page, kwargs={"limit": 100, "current_user": other_user}) == other_key
+
+
+@pytest.mark.asyncio
+async def test_cache_tags_keep_highest_generation():
+    bus = InvalidationBus(None)
+    tags = CacheTags(None, bus, ttl=60)
+    assert await tags.get_many(['a', 'b']) == [0, 0]
+    await tags.bump('a', 'b')
+    await tags.bump('a')
+    assert await tags.get_many(['b', 'a']) == [1, 2]
+    await bus.publish('cache_tags', [['a', 1]])
+    assert await tags.get('a') == 2
+
+
+@pytest.mark.asyncio
+async def test_library_page_is_not_cached_from_a_lagging_replica(cached_api, monkeypatch):
+    app, tags = cached_api
+    primary_rows, replica_rows = [make_book_row(1)], [make_book_row(1)]
+    primary = Mock(side_effect=lambda: make_db_session(primary_rows))
+    replica = Mock(side_effect=lambda: make_db_session(replica_rows))
+    monkeypatch.setattr('src.utils.session_context_manager.db_settings', Mock(REPLICA_DSN='postgresql://replica'))
+    monkeypatch.setattr('src.utils.session_context_manager.async_session_maker', primary)
+    monkeypatch.setattr('src.utils.session_context_manager.async_readonly_session_maker', replica)
+
+    status, _, body = await asgi_get(app, '/api/v1/books/')
+    assert status == 200
+    assert [book["id"] for book in orjson.loads(body)["items"]] == [1]
+
+    # a book is added on the primary and the library tag bumped; the replica has not replayed the insert yet
+    primary_rows.append(make_book_row(2))
+    await tags.bump(library_tag(7))
+
+    status, _, body = await asgi_get(app, '/api/v1/books/')
+    assert [book["id"] for book in orjson.loads(body)["items"]] == [1, 2]
+    replica.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cached_route_sends_etag(cached_api, monkeypatch):
+    app, _ = cached_api
+    monkeypatch.setattr('src.utils.session_context_manager.async_session_maker',
+                        Mock(side_effect=lambda: make_db_session([make_book_row(1)])))
+
+    status, headers, body = await asgi_get(app, '/api/v1/books/')
+    assert status == 200 and headers['etag'] and headers['cache-control']
+    # a cache hit
+    status, hit_headers, hit_body = await asgi_get(app, '/api/v1/books/')
+    assert (status, hit_headers['etag'], hit_body) == (200, headers['etag'], body)
+
+    status, _, body = await asgi_get(app, '/api/v1/books/', headers={'If-None-Match': headers['etag']})
+    assert (status, body) == (304, b'')
@@ -0,0 +1,96 @@
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from config.jwt import jwt_settings
+from src.utils.logger import logger
+from .client import redis_client
+from .counters import MonotonicCounters
+from .invalidation import InvalidationBus, invalidation_bus
+
+
+class TokenVersionStore:
+    """
+    Map of user id -> token version used to revoke JWTs without loading the user row.
+
+    Lookups go to the in-process `MonotonicCounters` first, then to Redis and only then to the loader (the
+    database). Bumps are broadcast so every worker picks up the new version immediately.
+
+    The database stays the source of truth: a Redis entry expires after `redis_ttl` seconds, and one that
+    could not be updated after a bump is deleted, so the next lookup reloads the version from the database.
+    """
+    # SET only if the stored version is lower, so a stale read can never overwrite a newer version
+    set_max_script = """
+        local current = redis.call('GET', KEYS[1])
+        if not current or tonumber(current) < tonumber(ARGV[1]) then
+            redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+        end
+    """
+
+    def __init__(self,
+                 redis: Redis | None,
+                 bus: InvalidationBus,
+                 ttl: int,
+                 redis_ttl: int,
+                 prefix: str = 'auth:token-version',
+                 ):
+        self.redis = redis
+        self.redis_ttl = redis_ttl
+        self.prefix = prefix
+        self._versions: MonotonicCounters[int] = MonotonicCounters(bus, 'token_version', ttl)
+
+    async def get(self, user_id: int, loader: Callable[[], Awaitable[int | None]]) -> int | None:
+        version = self._versions.get(user_id)
+        if version is not None:
+            return version
+
+        version = await self._redis_get(user_id)
+        if version is None:
+            version = await loader()
+            if version is None:
+                return None
+            await self._redis_set(user_id, version)
+        return self._versions.remember(user_id, version)
+
+    async def set(self, user_id: int, version: int) -> None:
+        if not await self._redis_set(user_id, version):
+            # the old version must not outlive the bump in Redis
+            await self._redis_delete(user_id)
+        await self._versions.publish({user_id: version})
+
+    def key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    async def _redis_get(self, user_id: int) -> int | None:
+        if self.redis is None:
+            return None
+        try:
+            version = await self.redis.get(self.key(user_id))
+        except Exception as e:
+            logger.warning(f"Error retrieving token version of user {user_id}: {e!r}")
+            return None
+        return None if version is None else int(version)
+
+    async def _redis_set(self, user_id: int, version: int) -> bool:
+        if self.redis is None:
+            return True
+        try:
+            await self.redis.eval(self.set_max_script, 1, self.key(user_id), version, self.redis_ttl)
+        except Exception as e:
+            logger.warning(f"Error setting token version of user {user_id}: {e!r}")
+            return False
+        return True
+
+    async def _redis_delete(self, user_id: int) -> None:
+        try:
+            await self.redis.delete(self.key(user_id))
+        except Exception as e:
+            logger.warning(f"Error deleting token version of user {user_id}: {e!r}")
+
+
+token_versions = TokenVersionStore(
+    redis_client,
+    invalidation_bus,
+    ttl=jwt_settings.TOKEN_VERSION_CACHE_TTL,
+    redis_ttl=jwt_settings.TOKEN_VERSION_REDIS_TTL,
+)
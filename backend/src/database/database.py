@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from config.db import db_settings
+from src.database.instrumentation import instrument
 
 
 logging.basicConfig()
@@ -16,10 +17,25 @@ engine = create_async_engine(
     pool_size=db_settings.POOL_SIZE,
     max_overflow=db_settings.MAX_POOL_OVERFLOW,
     pool_timeout=db_settings.POOL_TIMEOUT,
-    echo=True
 )
+instrument(engine.sync_engine)
+
+# read-only transactions: asyncpg opens them with `BEGIN READ ONLY`. Without a replica they share the
+# primary's pool, the read-only flag is reset when the connection is returned to it
+if db_settings.REPLICA_DSN is not None:
+    replica_engine = create_async_engine(
+        url=db_settings.REPLICA_DSN,
+        pool_size=db_settings.REPLICA_POOL_SIZE or db_settings.POOL_SIZE,
+        max_overflow=db_settings.REPLICA_MAX_POOL_OVERFLOW or db_settings.MAX_POOL_OVERFLOW,
+        pool_timeout=db_settings.POOL_TIMEOUT,
+    )
+    instrument(replica_engine.sync_engine)
+    replica_engine = replica_engine.execution_options(postgresql_readonly=True)
+else:
+    replica_engine = engine.execution_options(postgresql_readonly=True)
 
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+async_readonly_session_maker = async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
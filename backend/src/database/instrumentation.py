@@ -0,0 +1,97 @@
+"""
+Per-request SQL instrumentation through engine events. Every statement is timed; the count and the total time
+are added up in the QueryStats of the current request (`query_stats`, set by LoggingMiddleware with the
+request's session_id), which end up in the `Server-Timing` header, the request log line and the metrics.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config.db import db_settings
+from config.server import server_settings
+from src.metrics import db_query_duration_seconds, db_slow_queries
+from src.utils.logger import logger
+
+
+class QueryStats:
+    """Statements run on behalf of one request; `record` keeps their text too (for tests)"""
+    def __init__(self, session_id: str, record: bool = False):
+        self.session_id = session_id
+        self.count = 0
+        self.duration = 0.
+        self.statements: list[str] | None = [] if record else None
+
+    def add(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        if self.statements is not None:
+            self.statements.append(statement)
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+query_stats: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+
+
+@contextmanager
+def track_queries(stats: QueryStats) -> Iterator[QueryStats]:
+    """Counts the statements run in the block (and in the tasks it starts) in `stats`"""
+    token = query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        query_stats.reset(token)
+
+
+def instrument(engine: Engine) -> None:
+    """Attaches the hooks to a (sync) engine: `instrument(async_engine.sync_engine)`"""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault('query_start', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    _record(statement, perf_counter() - conn.info['query_start'].pop())
+
+
+def _handle_error(exception_context) -> None:
+    conn = exception_context.connection
+    starts = conn.info.get('query_start') if conn is not None else None
+    if starts and exception_context.statement is not None:
+        _record(exception_context.statement, perf_counter() - starts.pop())
+
+
+def _record(statement: str, duration: float) -> None:
+    stats = query_stats.get()
+    if stats is not None:
+        stats.add(statement, duration)
+    db_query_duration_seconds.observe(duration)
+
+    # parameters are never logged: they may hold password hashes and API keys
+    if duration * 1000 >= db_settings.SLOW_QUERY_MS:
+        db_slow_queries.inc()
+        if random.random() < db_settings.SLOW_QUERY_LOG_SAMPLE_RATE:
+            logger.warning(f"{_session_id(stats)} - SLOW QUERY {duration * 1000:.1f}ms: {_truncate(statement)}")
+    elif random.random() < db_settings.QUERY_LOG_SAMPLE_RATE:
+        logger.debug(f"{_session_id(stats)} - QUERY {duration * 1000:.1f}ms: {_truncate(statement)}")
+
+
+def _session_id(stats: QueryStats | None) -> str:
+    return stats.session_id if stats is not None else '-'
+
+
+def _truncate(statement: str) -> str:
+    statement = ' '.join(statement.split())
+    if len(statement) > server_settings.LOG_PAYLOAD_MAX_CHARS:
+        return f"{statement[:server_settings.LOG_PAYLOAD_MAX_CHARS]}... ({len(statement)} chars)"
+    return statement
@@ -2,7 +2,8 @@ import enum
 from datetime import datetime
 from typing import Annotated
 
-from sqlalchemy import String, DateTime, text
+from sqlalchemy import String, DateTime, Integer, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import mapped_column
 
 int_pk_c = Annotated[int, mapped_column(primary_key=True)]
@@ -17,3 +18,5 @@ str512_c = Annotated[str, mapped_column(String(512))]
 
 datetime_c = Annotated[datetime, mapped_column(DateTime())]
 created_at_c = Annotated[datetime, mapped_column(DateTime(), server_default=text("TIMEZONE('utc', now())"))]
+
+int_array_c = Annotated[list[int], mapped_column(ARRAY(Integer), default=list, server_default=text("'{}'"))]
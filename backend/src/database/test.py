@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from src.database.instrumentation import QueryStats, instrument, query_stats, track_queries
+from src.metrics import db_slow_queries
+
+
+@pytest.fixture
+def sqlite_engine():
+    engine = create_engine('sqlite://')
+    instrument(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_statements_are_counted_per_request(sqlite_engine):
+    with track_queries(QueryStats('session-id', record=True)) as stats:
+        with sqlite_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+    assert query_stats.get() is None
+    assert stats.count == 2
+    assert stats.statements == ["SELECT 1", "SELECT 2"]
+    assert stats.duration > 0
+    assert stats.server_timing().startswith('db;dur=')
+    assert stats.server_timing().endswith(';desc="2 queries"')
+
+    # statements outside a request are not attributed to any
+    with sqlite_engine.connect() as conn:
+        conn.execute(text("SELECT 3"))
+    assert stats.count == 2
+
+
+def test_failed_and_slow_statements(sqlite_engine, monkeypatch):
+    monkeypatch.setattr('src.database.instrumentation.db_settings.SLOW_QUERY_MS', 0)
+    monkeypatch.setattr('src.database.instrumentation.db_settings.SLOW_QUERY_LOG_SAMPLE_RATE', 0)
+    slow_before = db_slow_queries._values.get((), 0)
+    with track_queries(QueryStats('session-id')) as stats:
+        with sqlite_engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            conn.execute(text("SELECT 1"))
+            assert conn.info['query_start'] == []
+    assert stats.count == 2
+    assert db_slow_queries._values[()] == slow_before + 2
@@ -0,0 +1,155 @@
+"""
+Local stand-in for the Google Books volumes API.
+
+Serves synthetic volumes that are derived from the volume id (or the search query), so the same request
+always gets the same answer, with a configurable latency and error rate. Load tests and the test suite use
+it instead of the real API:
+
+    python -m src.integrations.api.books.fake_google_books --port 8081 --latency 0.05 --jitter 0.02 --error-rate 0.01
+
+and run the application with GB_API__BASE_URL=http://127.0.0.1:8081/books GB_API__API_VERSION=/v1.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+import re
+
+from aiohttp import web
+
+CATEGORIES = (
+    'Computers', 'Programming', 'Fiction', 'Science', 'History', 'Mathematics', 'Philosophy', 'Art',
+    'Business & Economics', 'Juvenile Fiction', 'Biography & Autobiography', 'Cooking',
+)
+FIRST_NAMES = ('Ada', 'Alan', 'Grace', 'Edsger', 'Barbara', 'Donald', 'Frances', 'John', 'Margaret', 'Niklaus')
+LAST_NAMES = ('Lovelace', 'Turing', 'Hopper', 'Dijkstra', 'Liskov', 'Knuth', 'Allen', 'Backus', 'Hamilton', 'Wirth')
+WORDS = (
+    'python', 'systems', 'design', 'data', 'history', 'theory', 'practice', 'introduction', 'modern', 'art',
+    'algorithms', 'networks', 'story', 'guide', 'patterns', 'programming', 'science', 'world', 'language', 'mind',
+)
+LANGUAGES = ('en', 'en', 'en', 'de', 'fr', 'ru')
+
+VOLUME_ID = re.compile(r'[A-Za-z0-9_-]{12}')
+
+
+def volume_id(n: int) -> str:
+    """The n-th synthetic volume id, shaped like the real 12 character ids"""
+    return base64.urlsafe_b64encode(hashlib.blake2b(str(n).encode(), digest_size=9).digest()).decode()
+
+
+def isbn10(rnd: random.Random) -> str:
+    digits = [rnd.randrange(10) for _ in range(9)]
+    check = (11 - sum((10 - i) * digit for i, digit in enumerate(digits)) % 11) % 11
+    return ''.join(map(str, digits)) + ('X' if check == 10 else str(check))
+
+
+def volume(gb_id: str) -> dict:
+    """A volume resource as returned for the `fields` the application requests"""
+    rnd = random.Random(gb_id)
+    title = ' '.join(rnd.sample(WORDS, rnd.randint(1, 4))).capitalize()
+    return {
+        "id": gb_id,
+        "volumeInfo": {
+            "title": title,
+            "subtitle": ' '.join(rnd.sample(WORDS, 3)) if rnd.random() < 0.5 else None,
+            "authors": [f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}" for _ in range(rnd.randint(1, 3))],
+            "publishedDate": f"{rnd.randint(1950, 2024)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            "description": ' '.join(rnd.choices(WORDS, k=rnd.randint(20, 120))),
+            "industryIdentifiers": [{"type": "ISBN_10", "identifier": isbn10(rnd)}],
+            "categories": rnd.sample(CATEGORIES, rnd.randint(1, 2)),
+            "language": rnd.choice(LANGUAGES),
+        },
+    }
+
+
+class FakeGoogleBooks:
+    """
+    `latency` ± `jitter` seconds are spent on every request, then `error_rate` of the requests fail with 503
+    like the real API does when it sheds load.
+    """
+    def __init__(self,
+                 latency: float = 0.,
+                 jitter: float = 0.,
+                 error_rate: float = 0.,
+                 page_size: int = 10,
+                 seed: int = 0,
+                 ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.random = random.Random(seed)
+
+        self.requests = 0
+        self.errors = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/books/v1/volumes', self.search)
+        app.router.add_get('/books/v1/volumes/{id}', self.get_volume)
+        return app
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 0) -> tuple[web.AppRunner, str]:
+        """Starts the server in the running loop; returns the runner to clean up and the GB_API__BASE_URL"""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        return runner, f"http://{host}:{port}/books"
+
+    async def get_volume(self, request: web.Request) -> web.Response:
+        error = await self._delay_or_fail()
+        if error is not None:
+            return error
+        gb_id = request.match_info['id']
+        if not VOLUME_ID.fullmatch(gb_id):
+            return web.json_response({"error": {"code": 404, "message": "The volume ID could not be found."}},
+                                     status=404)
+        return web.json_response(volume(gb_id))
+
+    async def search(self, request: web.Request) -> web.Response:
+        error = await self._delay_or_fail()
+        if error is not None:
+            return error
+        query = request.query.get('q', '')
+        # like the real API, a bare volume id finds that volume first
+        term = query.split('+', 1)[0]
+        ids = [term] if VOLUME_ID.fullmatch(term) else []
+        rnd = random.Random(query)
+        ids.extend(volume_id(rnd.randrange(1 << 32)) for _ in range(self.page_size - len(ids)))
+        return web.json_response({
+            "kind": "books#volumes",
+            "totalItems": 1000,
+            "items": [volume(gb_id) for gb_id in ids],
+        })
+
+    async def _delay_or_fail(self) -> web.Response | None:
+        self.requests += 1
+        delay = max(0., self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"code": 503, "message": "Backend Error"}}, status=503)
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.05, help="mean response latency, seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="latency spread, seconds")
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeGoogleBooks(args.latency, args.jitter, args.error_rate, args.page_size, args.seed)
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
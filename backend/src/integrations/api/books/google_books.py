@@ -3,15 +3,33 @@ from typing import Any
 
 from src.schemas.books import BookAPISchema
 from config.gb_api import gb_api_settings
-from src.utils.logger import logger
+from src.utils import exceptions
+from src.utils.logger import log_payload
+from src.utils.utils import normalize_isbn
 
 from .abstract import AbstractBooksAPI
 from ..client import AioHTTPSessionClient
+from ..resilience import CircuitBreaker, RetryBudget, UpstreamUnavailableError
 
 
 class GoogleBooksAPI(AbstractBooksAPI):
     session_client = AioHTTPSessionClient(
-        gb_api_settings.BASE_URL + gb_api_settings.API_VERSION + '/volumes'
+        gb_api_settings.BASE_URL + gb_api_settings.API_VERSION + '/volumes',
+        name='google_books',
+        pool_size=gb_api_settings.POOL_SIZE,
+        pool_size_per_host=gb_api_settings.POOL_SIZE_PER_HOST,
+        keepalive_timeout=gb_api_settings.KEEPALIVE_TIMEOUT,
+        dns_cache_ttl=gb_api_settings.DNS_CACHE_TTL,
+        connect_timeout=gb_api_settings.CONNECT_TIMEOUT,
+        read_timeout=gb_api_settings.READ_TIMEOUT,
+        deadline=gb_api_settings.DEADLINE,
+        max_retries=gb_api_settings.MAX_RETRIES,
+        retry_backoff_base=gb_api_settings.RETRY_BACKOFF_BASE,
+        retry_backoff_cap=gb_api_settings.RETRY_BACKOFF_CAP,
+        retry_budget=RetryBudget(gb_api_settings.RETRY_BUDGET_RATIO, gb_api_settings.RETRY_BUDGET_MIN_PER_SECOND),
+        circuit_breaker=CircuitBreaker(
+            gb_api_settings.CIRCUIT_FAILURE_THRESHOLD, gb_api_settings.CIRCUIT_RESET_TIMEOUT
+        ),
     )
     result_fields_params = {
         "fields": "id,volumeInfo(title,subtitle,authors,publishedDate,description,"
@@ -23,21 +41,16 @@ class GoogleBooksAPI(AbstractBooksAPI):
 
     @classmethod
     async def get_by_id(cls, id: str) -> BookAPISchema:
-        status, data = await cls.session_client.get(f"/{id}", params=cls.result_fields_params)
-        logger.info(data)
-        return BookAPISchema(
-                gb_id=data['id'],
-                ISBN=cls.getISBNIfExists(data['volumeInfo'].get('industryIdentifiers')),
-                title=data['volumeInfo'].get('title'),
-                subtitle=data['volumeInfo'].get('subtitle'),
-                description=data['volumeInfo'].get('description'),
-                language=data['volumeInfo'].get('language'),
-                pub_date=data['volumeInfo'].get('publishedDate'),
-                categories=', '.join(data['volumeInfo'].get('categories'))
-                if data['volumeInfo'].get('categories') is not None else None,
-                authors=', '.join(data['volumeInfo'].get('authors'))
-                if data['volumeInfo'].get('authors') is not None else None
-            )
+        """Raises NotFoundHTTPException for unknown ids, UpstreamUnavailableError when Google Books fails"""
+        status, data = await cls.session_client.get(
+            f"/{id}", params=cls.result_fields_params, hedge_after=gb_api_settings.HEDGE_AFTER
+        )
+        log_payload(f"Google Books volume {id}", data)
+        if status in (400, 404):
+            raise exceptions.NotFoundHTTPException(f"Book with gb_id={id} not found")
+        if status != 200:
+            raise UpstreamUnavailableError(cls.session_client.name, str(status))
+        return cls.parse_volume(data)
 
     @classmethod
     async def search(cls,
@@ -62,22 +75,26 @@ class GoogleBooksAPI(AbstractBooksAPI):
         if categories:
             params['q'] += '+subject' + ','.join(categories)
         status, res = await cls.session_client.get('', params=params)
-        logger.info(res)
-        return [
-            BookAPISchema(
-                gb_id=data['id'],
-                ISBN=cls.getISBNIfExists(data['volumeInfo'].get('industryIdentifiers')),
-                title=data['volumeInfo'].get('title'),
-                subtitle=data['volumeInfo'].get('subtitle'),
-                description=data['volumeInfo'].get('description'),
-                language=data['volumeInfo'].get('language'),
-                pub_date=data['volumeInfo'].get('publishedDate'),
-                categories=', '.join(data['volumeInfo'].get('categories'))
-                if data['volumeInfo'].get('categories') is not None else None,
-                authors=', '.join(data['volumeInfo'].get('authors'))
-                if data['volumeInfo'].get('authors') is not None else None
-            ) for data in res['items']
-        ]
+        log_payload("Google Books search", res)
+        if status != 200:
+            raise UpstreamUnavailableError(cls.session_client.name, str(status))
+        # no `items` when nothing was found
+        return [cls.parse_volume(data) for data in res.get('items', [])]
+
+    @classmethod
+    def parse_volume(cls, data: dict[str, Any]) -> BookAPISchema:
+        volume_info = data['volumeInfo']
+        return BookAPISchema(
+            gb_id=data['id'],
+            ISBN=cls.getISBNIfExists(volume_info.get('industryIdentifiers')),
+            title=volume_info.get('title'),
+            subtitle=volume_info.get('subtitle'),
+            description=volume_info.get('description'),
+            language=volume_info.get('language'),
+            pub_date=volume_info.get('publishedDate'),
+            categories=', '.join(volume_info['categories']) if volume_info.get('categories') is not None else None,
+            authors=', '.join(volume_info['authors']) if volume_info.get('authors') is not None else None
+        )
 
     @staticmethod
     def getISBNIfExists(data: list[dict[str, Any]]) -> str | None:
@@ -85,5 +102,5 @@ class GoogleBooksAPI(AbstractBooksAPI):
             return None
         for i in data:
             if i['type'] == 'ISBN_10':
-                return i['identifier']
+                return normalize_isbn(i['identifier'])
         return None
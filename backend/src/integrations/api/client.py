@@ -1,9 +1,14 @@
+import asyncio
 from abc import ABC, abstractmethod
+from time import perf_counter
 from typing import Any
 
 import aiohttp
 
+from src.metrics import upstream_errors, upstream_request_duration_seconds, upstream_retries
 from src.schemas.books import BookDTO
+from .resilience import CircuitBreaker, CircuitOpenError, RetryBudget, UpstreamUnavailableError, backoff_delay, hedge
+from .singleflight import SingleFlight
 
 
 class AbstractSessionClient:
@@ -12,6 +17,18 @@ class AbstractSessionClient:
         self.BASE_URL = base_url
         raise NotImplementedError()
 
+    @abstractmethod
+    async def start(self) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def close(self) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def pool_stats(self) -> dict[str, int]:
+        raise NotImplementedError()
+
     @abstractmethod
     async def get(self, url: str, params: dict[str, str], headers: dict[str, str], **kwargs):
         raise NotImplementedError()
@@ -30,29 +47,217 @@ class AbstractSessionClient:
 
 
 class AioHTTPSessionClient(AbstractSessionClient):
-    def __init__(self, base_url: str):
+    """
+    Keeps one aiohttp.ClientSession (and its connector) for the whole application lifetime, so keep-alive
+    connections and resolved DNS entries are reused between calls. The session is opened by `start()` on
+    application startup and released by `close()` on shutdown. If a call is made before `start()`
+    (scripts, tests) the session is opened lazily.
+
+    Concurrent identical GET requests are coalesced into one upstream call (see SingleFlight). Every call
+    is recorded in the upstream metrics under `name`.
+
+    A call is bounded by `deadline` seconds. Within it, connection errors, timeouts and 429/5xx answers to
+    idempotent requests are retried up to `max_retries` times with jittered exponential backoff, as long as
+    `retry_budget` allows. When no useful answer is received UpstreamUnavailableError is raised, and
+    `circuit_breaker` counts the failure. While the circuit is open calls fail with CircuitOpenError
+    without reaching the upstream. A GET with `hedge_after` is sent a second time when the first request
+    takes longer than that.
+    """
+    IDEMPOTENT_METHODS = frozenset({'GET', 'PUT', 'DELETE'})
+    RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self,
+                 base_url: str,
+                 name: str = 'upstream',
+                 pool_size: int = 100,
+                 pool_size_per_host: int = 0,
+                 keepalive_timeout: float = 15,
+                 dns_cache_ttl: int = 10,
+                 connect_timeout: float | None = None,
+                 read_timeout: float | None = None,
+                 coalesce_requests: bool = True,
+                 deadline: float | None = None,
+                 max_retries: int = 0,
+                 retry_backoff_base: float = 0.1,
+                 retry_backoff_cap: float = 1,
+                 retry_budget: RetryBudget | None = None,
+                 circuit_breaker: CircuitBreaker | None = None,
+                 ):
         self.BASE_URL = base_url
+        self.name = name
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
 
-    async def get(self, url: str, params: dict[str, str] = None, headers: dict[str, str] = None, **kwargs
-                  ) -> tuple[int, dict[str, Any]]:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.BASE_URL + url, params=params, headers=headers, **kwargs) as resp:
-                return resp.status, await resp.json()
+        self.single_flight = SingleFlight() if coalesce_requests else None
+
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_backoff_base = retry_backoff_base
+        self.retry_backoff_cap = retry_backoff_cap
+        self.retry_budget = retry_budget
+        self.circuit_breaker = circuit_breaker
+
+        self._session: aiohttp.ClientSession | None = None
+        self._connections_created = 0
+        self._connections_reused = 0
+        self._requests = 0
+
+    async def start(self) -> None:
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            trace_configs=[self._trace_config()],
+        )
+
+    async def close(self) -> None:
+        if self._session is None:
+            return
+        await self._session.close()
+        self._session = None
+
+    def pool_stats(self) -> dict[str, int]:
+        stats = {
+            "limit": self.pool_size,
+            "limit_per_host": self.pool_size_per_host,
+            "acquired": 0,
+            "idle": 0,
+            "waiting": 0,
+            "requests": self._requests,
+            "connections_created": self._connections_created,
+            "connections_reused": self._connections_reused,
+        }
+        if self._session is None or self._session.closed:
+            return stats
+        connector = self._session.connector
+        # aiohttp does not expose these counters publicly
+        stats["acquired"] = len(connector._acquired)
+        stats["idle"] = sum(len(conns) for conns in connector._conns.values())
+        stats["waiting"] = sum(len(waiters) for waiters in connector._waiters.values())
+        return stats
+
+    async def get(self, url: str, params: dict[str, str] = None, headers: dict[str, str] = None,
+                  hedge_after: float | None = None, **kwargs) -> tuple[int, dict[str, Any]]:
+        if self.single_flight is None or kwargs:
+            return await self._request('GET', url, hedge_after, params=params, headers=headers, **kwargs)
+        key = self.single_flight.make_key('GET', self.BASE_URL + url, params, headers)
+        return await self.single_flight.do(
+            key, lambda: self._request('GET', url, hedge_after, params=params, headers=headers)
+        )
 
     async def post(self, url: str, params: dict[str, str], data: dict[str, Any], headers: dict[str, str], **kwargs
                    ) -> tuple[int, dict[str, Any]]:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.BASE_URL + url, params=params, data=data, headers=headers, **kwargs) as resp:
-                return resp.status, await resp.json()
+        return await self._request('POST', url, params=params, data=data, headers=headers, **kwargs)
 
     async def put(self, url: str, params: dict[str, str], data: dict[str, Any], headers: dict[str, str], **kwargs
                   ) -> tuple[int, dict[str, Any]]:
-        async with aiohttp.ClientSession() as session:
-            async with session.put(self.BASE_URL + url, params=params, data=data, headers=headers, **kwargs) as resp:
-                return resp.status, await resp.json()
+        return await self._request('PUT', url, params=params, data=data, headers=headers, **kwargs)
 
     async def delete(self, url: str, params: dict[str, str], headers: dict[str, str], **kwargs
                      ) -> tuple[int, dict[str, Any]]:
-        async with aiohttp.ClientSession() as session:
-            async with session.delete(self.BASE_URL + url, params=params, headers=headers, **kwargs) as resp:
+        return await self._request('DELETE', url, params=params, headers=headers, **kwargs)
+
+    async def _request(self, method: str, url: str, hedge_after: float | None = None, **kwargs
+                       ) -> tuple[int, dict[str, Any]]:
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+            upstream_errors.inc(self.name, 'circuit_open')
+            raise CircuitOpenError(self.name)
+        await self.start()
+        success = None
+        try:
+            async with asyncio.timeout(self.deadline):
+                result = await self._attempts(method, url, hedge_after, **kwargs)
+            success = True
+            return result
+        except UpstreamUnavailableError:
+            success = False
+            raise
+        except TimeoutError:
+            # only the deadline gets here, timeouts of single requests are retried in _attempts
+            success = False
+            upstream_errors.inc(self.name, 'deadline')
+            raise UpstreamUnavailableError(self.name, 'deadline') from None
+        finally:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record(success)
+
+    async def _attempts(self, method: str, url: str, hedge_after: float | None, **kwargs
+                        ) -> tuple[int, dict[str, Any]]:
+        if self.retry_budget is not None:
+            self.retry_budget.record_call()
+        attempt = 0
+        while True:
+            try:
+                if hedge_after is not None and method == 'GET':
+                    status, data = await hedge(
+                        lambda: self._attempt(method, url, **kwargs),
+                        hedge_after,
+                        may_hedge=self._may_hedge,
+                        succeeded=lambda result: result[0] not in self.RETRYABLE_STATUSES,
+                    )
+                else:
+                    status, data = await self._attempt(method, url, **kwargs)
+                if status not in self.RETRYABLE_STATUSES:
+                    return status, data
+                reason = str(status)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = type(e).__name__
+            attempt += 1
+            if (method not in self.IDEMPOTENT_METHODS or attempt > self.max_retries
+                    or (self.retry_budget is not None and not self.retry_budget.try_retry())):
+                raise UpstreamUnavailableError(self.name, reason)
+            upstream_retries.inc(self.name, 'retry')
+            await asyncio.sleep(backoff_delay(attempt, self.retry_backoff_base, self.retry_backoff_cap))
+
+    def _may_hedge(self) -> bool:
+        if self.retry_budget is not None and not self.retry_budget.try_retry():
+            return False
+        upstream_retries.inc(self.name, 'hedge')
+        return True
+
+    async def _attempt(self, method: str, url: str, **kwargs) -> tuple[int, dict[str, Any]]:
+        self._requests += 1
+        start = perf_counter()
+        try:
+            async with self._session.request(method, self.BASE_URL + url, **kwargs) as resp:
+                if resp.status >= 400:
+                    upstream_errors.inc(self.name, str(resp.status))
+                    try:
+                        # error pages are not always JSON
+                        return resp.status, await resp.json(content_type=None)
+                    except ValueError:
+                        return resp.status, {}
                 return resp.status, await resp.json()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            upstream_errors.inc(self.name, 'timeout')
+            raise
+        except Exception as e:
+            upstream_errors.inc(self.name, type(e).__name__)
+            raise
+        finally:
+            upstream_request_duration_seconds.observe(perf_counter() - start, self.name, method)
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        async def on_connection_create_end(session, context, params):
+            self._connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._connections_reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
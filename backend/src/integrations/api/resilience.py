@@ -0,0 +1,139 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar('T')
+
+
+class UpstreamUnavailableError(Exception):
+    """The upstream did not answer usefully: errors or 429/5xx after all retries, the deadline, an open circuit"""
+    def __init__(self, upstream: str, reason: str):
+        super().__init__(f"{upstream} is unavailable: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    def __init__(self, upstream: str):
+        super().__init__(upstream, 'circuit_open')
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls, so calls fail fast instead of waiting on a
+    broken upstream. After `reset_timeout` seconds one probe call is let through (half-open): its success
+    closes the circuit, its failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self.failures = 0
+        self.opened = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self.clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, success: bool | None) -> None:
+        """Outcome of an allowed call; None (cancelled, unrelated error) only frees the half-open probe"""
+        self._probing = False
+        if success is None:
+            return
+        if success:
+            self.failures = 0
+            self._opened_at = None
+            return
+        self.failures += 1
+        if self._opened_at is not None or self.failures >= self.failure_threshold:
+            if self._opened_at is None:
+                self.opened += 1
+            self._opened_at = self.clock()
+
+
+class RetryBudget:
+    """
+    Caps retries at `ratio` of the calls made in the last `window` seconds (plus `min_per_second` retries),
+    so retries can not multiply the load on an upstream that is already failing.
+    """
+    def __init__(self, ratio: float, min_per_second: float, window: float = 10,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self.clock = clock
+
+        self.exhausted = 0
+        self._calls: deque[float] = deque()
+        self._retries: deque[float] = deque()
+
+    def record_call(self) -> None:
+        self._calls.append(self.clock())
+
+    def try_retry(self) -> bool:
+        """Takes a retry (or a hedged request) from the budget if there is one left"""
+        now = self.clock()
+        for events in (self._calls, self._retries):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+        if len(self._retries) >= self.min_per_second * self.window + self.ratio * len(self._calls):
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full jitter: uniform between 0 and the exponential delay of the attempt (1-based), at most `cap`"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+async def hedge(call: Callable[[], Awaitable[T]],
+                delay: float,
+                may_hedge: Callable[[], bool] = lambda: True,
+                succeeded: Callable[[T], bool] = lambda result: True,
+                ) -> T:
+    """
+    Starts `call`; if it has not finished after `delay` seconds (and `may_hedge()`), starts it a second time
+    and returns whichever finishes first with a result that `succeeded`. The other one is cancelled. If both
+    fail the second one's outcome is returned (or raised).
+    """
+    first = asyncio.ensure_future(call())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not may_hedge():
+            return await first
+        second = asyncio.ensure_future(call())
+        tasks.append(second)
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and succeeded(task.result()):
+                    return task.result()
+        return second.result()
+    finally:
+        # the caller may be cancelled while waiting, the calls must not outlive it
+        for task in tasks:
+            task.cancel()
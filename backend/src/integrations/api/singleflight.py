@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight, further callers with the same
+    key await the same future instead of starting their own. The shared call is shielded from cancellation
+    of a single caller and is only cancelled when every caller waiting on it has been cancelled.
+    """
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self._waiters: dict[Hashable, int] = {}
+        self.executed = 0
+        self.deduplicated = 0
+
+    @staticmethod
+    def make_key(method: str, url: str, params: dict[str, Any] | None = None,
+                 headers: dict[str, str] | None = None) -> Hashable:
+        return (
+            method.upper(),
+            url.rstrip('/'),
+            tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())),
+            tuple(sorted((str(k).lower(), str(v)) for k, v in (headers or {}).items())),
+        )
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._calls.get(key)
+        if future is None:
+            self.executed += 1
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            self._waiters[key] = 0
+            future.add_done_callback(lambda f: self._forget(key, f))
+        else:
+            self.deduplicated += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.done():
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0:
+                    # a caller arriving while the call winds down starts a new one instead of joining it
+                    del self._calls[key]
+                    del self._waiters[key]
+                    future.cancel()
+            raise
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "deduplicated": self.deduplicated,
+        }
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+            del self._waiters[key]
+        if not future.cancelled():
+            # mark the exception as retrieved even if every caller has gone away
+            future.exception()
@@ -0,0 +1,261 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+
+from src.integrations.api.books.fake_google_books import FakeGoogleBooks, volume_id
+from src.integrations.api.client import AioHTTPSessionClient
+from src.integrations.api.resilience import (
+    CircuitBreaker, CircuitOpenError, RetryBudget, UpstreamUnavailableError, hedge
+)
+from src.integrations.api.singleflight import SingleFlight
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SlowFirstRequest(FakeGoogleBooks):
+    """The first request takes 0.2s, later ones are answered at once"""
+    async def _delay_or_fail(self):
+        self.requests += 1
+        if self.requests == 1:
+            await asyncio.sleep(0.2)
+        return None
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    """Starts the given FakeGoogleBooks; returns a client for it built with the given resilience settings"""
+    runners, clients = [], []
+
+    async def start(server: FakeGoogleBooks, **settings) -> AioHTTPSessionClient:
+        runner, base_url = await server.serve()
+        runners.append(runner)
+        clients.append(AioHTTPSessionClient(base_url + '/v1/volumes', coalesce_requests=False, **settings))
+        return clients[-1]
+
+    yield start
+    for client in clients:
+        await client.close()
+    # let the server finish the requests the clients gave up on (deadline, hedging)
+    await asyncio.sleep(0.25)
+    for runner in runners:
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_single_flight_deduplicates_concurrent_calls():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    key = SingleFlight.make_key('GET', '/volumes/', {'q': 'python', 'fields': 'id'})
+    same_key = SingleFlight.make_key('get', '/volumes', {'fields': 'id', 'q': 'python'})
+    results = await asyncio.gather(*[single_flight.do(k, fetch) for k in (key, same_key, key)])
+
+    assert results == [1, 1, 1]
+    assert calls == 1
+    assert single_flight.stats() == {"in_flight": 0, "executed": 1, "deduplicated": 2}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_cancelled_caller():
+    single_flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def fetch():
+        started.set()
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    first = asyncio.create_task(single_flight.do('key', fetch))
+    second = asyncio.create_task(single_flight.do('key', fetch))
+    await started.wait()
+    first.cancel()
+
+    assert await second == 'result'
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancels_call_without_callers():
+    single_flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def fetch():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.create_task(single_flight.do('key', fetch))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert single_flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_new_caller_does_not_join_cancelled_call():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        if calls > 1:
+            return 'result'
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            # cleanup keeps the cancelled call in flight for a while
+            await asyncio.sleep(0.01)
+            raise
+
+    caller = asyncio.create_task(single_flight.do('key', fetch))
+    await asyncio.sleep(0)
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+
+    assert await single_flight.do('key', fetch) == 'result'
+    assert calls == 2
+
+
+def test_circuit_breaker_opens_and_probes():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # one probe at a time
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.opened == 1
+
+
+def test_retry_budget():
+    clock = Clock()
+    budget = RetryBudget(ratio=0.1, min_per_second=0.1, window=10, clock=clock)
+    for _ in range(20):
+        budget.record_call()
+    # 1 retry from the minimum and 2 from the calls
+    assert [budget.try_retry() for _ in range(4)] == [True, True, True, False]
+    clock.now = 11
+    assert budget.try_retry()
+    assert budget.exhausted == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_returns_the_faster_call():
+    delays = [1, 0]
+    cancelled = []
+
+    async def call():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    assert await hedge(call, 0.01) == 0
+    await asyncio.sleep(0)
+    assert cancelled == [1]
+
+
+@pytest.mark.asyncio
+async def test_hedge_cancelled_caller_cancels_the_call():
+    started, cancelled = asyncio.Event(), []
+
+    async def call():
+        started.set()
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    caller = asyncio.ensure_future(hedge(call, 0.5))
+    await started.wait()
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    await asyncio.sleep(0)
+    assert cancelled == [True]
+
+
+@pytest.mark.asyncio
+async def test_hedge_both_calls_failing_together_raise_the_second_outcome():
+    # both calls end up in the same `done` set; repeated since the iteration order of a set varies
+    for _ in range(20):
+        release = asyncio.Event()
+        names = iter(['first', 'second'])
+
+        async def call():
+            name = next(names)
+            if name == 'second':
+                release.set()
+            await release.wait()
+            raise ValueError(name)
+
+        with pytest.raises(ValueError, match='second'):
+            await hedge(call, 0.001)
+
+
+@pytest.mark.asyncio
+async def test_client_retries_then_opens_circuit(upstream):
+    server = FakeGoogleBooks(error_rate=1.)
+    client = await upstream(server, max_retries=2, retry_backoff_base=0.001,
+                            circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailableError) as e:
+            await client.get(f"/{volume_id(1)}")
+        assert e.value.reason == '503'
+    assert server.requests == 6
+
+    with pytest.raises(CircuitOpenError):
+        await client.get(f"/{volume_id(1)}")
+    assert server.requests == 6
+
+
+@pytest.mark.asyncio
+async def test_client_deadline_and_hedging(upstream):
+    client = await upstream(FakeGoogleBooks(latency=0.2), deadline=0.05)
+    start = time.perf_counter()
+    with pytest.raises(UpstreamUnavailableError) as e:
+        await client.get(f"/{volume_id(1)}")
+    assert e.value.reason == 'deadline'
+    assert time.perf_counter() - start < 0.15
+
+    server = SlowFirstRequest()
+    client = await upstream(server, deadline=0.5)
+    status, data = await client.get(f"/{volume_id(1)}", hedge_after=0.02)
+    assert status == 200 and data["id"] == volume_id(1)
+    assert server.requests == 2
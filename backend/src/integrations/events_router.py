@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+
+from src.integrations.api.books.google_books import GoogleBooksAPI
+from src.utils.logger import logger
+
+
+router = APIRouter()
+
+
+@router.on_event("startup")
+async def startup():
+    await GoogleBooksAPI.session_client.start()
+
+
+@router.on_event("shutdown")
+async def shutdown():
+    logger.info(f"Google Books API pool stats: {GoogleBooksAPI.session_client.pool_stats()}")
+    if GoogleBooksAPI.session_client.single_flight is not None:
+        logger.info(f"Google Books API coalescing stats: {GoogleBooksAPI.session_client.single_flight.stats()}")
+    await GoogleBooksAPI.session_client.close()
@@ -2,6 +2,9 @@ from fastapi import FastAPI
 
 from src.api.router import router as api_router
 from src.cache.events_router import router as cache_events_router
+from src.integrations.events_router import router as integrations_events_router
+from src.metrics.router import router as metrics_router
+from src.services.events_router import router as services_events_router
 from src.middlewares import LoggingMiddleware
 
 app = FastAPI(
@@ -11,7 +14,10 @@ app = FastAPI(
 
 app.add_middleware(LoggingMiddleware)
 
-# startup, shutdown events
+# startup, shutdown events; the services' background workers stop before the clients they use are closed
+app.include_router(services_events_router)
 app.include_router(cache_events_router)
+app.include_router(integrations_events_router)
 # routes
 app.include_router(api_router)
+app.include_router(metrics_router)
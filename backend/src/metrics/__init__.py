@@ -0,0 +1,2 @@
+from .registry import REGISTRY, Registry, Counter, Gauge, CallbackGauge, CallbackCounter, Histogram
+from .metrics import *
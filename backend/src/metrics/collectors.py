@@ -0,0 +1,95 @@
+"""Scrape-time gauges over pools and caches that keep their own counters"""
+from src.cache.client import redis_client
+from src.cache.metadata import books_metadata_cache
+from src.database.database import engine
+from src.integrations.api.books.google_books import GoogleBooksAPI
+from src.services.books.enrichment import enrichment_queue
+from src.services.users import PasswordService
+from .registry import CallbackCounter, CallbackGauge
+
+
+def db_pool_stats() -> dict[tuple[str, ...], float]:
+    pool = engine.pool
+    return {
+        ("size",): pool.size(),
+        ("checked_out",): pool.checkedout(),
+        ("checked_in",): pool.checkedin(),
+        ("overflow",): pool.overflow(),
+    }
+
+
+def redis_pool_stats() -> dict[tuple[str, ...], float]:
+    pool = redis_client.connection_pool
+    # redis-py does not expose these counters publicly
+    return {
+        ("max",): pool.max_connections,
+        ("available",): len(pool._available_connections),
+        ("in_use",): len(pool._in_use_connections),
+    }
+
+
+def upstream_pool_stats() -> dict[tuple[str, ...], float]:
+    client = GoogleBooksAPI.session_client
+    stats = client.pool_stats()
+    return {
+        (client.name, state): stats[state]
+        for state in ("acquired", "idle", "waiting")
+    }
+
+
+def upstream_events() -> dict[tuple[str, ...], float]:
+    client = GoogleBooksAPI.session_client
+    stats = client.pool_stats()
+    events = {
+        (client.name, event): stats[event]
+        for event in ("requests", "connections_created", "connections_reused")
+    }
+    if client.single_flight is not None:
+        events[(client.name, "deduplicated")] = client.single_flight.stats()["deduplicated"]
+    if client.circuit_breaker is not None:
+        events[(client.name, "circuit_opened")] = client.circuit_breaker.opened
+    if client.retry_budget is not None:
+        events[(client.name, "retry_budget_exhausted")] = client.retry_budget.exhausted
+    return events
+
+
+def upstream_circuit_state() -> dict[tuple[str, ...], float]:
+    client = GoogleBooksAPI.session_client
+    breaker = client.circuit_breaker
+    if breaker is None:
+        return {}
+    state = breaker.state
+    return {
+        (client.name, name): float(state == name)
+        for name in (breaker.CLOSED, breaker.OPEN, breaker.HALF_OPEN)
+    }
+
+
+def books_metadata_cache_events() -> dict[tuple[str, ...], float]:
+    stats = books_metadata_cache.stats()
+    return {(event,): stats[event] for event in (*books_metadata_cache.counters, "evictions")}
+
+
+def books_enrichment_events() -> dict[tuple[str, ...], float]:
+    return {(event,): value for event, value in enrichment_queue.stats().items()}
+
+
+def password_executor_stats() -> dict[tuple[str, ...], float]:
+    stats = PasswordService.executor.stats()
+    return {(state,): stats[state] for state in ("workers", "waiting", "running")}
+
+
+CallbackGauge('db_pool_connections', 'SQLAlchemy pool connections by state', db_pool_stats, ('state',))
+CallbackGauge('redis_pool_connections', 'Redis pool connections by state', redis_pool_stats, ('state',))
+CallbackGauge('upstream_pool_connections', 'Upstream HTTP pool connections by state', upstream_pool_stats,
+              ('upstream', 'state'))
+CallbackCounter('upstream_events', 'Upstream HTTP client events', upstream_events, ('upstream', 'event'))
+CallbackGauge('upstream_circuit_state', 'Upstream circuit breaker state (1 for the current one)',
+              upstream_circuit_state, ('upstream', 'state'))
+CallbackCounter('books_metadata_cache_events', 'Books metadata cache events', books_metadata_cache_events,
+                ('event',))
+CallbackGauge('books_metadata_cache_size', 'Entries in the in-process books metadata cache',
+              lambda: {(): books_metadata_cache.stats()["l1_size"]})
+CallbackCounter('books_enrichment_events', 'Books enrichment queue events', books_enrichment_events, ('event',))
+CallbackGauge('password_executor_tasks', 'Password hashing pool workers and tasks by state',
+              password_executor_stats, ('state',))
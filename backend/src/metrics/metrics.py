@@ -0,0 +1,53 @@
+from .registry import Counter, Gauge, Histogram
+
+DB_WAIT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100)
+
+http_requests_in_flight = Gauge(
+    'http_requests_in_flight', 'HTTP requests being served',
+)
+http_request_duration_seconds = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route'),
+)
+http_responses = Counter(
+    'http_responses', 'HTTP responses by route and status', ('method', 'route', 'status'),
+)
+
+db_sessions_open = Gauge(
+    'db_sessions_open', 'Database sessions currently open',
+)
+db_session_duration_seconds = Histogram(
+    'db_session_duration_seconds', 'Time a database session stays open',
+)
+db_connection_wait_seconds = Histogram(
+    'db_connection_wait_seconds', 'Time from the first statement of a transaction to getting a pool connection',
+    buckets=DB_WAIT_BUCKETS,
+)
+db_query_duration_seconds = Histogram(
+    'db_query_duration_seconds', 'SQL statement execution time', buckets=DB_WAIT_BUCKETS,
+)
+db_slow_queries = Counter(
+    'db_slow_queries', 'SQL statements slower than DB__SLOW_QUERY_MS',
+)
+db_request_queries = Histogram(
+    'db_request_queries', 'SQL statements per HTTP request by route', ('method', 'route'),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_request_duration_seconds = Histogram(
+    'db_request_duration_seconds', 'Total SQL execution time per HTTP request by route', ('method', 'route'),
+    buckets=DB_WAIT_BUCKETS,
+)
+
+upstream_request_duration_seconds = Histogram(
+    'upstream_request_duration_seconds', 'Upstream API call latency', ('upstream', 'method'),
+)
+upstream_errors = Counter(
+    'upstream_errors', 'Failed upstream API calls by reason', ('upstream', 'reason'),
+)
+upstream_retries = Counter(
+    'upstream_retries', 'Upstream API requests sent again by kind (retry, hedge)', ('upstream', 'kind'),
+)
+
+cache_requests = Counter(
+    'cache_requests', 'Response cache lookups by namespace and result', ('namespace', 'result'),
+)
@@ -0,0 +1,164 @@
+import math
+from typing import Callable, Iterable
+
+from src.utils.logger import logger
+
+Labels = tuple[str, ...]
+Sample = tuple[str, Labels, float]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+class Metric:
+    type: str = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), registry: 'Registry' = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        (registry or REGISTRY).register(self)
+
+    def samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+    def _check_labels(self, values: tuple[str, ...]) -> Labels:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        return tuple(str(value) for value in values)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[Labels, float] = {} if self.labelnames else {(): 0.}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._check_labels(labels)
+        self._values[key] = self._values.get(key, 0.) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}_total", dict(zip(self.labelnames, labels)), value
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[Labels, float] = {} if self.labelnames else {(): 0.}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[self._check_labels(labels)] = value
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._check_labels(labels)
+        self._values[key] = self._values.get(key, 0.) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, dict(zip(self.labelnames, labels)), value
+
+
+class CallbackGauge(Metric):
+    """Gauge whose values are read from `callback` at scrape time: {label values: value}"""
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], dict[Labels, float]],
+                 labelnames: Iterable[str] = (), registry: 'Registry' = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+
+    def samples(self):
+        try:
+            values = self.callback()
+        except Exception as e:
+            # one broken collector must not fail the whole scrape
+            logger.warning(f"Error collecting metric {self.name}: {e!r}")
+            return
+        for labels, value in values.items():
+            yield self.name, dict(zip(self.labelnames, self._check_labels(labels))), value
+
+
+class CallbackCounter(CallbackGauge):
+    """Counter whose values are read from `callback` at scrape time, for counters kept by other objects"""
+    type = 'counter'
+
+    def samples(self):
+        for name, labels, value in super().samples():
+            yield f"{name}_total", labels, value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1., 2.5, 5., 7.5, 10.)
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum]
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._check_labels(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * len(self.buckets), [0.])
+        counts, total = entry
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        total[0] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._values.items():
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**base, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_count", base, cumulative
+            yield f"{self.name}_sum", base, total[0]
+
+
+class Registry:
+    """Minimal metrics registry rendered in the Prometheus text exposition format (version 0.0.4)"""
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    label_str = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+                    lines.append(f"{name}{{{label_str}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from starlette.responses import Response
+
+from . import collectors  # noqa: F401 registers the scrape-time gauges
+from .registry import REGISTRY
+
+router = APIRouter(
+    tags=['metrics']
+)
+
+
+@router.get(path='/metrics', include_in_schema=False)
+async def metrics():
+    return Response(REGISTRY.render(), media_type=REGISTRY.content_type)
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from starlette.responses import PlainTextResponse
+
+from src.database.instrumentation import _record, query_stats
+from src.metrics import Registry, Counter, Gauge, Histogram, CallbackGauge, http_responses
+from src.middlewares import LoggingMiddleware
+
+
+def test_registry_render():
+    registry = Registry()
+    counter = Counter('test_requests', 'Requests', ('status',), registry=registry)
+    gauge = Gauge('test_in_flight', 'In flight', registry=registry)
+    histogram = Histogram('test_latency_seconds', 'Latency', ('route',), buckets=(.1, 1.), registry=registry)
+    CallbackGauge('test_pool', 'Pool', lambda: {("idle",): 3}, ('state',), registry=registry)
+
+    counter.inc('200')
+    counter.inc('200', amount=2)
+    gauge.inc()
+    histogram.observe(.05, '/a')
+    histogram.observe(.5, '/a')
+    histogram.observe(5, '/a')
+
+    text = registry.render()
+    assert '# TYPE test_requests counter' in text
+    assert 'test_requests_total{status="200"} 3.0' in text
+    assert 'test_in_flight 1.0' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{route="/a"} 3' in text
+    assert 'test_pool{state="idle"} 3' in text
+
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        Gauge('test_in_flight', 'Duplicate', registry=registry)
+
+
+@pytest.mark.asyncio
+async def test_logging_middleware_records_route_metrics():
+    class Route:
+        path = '/items/{id}'
+
+    async def app(scope, receive, send):
+        scope["route"] = Route()
+        await PlainTextResponse("ok", status_code=201)(scope, receive, send)
+
+    async def receive():
+        await asyncio.sleep(1)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    before = http_responses._values.get(('GET', '/items/{id}', '201'), 0)
+    scope = {"type": "http", "method": "GET", "path": "/items/1", "headers": [], "query_string": b""}
+    await LoggingMiddleware(app)(scope, receive, send)
+    assert http_responses._values[('GET', '/items/{id}', '201')] == before + 1
+    assert scope["state"]["session_id"]
+
+
+@pytest.mark.asyncio
+async def test_logging_middleware_reports_db_time():
+    async def app(scope, receive, send):
+        # what the engine hooks do for every statement run while the request is handled
+        _record("SELECT 1", 0.002)
+        _record("SELECT 2", 0.003)
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    async def receive():
+        await asyncio.sleep(1)
+        return {"type": "http.disconnect"}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/items", "headers": [], "query_string": b""}
+    await LoggingMiddleware(app)(scope, receive, send)
+    headers = dict(messages[0]["headers"])
+    assert headers[b"server-timing"] == b'db;dur=5.0;desc="2 queries"'
+    assert query_stats.get() is None
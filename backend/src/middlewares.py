@@ -1,30 +1,72 @@
 import uuid
 from time import perf_counter
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from src.database.instrumentation import QueryStats, query_stats
+from src.metrics import (
+    db_request_duration_seconds,
+    db_request_queries,
+    http_request_duration_seconds,
+    http_requests_in_flight,
+    http_responses,
+)
 from src.utils.logger import logger
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    def __init__(
-            self,
-            app,
-    ):
-        super().__init__(app)
-
-    async def dispatch(self, request: Request, call_next):
-        request.state.session_id = str(uuid.uuid4())
-        logger.debug(f"{request.state.session_id} - OPENED: {request.method} {request.url.components.path} ")
-        response = await call_next(request)
-        log = (f"{request.state.session_id} - CLOSED: "
-               f"{request.method} {request.url.components.path} "
-               f"{response.status_code} ")
-        if 500 <= response.status_code < 600:
-            logger.error(log)
-            logger.error(request.state.session_id, repr(request))
-            logger.error(request.state.session_id, repr(response))
-        else:
-            logger.info(log)
-        return response
+class LoggingMiddleware:
+    """
+    Pure ASGI middleware: sets `request.state.session_id`, logs method, path, status and duration and records
+    the request metrics (labelled by route template, not by raw path). SQL statements run for the request are
+    counted and timed, the totals so far are sent in the `Server-Timing` header.
+
+    Unlike BaseHTTPMiddleware it does not wrap the request in a task or the response body in a stream, so
+    streaming responses pass through untouched.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        session_id = str(uuid.uuid4())
+        scope.setdefault("state", {})["session_id"] = session_id
+        method, path = scope["method"], scope["path"]
+        logger.debug(f"{session_id} - OPENED: {method} {path} ")
+
+        status_code = 500
+        start = perf_counter()
+        http_requests_in_flight.inc()
+        stats = QueryStats(session_id)
+        stats_token = query_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (b"server-timing", stats.server_timing().encode())],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            query_stats.reset(stats_token)
+            duration = perf_counter() - start
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            http_request_duration_seconds.observe(duration, method, route_path)
+            http_responses.inc(method, route_path, str(status_code))
+            db_request_queries.observe(stats.count, method, route_path)
+            db_request_duration_seconds.observe(stats.duration, method, route_path)
+            log = (f"{session_id} - CLOSED: {method} {path} {status_code} {duration * 1000:.1f}ms "
+                   f"(db: {stats.count} queries, {stats.duration * 1000:.1f}ms)")
+            if 500 <= status_code < 600:
+                logger.error(log)
+            else:
+                logger.info(log)
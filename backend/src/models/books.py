@@ -1,11 +1,12 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, Table, Column, Integer
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy import ForeignKey, Table, Column, Integer, Computed, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database.metadata import Base
-from src.database.sqla_types import int_pk_c, str2_c, str16_c, str256_c, str512_c, datetime_c
-from src.schemas.books import BookDTO
+from src.database.sqla_types import int_pk_c, int_array_c, str2_c, str16_c, str256_c, str512_c, datetime_c
+from src.schemas.books import AuthorDTO, BookDTO, BookMetadataStatus, CategoryDTO
 
 if TYPE_CHECKING:
     from src.models import Users
@@ -15,11 +16,46 @@ books_users_association_table = Table(
     Base.metadata,
     Column("left_id", ForeignKey("books.id"), primary_key=True),
     Column("right_id", ForeignKey("users.id"), primary_key=True),
+    Index('ix_books_users_associations_right_id_left_id', 'right_id', 'left_id'),
 )
 
 
+class Categories(Base):
+    __tablename__ = 'categories'
+
+    id: Mapped[int_pk_c]
+    name: Mapped[str256_c] = mapped_column(unique=True)
+
+    def to_DTO(self) -> CategoryDTO:
+        return CategoryDTO(
+            id=self.id,
+            name=self.name,
+        )
+
+
+class Authors(Base):
+    __tablename__ = 'authors'
+
+    id: Mapped[int_pk_c]
+    name: Mapped[str256_c] = mapped_column(unique=True)
+
+    def to_DTO(self) -> AuthorDTO:
+        return AuthorDTO(
+            id=self.id,
+            name=self.name,
+        )
+
+
 class Books(Base):
     __tablename__ = 'books'
+    __table_args__ = (
+        Index('ix_books_gb_id', 'gb_id', unique=True),
+        Index('ix_books_ISBN', 'ISBN'),
+        Index('ix_books_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_books_category_ids', 'category_ids', postgresql_using='gin',
+              postgresql_ops={'category_ids': 'gin__int_ops'}),
+        Index('ix_books_metadata_status_pending', 'id', postgresql_where=text("metadata_status = 'pending'")),
+    )
 
     id: Mapped[int_pk_c]
     gb_id: Mapped[str16_c]
@@ -30,9 +66,28 @@ class Books(Base):
     language: Mapped[str2_c | None]
     pub_date: Mapped[str | None]
 
+    # display strings as returned by Google Books; filtering goes through the ids
     categories: Mapped[str]
+    category_ids: Mapped[int_array_c]
 
     authors: Mapped[str]
+    author_ids: Mapped[int_array_c]
+
+    metadata_status: Mapped[str16_c] = mapped_column(
+        default=BookMetadataStatus.ready.value, server_default=BookMetadataStatus.ready.value
+    )
+
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(subtitle, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(authors, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'C')",
+            persisted=True
+        ),
+        deferred=True
+    )
 
     users: Mapped[set['Users']] = relationship(
         secondary=books_users_association_table, back_populates="books", lazy='noload'
@@ -49,5 +104,8 @@ class Books(Base):
             language=self.language,
             pub_date=self.pub_date,
             categories=self.categories,
+            category_ids=self.category_ids,
             authors=self.authors,
+            author_ids=self.author_ids,
+            metadata_status=self.metadata_status,
         )
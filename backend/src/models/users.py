@@ -1,13 +1,13 @@
 import datetime
 from typing import Any, TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, ARRAY, Integer, String
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database.metadata import Base
-from src.database.sqla_types import int_pk_c, str256_c, str512_c, created_at_c, str32_c
+from src.database.sqla_types import int_pk_c, int_array_c, str256_c, str512_c, created_at_c, str32_c
 from src.models import books_users_association_table
-from src.schemas.users import UserDTO, UserAPIKeyDTO
+from src.schemas.users import UserDTO, UserAPIKeyDTO, UserPermissions
 
 if TYPE_CHECKING:
     from src.models import Books
@@ -23,7 +23,8 @@ class Users(Base):
     password: Mapped[str512_c]
     banned: Mapped[bool] = mapped_column(default=False)
     permissions: Mapped[dict[str, Any]]
-    excluded_categories: Mapped[set[str]] = mapped_column(ARRAY(String), default=[])
+    excluded_category_ids: Mapped[int_array_c]
+    token_version: Mapped[int] = mapped_column(default=0, server_default=text('0'))
     created_at: Mapped[created_at_c]
 
     api_keys: Mapped[list['UserAPIKeys']] = relationship(back_populates='user', lazy='noload')
@@ -33,15 +34,17 @@ class Users(Base):
     )
 
     def to_DTO(self, with_password: bool = False) -> UserDTO:
-        return UserDTO(
+        # rows are validated on write, so the DTO is built without revalidation (EmailStr checks are expensive)
+        return UserDTO.model_construct(
             id=self.id,
             name=self.name,
             email=self.email,
             username=self.username,
             password=self.password if with_password else None,
             banned=self.banned,
-            permissions=self.permissions,
-            excluded_categories=self.excluded_categories,
+            permissions=UserPermissions.model_construct(**self.permissions),
+            excluded_category_ids=self.excluded_category_ids,
+            token_version=self.token_version,
             created_at=self.created_at,
             api_keys=[api_key.to_DTO() for api_key in self.api_keys] if self.api_keys else None
         )
@@ -49,6 +52,9 @@ class Users(Base):
 
 class UserAPIKeys(Base):
     __tablename__ = 'user_api_keys'
+    __table_args__ = (
+        Index('ix_user_api_keys_user_id_id', 'user_id', 'id'),
+    )
 
     id: Mapped[int_pk_c]
     key: Mapped[str32_c]
@@ -1,27 +1,242 @@
-from sqlalchemy import and_, select
+from typing import AsyncIterator, Iterable, Sequence
+
+from sqlalchemy import (
+    ColumnElement, Integer, Select, and_, exists, false, func, literal, or_, select, true, union_all, update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.utils.repository import SQLAlchemyRepository, M2MRepository
+from src.schemas.pagination import PageDTO
+from src.utils.repository import SQLAlchemyRepository, M2MRepository, SchemaType
 from src.models.books import *
 from src.schemas.books import (
+    AuthorDTO,
     BookDTO,
-    BookUserAssociationDTO
+    BookMetadataStatus,
+    BookUserAssociationDTO,
+    CategoryDTO,
 )
 
 
+class NamesRepository(SQLAlchemyRepository[SchemaType]):
+    """Lookup table of unique names (categories, authors)"""
+
+    async def get_ids(self, names: Iterable[str], create: bool = False) -> dict[str, int]:
+        """Ids by name; with `create` the missing names are inserted in the same statement"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        ids = await self.add_missing(names) if create else {}
+        missing = [name for name in names if name not in ids]
+        if missing:
+            res = await self.session.execute(select(self.model.id, self.model.name).where(self.model.name.in_(missing)))
+            ids.update({row.name: row.id for row in res.all()})
+        return ids
+
+    async def add_missing(self, names: Iterable[str]) -> dict[str, int]:
+        """Inserts the names that are not in the table yet and returns the ids of the inserted ones"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        stmt = pg_insert(self.model).values([{"name": name} for name in names]).on_conflict_do_nothing(
+            index_elements=[self.model.name]
+        ).returning(self.model.id, self.model.name)
+        res = await self.session.execute(stmt)
+        return {row.name: row.id for row in res.all()}
+
+
+class CategoriesRepository(NamesRepository[CategoryDTO]):
+    model = Categories
+    dto = CategoryDTO
+
+
+class AuthorsRepository(NamesRepository[AuthorDTO]):
+    model = Authors
+    dto = AuthorDTO
+
+
 class BooksRepository(SQLAlchemyRepository[BookDTO]):
     model = Books
+    dto = BookDTO
 
     def __init__(self, session: AsyncSession | None = None):
         super().__init__(session)
         self.users_library_repo = M2MRepository(
             self.session, books_users_association_table, BookUserAssociationDTO
         )
+        self.categories_repo = CategoriesRepository(self.session)
+        self.authors_repo = AuthorsRepository(self.session)
+
+    async def get_one_by_ISBN(self,
+                              isbn: str,
+                              excluded_category_ids: Sequence[int] = (),
+                              ) -> tuple[BookDTO, bool] | None:
+        """The book and whether it is visible to a user who excluded `excluded_category_ids`"""
+        stmt = select(*self._projection(), self._not_excluded(excluded_category_ids).label('visible')).where(
+            Books.ISBN == isbn
+        ).limit(1)
+        res = await self.session.execute(stmt)
+        row = res.mappings().first()
+        if row is None:
+            return None
+        return self._row_to_DTO(row), row['visible']
+
+    async def get_user_library(self, user_id: int, excluded_category_ids: Sequence[int] = ()) -> list[BookDTO]:
+        res = await self.session.execute(self._user_library_stmt(user_id, excluded_category_ids))
+        return [self._row_to_DTO(row) for row in res.mappings()]
+
+    async def get_user_library_page(self,
+                                    user_id: int,
+                                    limit: int,
+                                    cursor: str | None = None,
+                                    excluded_category_ids: Sequence[int] = (),
+                                    ) -> PageDTO[BookDTO]:
+        return await self._get_page(self._user_library_stmt(user_id, excluded_category_ids), limit, cursor)
+
+    async def stream_user_library(self,
+                                  user_id: int,
+                                  batch_size: int,
+                                  excluded_category_ids: Sequence[int] = (),
+                                  ) -> AsyncIterator[BookDTO]:
+        stmt = self._user_library_stmt(user_id, excluded_category_ids).order_by(Books.id).execution_options(
+            yield_per=batch_size
+        )
+        res = await self.session.stream(stmt)
+        async for row in res.mappings():
+            yield self._row_to_DTO(row)
 
-    async def get_user_library(self, user_id: int) -> list[BookDTO]:
-        stmt = select(Books).join(books_users_association_table).where(
-            books_users_association_table.c.right_id == user_id
+    def _user_library_stmt(self, user_id: int, excluded_category_ids: Sequence[int] = ()) -> Select:
+        return select(*self._projection()).join(books_users_association_table).where(
+            books_users_association_table.c.right_id == user_id,
+            self._not_excluded(excluded_category_ids),
         )
+
+    @staticmethod
+    def _not_excluded(excluded_category_ids: Sequence[int]) -> ColumnElement[bool]:
+        """`NOT category_ids && :excluded`, served by the gin__int_ops index on category_ids"""
+        if not excluded_category_ids:
+            return true()
+        return ~Books.category_ids.overlap(list(excluded_category_ids))
+
+    async def get_many(self, ids: list[int] | None = None, gb_ids: list[str] | None = None) -> list[BookDTO]:
+        conditions = []
+        if ids:
+            conditions.append(Books.id.in_(ids))
+        if gb_ids:
+            conditions.append(Books.gb_id.in_(gb_ids))
+        if not conditions:
+            return []
+        stmt = select(Books).where(or_(*conditions))
         res = await self.session.execute(stmt)
         return [row[0].to_DTO() for row in res.all()]
 
+    async def add_many_by_gb_id(self, data: list[dict]) -> dict[str, int]:
+        """Inserts books in one statement and returns ids by gb_id, including books that already existed"""
+        if not data:
+            return {}
+        stmt = pg_insert(Books).values(data).on_conflict_do_nothing(
+            index_elements=[Books.gb_id]
+        ).returning(Books.id, Books.gb_id)
+        res = await self.session.execute(stmt)
+        book_ids = {row.gb_id: row.id for row in res.all()}
+        existing_gb_ids = [book["gb_id"] for book in data if book["gb_id"] not in book_ids]
+        if existing_gb_ids:
+            res = await self.session.execute(select(Books.id, Books.gb_id).where(Books.gb_id.in_(existing_gb_ids)))
+            book_ids.update({row.gb_id: row.id for row in res.all()})
+        return book_ids
+
+    async def add_to_user_library(self,
+                                  user_id: int,
+                                  id: int | None = None,
+                                  gb_id: str | None = None,
+                                  ) -> tuple[int, bool, bool] | None:
+        """
+        Adds the book to the library in one statement: (book id, whether the book was created, whether the
+        association was added), None when there is no book with `id`. A `gb_id` missing from the catalog is
+        inserted as a `pending` placeholder for the enrichment worker to fill.
+        """
+        if id is not None:
+            book = select(Books.id, false().label('created')).where(Books.id == id).cte('book')
+        else:
+            # DO NOTHING and a select of the existing row, so adding a known book does not rewrite its row
+            inserted = pg_insert(Books).values(
+                gb_id=gb_id, categories='', authors='', metadata_status=BookMetadataStatus.pending.value,
+            ).on_conflict_do_nothing(
+                index_elements=[Books.gb_id]
+            ).returning(Books.id, true().label('created')).cte('inserted')
+            book = union_all(
+                select(inserted.c.id, inserted.c.created),
+                select(Books.id, false().label('created')).where(Books.gb_id == gb_id),
+            ).cte('book')
+        association = books_users_association_table
+        added = pg_insert(association).from_select(
+            [association.c.left_id, association.c.right_id], select(book.c.id, literal(user_id, Integer))
+        ).on_conflict_do_nothing().returning(association.c.left_id).cte('added')
+        stmt = select(book.c.id, book.c.created, exists(select(added.c.left_id)).label('added'))
+        res = await self.session.execute(stmt)
+        row = res.one_or_none()
+        if row is None and gb_id is not None:
+            # the conflicting book was committed after the statement's snapshot was taken: it is visible now
+            res = await self.session.execute(stmt)
+            row = res.one_or_none()
+        return None if row is None else (row.id, row.created, row.added)
+
+    async def get_pending_gb_ids(self, limit: int) -> list[str]:
+        stmt = select(Books.gb_id).where(
+            Books.metadata_status == BookMetadataStatus.pending.value
+        ).order_by(Books.id).limit(limit)
+        res = await self.session.execute(stmt)
+        return list(res.scalars().all())
+
+    async def fill_pending(self, data: list[dict]) -> list[int]:
+        """
+        Writes the metadata of `pending` placeholders (by gb_id) in one statement and marks them `ready`;
+        books that are not pending are left as they are. Returns the ids of the filled books.
+        """
+        if not data:
+            return []
+        stmt = pg_insert(Books).values(
+            [{**book, "metadata_status": BookMetadataStatus.ready.value} for book in data]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Books.gb_id],
+            set_={name: stmt.excluded[name] for name in (*data[0], 'metadata_status') if name != 'gb_id'},
+            where=Books.metadata_status == BookMetadataStatus.pending.value,
+        ).returning(Books.id)
+        res = await self.session.execute(stmt)
+        return list(res.scalars().all())
+
+    async def set_metadata_status(self, gb_ids: list[str], status: BookMetadataStatus) -> list[int]:
+        """Moves `pending` books out of that state, returns their ids"""
+        if not gb_ids:
+            return []
+        stmt = update(Books).where(
+            Books.gb_id.in_(gb_ids), Books.metadata_status == BookMetadataStatus.pending.value
+        ).values(metadata_status=status.value).returning(Books.id)
+        res = await self.session.execute(stmt)
+        return list(res.scalars().all())
+
+    async def search(self,
+                     query: str | None = None,
+                     isbn: str | None = None,
+                     categories: list[str] | None = None,
+                     limit: int = 10,
+                     excluded_category_ids: Sequence[int] = (),
+                     ) -> list[BookDTO]:
+        """Full text search over title, subtitle, authors and description ranked by relevance"""
+        stmt = select(Books)
+        if query:
+            ts_query = func.websearch_to_tsquery('simple', query)
+            stmt = stmt.where(Books.search_vector.op('@@')(ts_query)).order_by(
+                func.ts_rank_cd(Books.search_vector, ts_query).desc()
+            )
+        if isbn:
+            stmt = stmt.where(Books.ISBN == isbn)
+        if categories:
+            category_ids = select(func.array_agg(Categories.id)).where(
+                or_(*(Categories.name.icontains(category) for category in categories))
+            ).scalar_subquery()
+            stmt = stmt.where(Books.category_ids.overlap(category_ids))
+        stmt = stmt.where(self._not_excluded(excluded_category_ids)).order_by(Books.id).limit(limit)
+        res = await self.session.execute(stmt)
+        return [row[0].to_DTO() for row in res.all()]
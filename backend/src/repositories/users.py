@@ -1,18 +1,34 @@
+import datetime
+from typing import Any, Mapping
+
 from sqlalchemy import and_
 
 from src.models import books_users_association_table
-from src.utils.repository import SQLAlchemyRepository, select
+from src.utils.repository import SQLAlchemyRepository, select, update
 from src.models.users import *
 
 
 class UsersRepository(SQLAlchemyRepository[UserDTO]):
     model = Users
+    dto = UserDTO
+    dto_columns = ('id', 'name', 'email', 'username', 'banned', 'permissions', 'excluded_category_ids',
+                   'token_version', 'created_at')
 
     async def get_one_by_username(self, username: str, with_password: bool = False) -> UserDTO | None:
-        stmt = select(self.model).filter_by(username=username)
+        columns = (*self.dto_columns, 'password') if with_password else None
+        return await self.get_row(columns, username=username)
+
+    async def get_token_version(self, user_id: int) -> int | None:
+        stmt = select(self.model.token_version).filter_by(id=user_id)
+        res = await self.session.execute(stmt)
+        return res.scalar_one_or_none()
+
+    async def bump_token_version(self, user_id: int) -> int:
+        stmt = update(self.model).values(token_version=self.model.token_version + 1).filter_by(
+            id=user_id
+        ).returning(self.model.token_version)
         res = await self.session.execute(stmt)
-        res = res.scalar_one_or_none()
-        return None if res is None else res.to_DTO(with_password)
+        return res.scalar_one()
 
     async def add_book(self, user_id: int, book_id: int) -> None:
         stmt = books_users_association_table.insert().values(user_id=user_id, book_id=book_id)
@@ -25,6 +41,28 @@ class UsersRepository(SQLAlchemyRepository[UserDTO]):
         )
         await self.session.execute(stmt)
 
+    def _row_to_DTO(self, row: Mapping[str, Any], partial: bool = False) -> UserDTO:
+        # rows are validated on write, so the DTO is built without revalidation (EmailStr checks are expensive)
+        data = {"password": None, **row}
+        if "permissions" in data:
+            data["permissions"] = UserPermissions.model_construct(**data["permissions"])
+        return UserDTO.model_construct(**data)
+
 
 class UserAPIKeysRepository(SQLAlchemyRepository[UserAPIKeyDTO]):
     model = UserAPIKeys
+    dto = UserAPIKeyDTO
+
+    async def get_user_by_key(self, key: str) -> tuple[UserDTO, datetime.date] | None:
+        """The key owner and the key expire date in one query"""
+        users_repo = UsersRepository(self.session)
+        stmt = select(*users_repo._projection(), self.model.expire_date).join(
+            self.model, self.model.user_id == Users.id
+        ).where(self.model.key == key)
+        res = await self.session.execute(stmt)
+        row = res.mappings().one_or_none()
+        if row is None:
+            return None
+        row = dict(row)
+        expire_date = row.pop('expire_date')
+        return users_repo._row_to_DTO(row), expire_date
@@ -1,4 +1,5 @@
 import datetime
+import enum
 
 from pydantic import BaseModel
 
@@ -8,9 +9,26 @@ class BookUserAssociationDTO(BaseModel):
     right_id: int
 
 
-# CATEGORI
+# CATEGORIES, AUTHORS
+class CategoryDTO(BaseModel):
+    id: int
+    name: str
+
+
+class AuthorDTO(BaseModel):
+    id: int
+    name: str
+
 
 # BOOKS
+class BookMetadataStatus(str, enum.Enum):
+    # a placeholder added by gb_id, waiting for its metadata from Google Books
+    pending = 'pending'
+    ready = 'ready'
+    # Google Books does not know the gb_id (or stayed unavailable)
+    failed = 'failed'
+
+
 class BookDTO(BaseModel):
     id: int
     gb_id: str
@@ -18,12 +36,16 @@ class BookDTO(BaseModel):
     title: str | None
     subtitle: str | None
     description: str | None
-    language: str
+    language: str | None
     pub_date: str | None
 
     categories: str
+    category_ids: list[int] = []
 
     authors: str
+    author_ids: list[int] = []
+
+    metadata_status: BookMetadataStatus = BookMetadataStatus.ready
 
 
 class BookCreateSchema(BaseModel):
@@ -39,3 +61,27 @@ class BookCreateSchema(BaseModel):
 class BookAPISchema(BookCreateSchema):
     categories: str | None
     authors: str | None
+
+
+class SearchSource(str, enum.Enum):
+    local = 'local'
+    remote = 'remote'
+    auto = 'auto'
+
+
+class BooksBulkAddSchema(BaseModel):
+    ids: list[int] = []
+    gb_ids: list[str] = []
+
+
+class BookBulkAddStatus(str, enum.Enum):
+    added = 'added'
+    already_in_library = 'already_in_library'
+    not_found = 'not_found'
+
+
+class BookBulkAddResultSchema(BaseModel):
+    id: int | None = None
+    gb_id: str | None = None
+    status: BookBulkAddStatus
+    detail: str | None = None
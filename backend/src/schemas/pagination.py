@@ -0,0 +1,10 @@
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+
+ItemType = TypeVar('ItemType')
+
+
+class PageDTO(BaseModel, Generic[ItemType]):
+    items: list[ItemType]
+    next_cursor: str | None = None
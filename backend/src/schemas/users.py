@@ -21,7 +21,8 @@ class UserDTO(BaseModel):
     password: str | None
     banned: bool
     permissions: UserPermissions
-    excluded_categories: list[str]
+    excluded_category_ids: list[int] = []
+    token_version: int = 0
     created_at: datetime.datetime
 
     api_keys: list['UserAPIKeyDTO'] | None = None
@@ -40,6 +41,7 @@ class UserUpdateSchema(BaseModel):
     email: EmailStr | None = None
     username: str | None = None
     password: str | None = None
+    # category names, stored as ids of the categories lookup table
     excluded_categories: list[str] | None = None
 
 
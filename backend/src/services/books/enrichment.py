@@ -0,0 +1,183 @@
+import asyncio
+import os
+import socket
+from typing import Awaitable, Callable, Iterable
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from config.books import books_settings
+from src.cache.client import redis_client
+from src.utils.logger import logger
+
+# (gb_ids, gb_ids on their last attempt) -> gb_ids to retry
+Handler = Callable[[list[str], set[str]], Awaitable[list[str]]]
+PendingLoader = Callable[[], Awaitable[list[str]]]
+
+
+class EnrichmentQueue:
+    """
+    Work queue of gb_ids whose books wait for their metadata, on a Redis stream read by a consumer group so
+    every entry is handled by one worker of one process.
+
+    The worker reads up to `batch_size` entries at a time and passes their gb_ids to the handler. Entries
+    are acknowledged once handled; the ones the handler asks to retry stay unacknowledged and are claimed
+    again (by any worker) after `claim_idle_ms`, as are the entries of a worker that died. On its last
+    attempt (`max_attempts` deliveries) a gb_id is not retried anymore. The handler must be idempotent.
+    """
+    def __init__(self,
+                 redis: Redis | None,
+                 batch_size: int,
+                 block_ms: int,
+                 max_attempts: int,
+                 claim_idle_ms: int,
+                 maxlen: int,
+                 stream: str = 'books-enrichment',
+                 group: str = 'enrichment',
+                 ):
+        self.redis = redis
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.max_attempts = max_attempts
+        self.claim_idle_ms = claim_idle_ms
+        self.maxlen = maxlen
+        self.stream = stream
+        self.group = group
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+
+        self._worker: asyncio.Task | None = None
+        self._handler: Handler | None = None
+        self.counters = {
+            "enqueued": 0,
+            "enqueue_errors": 0,
+            "handled": 0,
+            "retried": 0,
+            "batches": 0,
+            "batch_errors": 0,
+            "claimed": 0,
+            "swept": 0,
+        }
+
+    async def enqueue(self, gb_ids: Iterable[str]) -> None:
+        """
+        Never raises: a gb_id that could not be queued keeps its pending book, which the startup sweep of
+        the next worker queues again.
+        """
+        gb_ids = list(dict.fromkeys(gb_ids))
+        if not gb_ids:
+            return
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for gb_id in gb_ids:
+                    pipe.xadd(self.stream, {"gb_id": gb_id}, maxlen=self.maxlen, approximate=True)
+                await pipe.execute()
+        except Exception as e:
+            self.counters["enqueue_errors"] += len(gb_ids)
+            logger.warning(f"Error enqueuing books for enrichment {gb_ids}: {e!r}")
+            return
+        self.counters["enqueued"] += len(gb_ids)
+
+    def start(self, handler: Handler, pending_loader: PendingLoader | None = None) -> None:
+        """`pending_loader` returns the gb_ids still waiting for metadata, they are queued once at startup"""
+        if self.redis is not None and self._worker is None:
+            self._handler = handler
+            self._worker = asyncio.create_task(self._run(pending_loader))
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.counters)
+
+    async def _run(self, pending_loader: PendingLoader | None) -> None:
+        ready = False
+        while True:
+            try:
+                if not ready:
+                    await self._create_group()
+                    if pending_loader is not None:
+                        await self._sweep(pending_loader)
+                    ready = True
+                entries = await self._claim() or await self._read()
+                if entries:
+                    await self.process(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["batch_errors"] += 1
+                logger.warning(f"Enrichment worker error: {e!r}")
+                await asyncio.sleep(1)
+
+    async def _create_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def _sweep(self, pending_loader: PendingLoader) -> None:
+        # one worker sweeps per claim period, the others would only queue the same gb_ids again
+        if not await self.redis.set(f"{self.stream}:sweep", 1, nx=True, px=self.claim_idle_ms):
+            return
+        gb_ids = await pending_loader()
+        await self.enqueue(gb_ids)
+        self.counters["swept"] += len(gb_ids)
+
+    async def _claim(self) -> list[tuple[bytes, dict, int]]:
+        """Entries left unacknowledged for `claim_idle_ms`, with their delivery counts"""
+        res = await self.redis.xautoclaim(
+            self.stream, self.group, self.consumer, self.claim_idle_ms, count=self.batch_size
+        )
+        messages = [(entry_id, fields) for entry_id, fields in res[1] if fields]
+        deleted = [entry_id for entry_id, fields in res[1] if not fields] + (res[2] if len(res) > 2 else [])
+        if deleted:
+            # trimmed from the stream (maxlen) while unacknowledged
+            await self.redis.xack(self.stream, self.group, *deleted)
+        if not messages:
+            return []
+        self.counters["claimed"] += len(messages)
+        pending = await self.redis.xpending_range(
+            self.stream, self.group, min=messages[0][0], max=messages[-1][0], count=len(messages),
+            consumername=self.consumer,
+        )
+        deliveries = {entry["message_id"]: entry["times_delivered"] for entry in pending}
+        return [(entry_id, fields, deliveries.get(entry_id, self.max_attempts)) for entry_id, fields in messages]
+
+    async def _read(self) -> list[tuple[bytes, dict, int]]:
+        res = await self.redis.xreadgroup(
+            self.group, self.consumer, {self.stream: '>'}, count=self.batch_size, block=self.block_ms
+        )
+        return [(entry_id, fields, 1) for _, messages in res or [] for entry_id, fields in messages]
+
+    async def process(self, entries: list[tuple[bytes, dict, int]]) -> None:
+        """Handles one batch of (entry id, fields, delivery count) and acknowledges what is not retried"""
+        gb_ids = list(dict.fromkeys(fields[b"gb_id"].decode() for _, fields, _ in entries))
+        last_attempt = {
+            fields[b"gb_id"].decode() for _, fields, deliveries in entries if deliveries >= self.max_attempts
+        }
+        self.counters["batches"] += 1
+        retry = set(await self._handler(gb_ids, last_attempt)) - last_attempt
+        done = [entry_id for entry_id, fields, _ in entries if fields[b"gb_id"].decode() not in retry]
+        if done:
+            await self.redis.xack(self.stream, self.group, *done)
+        self.counters["handled"] += len(gb_ids) - len(retry)
+        self.counters["retried"] += len(retry)
+
+
+enrichment_queue = EnrichmentQueue(
+    redis_client,
+    batch_size=books_settings.ENRICHMENT_BATCH_SIZE,
+    block_ms=books_settings.ENRICHMENT_BLOCK_MS,
+    max_attempts=books_settings.ENRICHMENT_MAX_ATTEMPTS,
+    claim_idle_ms=books_settings.ENRICHMENT_CLAIM_IDLE_MS,
+    maxlen=books_settings.ENRICHMENT_STREAM_MAXLEN,
+)
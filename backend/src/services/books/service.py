@@ -1,9 +1,29 @@
-from src.schemas.books import BookAPISchema, BookDTO
+import asyncio
+from typing import AsyncIterator, Iterable, Sequence
+
+from config.books import books_settings
+from src.schemas.books import (
+    BookAPISchema,
+    BookDTO,
+    CategoryDTO,
+    BooksBulkAddSchema,
+    BookBulkAddResultSchema,
+    BookBulkAddStatus,
+    BookMetadataStatus,
+    SearchSource,
+)
+from src.schemas.pagination import PageDTO
 from src.schemas.users import UserDTO
 
+from src.cache.metadata import books_metadata_cache
+from src.cache.tags import CATALOG_TAG, book_tag, cache_tags, library_tag
 from src.integrations.api.books.google_books import GoogleBooksAPI
+from src.integrations.api.resilience import UpstreamUnavailableError
+from src.services.books.enrichment import enrichment_queue
 from src.schemas.books import BookDTO
 from src.utils import exceptions
+from src.utils.logger import logger
+from src.utils.utils import normalize_isbn, split_names
 from src.utils.unitofwork import UnitOfWork
 
 
@@ -11,13 +31,22 @@ class BooksService:
 
     @classmethod
     async def search(cls,
+                     uow: UnitOfWork | None = None,
                      gb_id: str | None = None,
                      query: str | None = None,
                      intitle: str | None = None,
                      inauthor: str | None = None,
                      isbn: str | None = None,
                      categories: list[str] | None = None,
+                     source: SearchSource = SearchSource.auto,
+                     current_user: UserDTO | None = None,
                      ) -> list[BookAPISchema]:
+        """
+        Searches the local catalog and/or Google Books depending on `source`. In `auto` mode the local results
+        are returned when there are at least BOOKS__LOCAL_SEARCH_MIN_HITS of them, otherwise Google Books is
+        queried, and they are the fallback while Google Books is unavailable. Local results leave out the
+        categories excluded by `current_user`.
+        """
         if not any([gb_id, query, intitle, inauthor, isbn, categories]):
             raise exceptions.NotAcceptableHTTPException("At least one search parameter is required")
         if gb_id is None and (not any([query, intitle, inauthor, isbn, categories])):
@@ -25,7 +54,58 @@ class BooksService:
                                                         "must have a value")
         if gb_id is not None and (any([query, intitle, inauthor, isbn, categories])):
             raise exceptions.NotAcceptableHTTPException("If gb_id is passed, the remaining fields must be empty")
-        return await GoogleBooksAPI.search(gb_id, query, intitle, inauthor, isbn, categories)
+        if source == SearchSource.local and uow is None:
+            raise exceptions.NotAcceptableHTTPException("Local search is not available")
+        books = None
+        if source != SearchSource.remote and uow is not None:
+            books = await cls.search_local(
+                uow, gb_id, query, intitle, inauthor, isbn, categories,
+                current_user.excluded_category_ids if current_user is not None else (),
+            )
+            if source == SearchSource.local or len(books) >= books_settings.LOCAL_SEARCH_MIN_HITS:
+                return books
+        try:
+            return await books_metadata_cache.search(
+                {
+                    "gb_id": gb_id,
+                    "query": query,
+                    "intitle": intitle,
+                    "inauthor": inauthor,
+                    "isbn": isbn,
+                    "categories": categories,
+                },
+                lambda: GoogleBooksAPI.search(gb_id, query, intitle, inauthor, isbn, categories)
+            )
+        except UpstreamUnavailableError as e:
+            if books is None:
+                raise exceptions.ServiceUnavailableHTTPException("Google Books is unavailable, try again later")
+            logger.warning(f"Serving local search results: {e}")
+            return books
+
+    @classmethod
+    async def search_local(cls,
+                           uow: UnitOfWork,
+                           gb_id: str | None = None,
+                           query: str | None = None,
+                           intitle: str | None = None,
+                           inauthor: str | None = None,
+                           isbn: str | None = None,
+                           categories: list[str] | None = None,
+                           excluded_category_ids: Sequence[int] = (),
+                           ) -> list[BookAPISchema]:
+        async with uow:
+            if gb_id is not None:
+                book = await uow.books.get_one(gb_id=gb_id)
+                books = [] if book is None else [book]
+            else:
+                books = await uow.books.search(
+                    query=' '.join(filter(None, [query, intitle, inauthor])),
+                    isbn=normalize_isbn(isbn),
+                    categories=categories,
+                    limit=books_settings.LOCAL_SEARCH_LIMIT,
+                    excluded_category_ids=excluded_category_ids,
+                )
+        return [BookAPISchema.model_validate(book.model_dump()) for book in books]
 
     @classmethod
     async def get_by_ISBN(cls,
@@ -34,12 +114,19 @@ class BooksService:
                           isbn: str,
                           ) -> BookDTO | None:
         async with uow:
-            book = await uow.books.get_one(ISBN=isbn)
-            for category in book.categories.split(', '):
-                if category in current_user.excluded_categories:
-                    return None
+            book = await uow.books.get_one_by_ISBN(normalize_isbn(isbn), current_user.excluded_category_ids)
             await uow.commit()
-        return book
+        if book is None:
+            raise exceptions.NotFoundHTTPException()
+        book, visible = book
+        return book if visible else None
+
+    @classmethod
+    async def get_categories(cls, uow: UnitOfWork) -> list[CategoryDTO]:
+        async with uow:
+            categories = await uow.books.categories_repo.get_all()
+            await uow.commit()
+        return categories
 
 
 class LibraryService:
@@ -49,10 +136,37 @@ class LibraryService:
                                current_user: UserDTO,
                                ) -> list[BookDTO]:
         async with uow:
-            books = await uow.books.get_user_library(current_user.id)
+            books = await uow.books.get_user_library(current_user.id, current_user.excluded_category_ids)
             await uow.commit()
         return books
 
+    @classmethod
+    async def get_user_library_page(cls,
+                                    uow: UnitOfWork,
+                                    current_user: UserDTO,
+                                    limit: int,
+                                    cursor: str | None = None,
+                                    ) -> PageDTO[BookDTO]:
+        async with uow:
+            page = await uow.books.get_user_library_page(
+                current_user.id, limit, cursor, current_user.excluded_category_ids
+            )
+            await uow.commit()
+        return page
+
+    @classmethod
+    async def stream_user_library(cls,
+                                  uow: UnitOfWork,
+                                  current_user: UserDTO,
+                                  ) -> AsyncIterator[BookDTO]:
+        """Yields the library book by book from a server-side cursor; the session lives as long as the stream"""
+        async with uow:
+            async for book in uow.books.stream_user_library(
+                    current_user.id, books_settings.STREAM_BATCH_SIZE, current_user.excluded_category_ids
+            ):
+                yield book
+            await uow.commit()
+
     @classmethod
     async def add_one_in_user_library(cls,
                                       uow: UnitOfWork,
@@ -63,24 +177,67 @@ class LibraryService:
         if id is None and gb_id is None:
             raise exceptions.NotAcceptableHTTPException("At least one of the parameters id or gb_id is required")
         async with uow:
-            if id is not None:
-                book = await uow.books.get_one(id=id)
-                if book is None:
-                    raise exceptions.NotFoundHTTPException(f"Book with id={id} not found. Try add by gb_id/")
-                book_id = book.id
-            else:
-                book = await uow.books.get_one(gb_id=gb_id)
-                if book is None:
-                    gb_book = await GoogleBooksAPI.get_by_id(gb_id)
-                    book_id = await cls.add_book_in_local_db(uow, gb_book)
-                else:
-                    book_id = book.id
-            association = await uow.books.users_library_repo.get_association(book_id, current_user.id)
-            if association is not None:
+            # the book and the association in one statement; a gb_id unknown to the catalog becomes a pending
+            # placeholder that the enrichment worker fills, so the request never waits on Google Books
+            res = await uow.books.add_to_user_library(current_user.id, id=id, gb_id=gb_id)
+            if res is None:
+                raise exceptions.NotFoundHTTPException(f"Book with id={id} not found. Try add by gb_id/")
+            book_id, created, added = res
+            if not added:
                 raise exceptions.NotAcceptableHTTPException("This book is already in the user's library")
-            book_association = await uow.books.users_library_repo.add_association(book_id, current_user.id)
             await uow.commit()
-        return book_association
+        if created:
+            await enrichment_queue.enqueue([gb_id])
+        await cache_tags.bump(library_tag(current_user.id))
+        return book_id
+
+    @classmethod
+    async def add_many_in_user_library(cls,
+                                       uow: UnitOfWork,
+                                       current_user: UserDTO,
+                                       books: BooksBulkAddSchema,
+                                       ) -> list[BookBulkAddResultSchema]:
+        ids = list(dict.fromkeys(books.ids))
+        gb_ids = list(dict.fromkeys(books.gb_ids))
+        if not ids and not gb_ids:
+            raise exceptions.NotAcceptableHTTPException("At least one of the lists ids or gb_ids must not be empty")
+        if len(ids) + len(gb_ids) > books_settings.BULK_MAX_ITEMS:
+            raise exceptions.NotAcceptableHTTPException(
+                f"No more than {books_settings.BULK_MAX_ITEMS} books can be added at once")
+
+        async with uow:
+            local_books = await uow.books.get_many(ids=ids, gb_ids=gb_ids)
+        local_ids = {book.id for book in local_books}
+        book_id_by_gb_id = {book.gb_id: book.id for book in local_books}
+
+        # Google Books is queried outside of the transaction so no connection is held while waiting for it
+        gb_books = await cls.get_gb_books([gb_id for gb_id in gb_ids if gb_id not in book_id_by_gb_id])
+
+        async with uow:
+            book_id_by_gb_id.update(await uow.books.add_many_by_gb_id(
+                await cls._gb_books_to_rows(uow, list(gb_books.values()))
+            ))
+            for gb_id, gb_book in gb_books.items():
+                book_id_by_gb_id[gb_id] = book_id_by_gb_id[gb_book.gb_id]
+            book_ids = {id for id in ids if id in local_ids} | {
+                book_id_by_gb_id[gb_id] for gb_id in gb_ids if gb_id in book_id_by_gb_id
+            }
+            added = await uow.books.users_library_repo.add_associations(
+                [(book_id, current_user.id) for book_id in book_ids]
+            )
+            await uow.commit()
+        added_ids = {book_id for book_id, _ in added}
+        await cache_tags.bump(
+            *([library_tag(current_user.id)] if added_ids else []),
+            *cls._catalog_tags(gb_books.values()),
+        )
+
+        results = []
+        for id in ids:
+            results.append(cls._bulk_add_result(id if id in local_ids else None, added_ids, id=id))
+        for gb_id in gb_ids:
+            results.append(cls._bulk_add_result(book_id_by_gb_id.get(gb_id), added_ids, gb_id=gb_id))
+        return results
 
     @classmethod
     async def remove_one_from_user_library(cls,
@@ -92,25 +249,121 @@ class LibraryService:
         if id is None and gb_id is None:
             raise exceptions.NotAcceptableHTTPException("At least one of the parameters id or gb_id is required")
         async with uow:
-            if id is not None:
-                book = await uow.books.get_one(id=id)
-                if book is None:
+            book = await uow.books.get_one(id=id) if id is not None else await uow.books.get_one(gb_id=gb_id)
+            if book is None:
+                if id is not None:
                     raise exceptions.NotFoundHTTPException(f"Book with id={id} not found. Try add by gb_id/")
-                book_id = book.id
-            else:
-                book = await uow.books.get_one(gb_id=gb_id)
-                if book is None:
-                    gb_book = await GoogleBooksAPI.get_by_id(gb_id)
-                    book_id = await cls.add_book_in_local_db(uow, gb_book)
-                else:
-                    book_id = book.id
-            book_association = await uow.books.users_library_repo.del_association(book_id, current_user.id)
+                # a book that is not in the local catalog is in nobody's library
+                return
+            await uow.books.users_library_repo.del_association(book.id, current_user.id)
             await uow.commit()
+        await cache_tags.bump(library_tag(current_user.id))
+
+    @classmethod
+    async def enrich_books(cls, gb_ids: list[str], last_attempt: set[str] = frozenset()) -> list[str]:
+        """
+        Enrichment queue handler: fills the pending placeholders of `gb_ids` from Google Books in one batch.
+        Returns the gb_ids to retry later (Google Books unavailable); the ones on their `last_attempt` and
+        the ones Google Books does not know are marked failed instead.
+        """
+        gb_books, unavailable = await cls._fetch_gb_books(gb_ids)
+        retry = [gb_id for gb_id in gb_ids if gb_id in unavailable and gb_id not in last_attempt]
+        failed = [gb_id for gb_id in gb_ids if gb_id not in gb_books and gb_id not in retry]
+
+        uow = UnitOfWork()
+        async with uow:
+            rows = await cls._gb_books_to_rows(uow, list(gb_books.values()))
+            for gb_id, row in zip(gb_books, rows):
+                # Google Books may answer with another volume id, the placeholder is keyed by the requested one
+                row["gb_id"] = gb_id
+            book_ids = await uow.books.fill_pending(rows)
+            book_ids += await uow.books.set_metadata_status(failed, BookMetadataStatus.failed)
+            user_ids = await uow.books.users_library_repo.get_right_ids(book_ids)
+            await uow.commit()
+        if failed:
+            logger.warning(f"Books with gb_ids={failed} could not be enriched")
+        await cache_tags.bump(
+            *(library_tag(user_id) for user_id in user_ids),
+            *cls._catalog_tags(gb_books.values()),
+        )
+        return retry
+
+    @classmethod
+    async def get_pending_gb_ids(cls) -> list[str]:
+        uow = UnitOfWork.read_only()
+        async with uow:
+            gb_ids = await uow.books.get_pending_gb_ids(books_settings.ENRICHMENT_SWEEP_LIMIT)
+            await uow.commit()
+        return gb_ids
 
     # UTILS
     @classmethod
-    async def add_book_in_local_db(cls,
-                                   uow: UnitOfWork,
-                                   gb_book: BookAPISchema
-                                   ) -> int:
-        return await uow.books.add_one(gb_book.model_dump())
+    async def get_gb_book(cls, gb_id: str) -> BookAPISchema:
+        try:
+            return await books_metadata_cache.get_book(gb_id, lambda: GoogleBooksAPI.get_by_id(gb_id))
+        except UpstreamUnavailableError:
+            raise exceptions.ServiceUnavailableHTTPException("Google Books is unavailable, try again later")
+
+    @classmethod
+    async def get_gb_books(cls, gb_ids: list[str]) -> dict[str, BookAPISchema]:
+        """Fetches books concurrently, at most BOOKS__BULK_FETCH_CONCURRENCY at a time. Failed lookups are skipped"""
+        gb_books, _ = await cls._fetch_gb_books(gb_ids)
+        return gb_books
+
+    @classmethod
+    async def _fetch_gb_books(cls, gb_ids: list[str]) -> tuple[dict[str, BookAPISchema], set[str]]:
+        """The books found and the gb_ids that could not be looked up because Google Books is unavailable"""
+        semaphore = asyncio.Semaphore(books_settings.BULK_FETCH_CONCURRENCY)
+        unavailable = set()
+
+        async def fetch(gb_id: str) -> tuple[str, BookAPISchema | None]:
+            async with semaphore:
+                try:
+                    return gb_id, await cls.get_gb_book(gb_id)
+                except Exception as e:
+                    if isinstance(e, exceptions.ServiceUnavailableHTTPException):
+                        unavailable.add(gb_id)
+                    logger.warning(f"Book with gb_id={gb_id} could not be fetched: {e!r}")
+                    return gb_id, None
+
+        results = await asyncio.gather(*(fetch(gb_id) for gb_id in gb_ids))
+        return {gb_id: gb_book for gb_id, gb_book in results if gb_book is not None}, unavailable
+
+    @staticmethod
+    def _bulk_add_result(book_id: int | None,
+                         added_ids: set[int],
+                         id: int | None = None,
+                         gb_id: str | None = None,
+                         ) -> BookBulkAddResultSchema:
+        if book_id is None:
+            return BookBulkAddResultSchema(id=id, gb_id=gb_id, status=BookBulkAddStatus.not_found)
+        if book_id in added_ids:
+            return BookBulkAddResultSchema(id=book_id, gb_id=gb_id, status=BookBulkAddStatus.added)
+        return BookBulkAddResultSchema(id=book_id, gb_id=gb_id, status=BookBulkAddStatus.already_in_library)
+
+    @staticmethod
+    def _catalog_tags(gb_books: Iterable[BookAPISchema]) -> list[str]:
+        """Response cache tags to bump after Google Books books were written to the local catalog"""
+        gb_books = list(gb_books)
+        if not gb_books:
+            return []
+        return [CATALOG_TAG, *(book_tag(normalize_isbn(gb_book.ISBN)) for gb_book in gb_books if gb_book.ISBN)]
+
+    @staticmethod
+    async def _gb_books_to_rows(uow: UnitOfWork, gb_books: list[BookAPISchema]) -> list[dict]:
+        """Rows of `books` with categories and authors resolved to (new or existing) lookup table ids"""
+        category_ids = await uow.books.categories_repo.get_ids(
+            (name for gb_book in gb_books for name in split_names(gb_book.categories)), create=True
+        )
+        author_ids = await uow.books.authors_repo.get_ids(
+            (name for gb_book in gb_books for name in split_names(gb_book.authors)), create=True
+        )
+        rows = []
+        for gb_book in gb_books:
+            row = gb_book.model_dump()
+            row["categories"] = row.get("categories") or ''
+            row["category_ids"] = [category_ids[name] for name in split_names(gb_book.categories)]
+            row["authors"] = row.get("authors") or ''
+            row["author_ids"] = [author_ids[name] for name in split_names(gb_book.authors)]
+            rows.append(row)
+        return rows
@@ -1,13 +1,34 @@
+import json
 import pytest
+import pytest_asyncio
 from unittest.mock import Mock, AsyncMock
+from src.integrations.api.books.fake_google_books import FakeGoogleBooks
+from src.cache.tags import cache_tags
+from src.integrations.api.books.google_books import GoogleBooksAPI
+from src.integrations.api.resilience import CircuitOpenError
 from src.services.books import BooksService, LibraryService
-from src.schemas.books import BookDTO, BookAPISchema
+from src.schemas.users import UserDTO
+from src.schemas.books import (
+    BookDTO, BookAPISchema, BookMetadataStatus, BooksBulkAddSchema, BookBulkAddStatus, SearchSource,
+)
+from src.services.books.enrichment import EnrichmentQueue, enrichment_queue
 from src.utils import exceptions
+from src.utils.streaming import encode_json_stream
 from src.utils.unitofwork import UnitOfWork
 
 
+@pytest_asyncio.fixture
+async def fake_google_books(monkeypatch):
+    """Points GoogleBooksAPI at a local FakeGoogleBooks server"""
+    runner, base_url = await FakeGoogleBooks().serve()
+    monkeypatch.setattr(GoogleBooksAPI.session_client, 'BASE_URL', base_url + '/v1/volumes')
+    yield
+    await GoogleBooksAPI.session_client.close()
+    await runner.cleanup()
+
+
 @pytest.mark.asyncio
-async def test_search_books():
+async def test_search_books(fake_google_books):
     with pytest.raises(exceptions.NotAcceptableHTTPException):
         await BooksService.search(gb_id=None, query=None, intitle=None, inauthor=None, isbn=None,
                                   categories=None)
@@ -28,23 +49,25 @@ async def test_get_book_by_ISBN():
     mock_book_model.categories = "Programming"
 
     mock_books = AsyncMock()
-    mock_books.get_one.return_value = mock_book_model
+    mock_books.get_one_by_ISBN.return_value = (mock_book_model, True)
 
     mock_uow = AsyncMock(spec=UnitOfWork)
     mock_uow.books = mock_books
 
     mock_user = Mock()
-    mock_user.excluded_categories = []
+    mock_user.excluded_category_ids = []
 
     res = await BooksService.get_by_ISBN(mock_uow, mock_user, "1887902996")
     assert isinstance(res, BookDTO)
     assert res.isbn == "1887902996"
 
     mock_user = Mock()
-    mock_user.excluded_categories = ["Programming"]
+    mock_user.excluded_category_ids = [3]
+    mock_books.get_one_by_ISBN.return_value = (mock_book_model, False)
 
     res = await BooksService.get_by_ISBN(mock_uow, mock_user, "1887902996")
     assert res is None
+    mock_books.get_one_by_ISBN.assert_awaited_with("1887902996", [3])
 
 
 @pytest.mark.asyncio
@@ -67,15 +90,258 @@ async def test_get_user_library():
 
 
 @pytest.mark.asyncio
-async def test_add_book_in_local_db():
+async def test_stream_user_library():
+    books = [
+        BookDTO(id=id, gb_id=f"gb{id}", ISBN=None, title="Python", subtitle=None, description=None, language="en",
+                pub_date=None, categories="Programming", authors="")
+        for id in (1, 2, 3)
+    ]
+
+    async def stream_user_library(user_id, batch_size, excluded_category_ids):
+        for book in books:
+            yield book
+
+    mock_books = Mock()
+    mock_books.stream_user_library = stream_user_library
+
+    mock_uow = AsyncMock(spec=UnitOfWork)
+    mock_uow.books = mock_books
+
+    mock_user = Mock()
+    mock_user.id = 1
+
+    chunks = [chunk async for chunk in encode_json_stream(
+        LibraryService.stream_user_library(mock_uow, mock_user), ndjson=True, chunk_size=1
+    )]
+    assert len(chunks) == 3
+    assert [BookDTO.model_validate_json(chunk) for chunk in chunks] == books
+
+    body = b''.join([chunk async for chunk in encode_json_stream(
+        LibraryService.stream_user_library(mock_uow, mock_user), ndjson=False, chunk_size=1024
+    )])
+    assert [BookDTO.model_validate(book) for book in json.loads(body)] == books
+
+    async def empty():
+        return
+        yield
+    assert b''.join([chunk async for chunk in encode_json_stream(empty(), ndjson=False, chunk_size=1)]) == b'[]'
+
+
+@pytest.mark.asyncio
+async def test_add_many_in_user_library(monkeypatch):
+    local_book = Mock(spec=BookDTO)
+    local_book.id, local_book.gb_id = 1, "local1"
+    local_gb_book = Mock(spec=BookDTO)
+    local_gb_book.id, local_gb_book.gb_id = 3, "a"
+
     mock_books = AsyncMock()
-    mock_books.add_one.return_value = 1
+    mock_books.get_many.return_value = [local_book, local_gb_book]
+    mock_books.add_many_by_gb_id.return_value = {"b": 4}
+    mock_books.users_library_repo.add_associations.return_value = {(1, 7), (4, 7)}
+
+    mock_uow = AsyncMock(spec=UnitOfWork)
+    mock_uow.books = mock_books
 
+    mock_user = Mock()
+    mock_user.id = 7
+
+    gb_book = BookAPISchema(gb_id="b", ISBN=None, title="B", subtitle=None, description=None, language="en",
+                            pub_date=None, categories=None, authors=None)
+    monkeypatch.setattr(LibraryService, "get_gb_book", AsyncMock(return_value=gb_book))
+    bump = AsyncMock()
+    monkeypatch.setattr(cache_tags, "bump", bump)
+
+    res = await LibraryService.add_many_in_user_library(
+        mock_uow, mock_user, BooksBulkAddSchema(ids=[1, 2, 1], gb_ids=["a", "b"])
+    )
+    assert [(r.id, r.gb_id, r.status) for r in res] == [
+        (1, None, BookBulkAddStatus.added),
+        (2, None, BookBulkAddStatus.not_found),
+        (3, "a", BookBulkAddStatus.already_in_library),
+        (4, "b", BookBulkAddStatus.added),
+    ]
+    assert mock_books.add_many_by_gb_id.call_args.args[0][0]["categories"] == ''
+    bump.assert_awaited_once_with("user:7:library", "books:catalog")
+
+    with pytest.raises(exceptions.NotAcceptableHTTPException):
+        await LibraryService.add_many_in_user_library(mock_uow, mock_user, BooksBulkAddSchema())
+
+
+@pytest.mark.asyncio
+async def test_add_one_in_user_library_by_gb_id(monkeypatch):
+    mock_uow = AsyncMock(spec=UnitOfWork)
+    mock_uow.books = AsyncMock()
+    mock_uow.books.add_to_user_library.return_value = (4, True, True)
+    mock_user = Mock()
+    mock_user.id = 7
+    get_gb_book = AsyncMock()
+    monkeypatch.setattr(LibraryService, "get_gb_book", get_gb_book)
+    enqueue = AsyncMock()
+    monkeypatch.setattr(enrichment_queue, "enqueue", enqueue)
+    monkeypatch.setattr(cache_tags, "bump", AsyncMock())
+
+    assert await LibraryService.add_one_in_user_library(mock_uow, mock_user, gb_id="b") == 4
+    mock_uow.books.add_to_user_library.assert_awaited_once_with(7, id=None, gb_id="b")
+    enqueue.assert_awaited_once_with(["b"])
+    get_gb_book.assert_not_called()
+
+    # the book was already in the catalog: nothing to enrich
+    enqueue.reset_mock()
+    mock_uow.books.add_to_user_library.return_value = (4, False, True)
+    await LibraryService.add_one_in_user_library(mock_uow, mock_user, gb_id="b")
+    enqueue.assert_not_called()
+
+    mock_uow.books.add_to_user_library.return_value = (4, False, False)
+    with pytest.raises(exceptions.NotAcceptableHTTPException):
+        await LibraryService.add_one_in_user_library(mock_uow, mock_user, gb_id="b")
+    mock_uow.books.add_to_user_library.return_value = None
+    with pytest.raises(exceptions.NotFoundHTTPException):
+        await LibraryService.add_one_in_user_library(mock_uow, mock_user, id=5)
+
+
+@pytest.mark.asyncio
+async def test_enrich_books(monkeypatch):
+    mock_books = AsyncMock()
+    mock_books.categories_repo.get_ids.return_value = {}
+    mock_books.authors_repo.get_ids.return_value = {}
+    mock_books.fill_pending.return_value = [1]
+    mock_books.set_metadata_status.return_value = [2]
+    mock_books.users_library_repo.get_right_ids.return_value = [7]
     mock_uow = AsyncMock(spec=UnitOfWork)
     mock_uow.books = mock_books
+    monkeypatch.setattr("src.services.books.service.UnitOfWork", Mock(return_value=mock_uow))
 
-    mock_gb_book = Mock(spec=BookAPISchema)
-    mock_gb_book.model_dump.return_value = {"title": "Python Programming"}
+    gb_book = BookAPISchema(gb_id="a-canonical", ISBN=None, title="A", subtitle=None, description=None,
+                            language="en", pub_date=None, categories=None, authors=None)
+
+    async def get_gb_book(gb_id):
+        if gb_id == "a":
+            return gb_book
+        if gb_id == "missing":
+            raise exceptions.NotFoundHTTPException()
+        raise exceptions.ServiceUnavailableHTTPException()
+    monkeypatch.setattr(LibraryService, "get_gb_book", get_gb_book)
+    bump = AsyncMock()
+    monkeypatch.setattr(cache_tags, "bump", bump)
+
+    retry = await LibraryService.enrich_books(["a", "missing", "down", "down-last"], last_attempt={"down-last"})
+    assert retry == ["down"]
+    row, = mock_books.fill_pending.call_args.args[0]
+    assert row["gb_id"] == "a" and row["title"] == "A"
+    mock_books.set_metadata_status.assert_awaited_once_with(["missing", "down-last"], BookMetadataStatus.failed)
+    mock_books.users_library_repo.get_right_ids.assert_awaited_once_with([1, 2])
+    bump.assert_awaited_once_with("user:7:library", "books:catalog")
+
+
+@pytest.mark.asyncio
+async def test_enrichment_queue_batch():
+    redis = AsyncMock()
+    queue = EnrichmentQueue(redis, batch_size=10, block_ms=1, max_attempts=3, claim_idle_ms=1, maxlen=100)
+    handler = AsyncMock(return_value=["b", "c"])
+    queue._handler = handler
+
+    await queue.process([
+        (b"1-0", {b"gb_id": b"a"}, 1),
+        (b"2-0", {b"gb_id": b"b"}, 1),
+        (b"3-0", {b"gb_id": b"a"}, 1),
+        (b"4-0", {b"gb_id": b"c"}, 3),
+    ])
+    handler.assert_awaited_once_with(["a", "b", "c"], {"c"})
+    # "b" stays unacknowledged to be claimed again, "c" was on its last attempt
+    redis.xack.assert_awaited_once_with(queue.stream, queue.group, b"1-0", b"3-0", b"4-0")
+    assert queue.stats()["handled"] == 2 and queue.stats()["retried"] == 1
+
+
+@pytest.mark.asyncio
+async def test_search_books_local_first(monkeypatch):
+    local_books = [
+        BookDTO(id=i, gb_id=f"gb{i}", ISBN=None, title="Python", subtitle=None, description=None, language="en",
+                pub_date=None, categories="Programming", authors="Author")
+        for i in range(5)
+    ]
+    mock_books = AsyncMock()
+    mock_books.search.return_value = local_books
+
+    mock_uow = AsyncMock(spec=UnitOfWork)
+    mock_uow.books = mock_books
+
+    remote_search = AsyncMock(return_value=[])
+    monkeypatch.setattr("src.services.books.service.GoogleBooksAPI.search", remote_search)
+
+    res = await BooksService.search(mock_uow, query="Python", intitle="Guide", source=SearchSource.auto)
+    assert [book.gb_id for book in res] == [book.gb_id for book in local_books]
+    assert isinstance(res[0], BookAPISchema)
+    assert mock_books.search.call_args.kwargs["query"] == "Python Guide"
+    remote_search.assert_not_called()
+
+    mock_books.search.return_value = local_books[:1]
+    res = await BooksService.search(mock_uow, query="Python", source=SearchSource.local)
+    assert len(res) == 1
+
+
+@pytest.mark.asyncio
+async def test_search_books_falls_back_to_local_results(monkeypatch):
+    local_book = BookDTO(id=1, gb_id="gb1", ISBN=None, title="Python", subtitle=None, description=None,
+                         language="en", pub_date=None, categories="Programming", authors="Author")
+    mock_uow = AsyncMock(spec=UnitOfWork)
+    mock_uow.books = AsyncMock()
+    mock_uow.books.search.return_value = [local_book]
+    monkeypatch.setattr("src.services.books.service.GoogleBooksAPI.search",
+                        AsyncMock(side_effect=CircuitOpenError('google_books')))
+
+    res = await BooksService.search(mock_uow, query="fallback", source=SearchSource.auto)
+    assert [book.gb_id for book in res] == ["gb1"]
+    with pytest.raises(exceptions.ServiceUnavailableHTTPException):
+        await BooksService.search(mock_uow, query="fallback", source=SearchSource.remote)
+
+
+@pytest.mark.asyncio
+async def test_get_book_by_ISBN_normalized():
+    mock_books = AsyncMock()
+    mock_books.get_one_by_ISBN.return_value = None
+
+    mock_uow = AsyncMock(spec=UnitOfWork)
+    mock_uow.books = mock_books
+
+    mock_user = Mock()
+    mock_user.excluded_category_ids = []
+
+    with pytest.raises(exceptions.NotFoundHTTPException):
+        await BooksService.get_by_ISBN(mock_uow, mock_user, "0-440-33570-x")
+    mock_books.get_one_by_ISBN.assert_awaited_with("044033570X", [])
+
+
+@pytest.mark.asyncio
+async def test_library_query_budgets(db_session_factory, query_budget, monkeypatch):
+    monkeypatch.setattr('src.services.books.service.cache_tags.bump', AsyncMock())
+    uow = UnitOfWork()
+    uow.session_factory = db_session_factory
+    async with uow:
+        user_id = await uow.users.add_one({
+            "name": "Budget", "email": "budget@example.com", "username": "query-budget", "password": "-",
+            "permissions": {},
+        })
+        book_id = await uow.books.add_one({
+            "gb_id": "budget-test-0001", "ISBN": "0000000019", "categories": '', "authors": '',
+        })
+        await uow.commit()
+    user = UserDTO.model_construct(id=user_id, excluded_category_ids=[])
 
-    result = await LibraryService.add_book_in_local_db(mock_uow, mock_gb_book)
-    assert result == 1
+    # the book lookup (or placeholder insert) and the association insert are one statement
+    with query_budget(1):
+        assert await LibraryService.add_one_in_user_library(uow, user, id=book_id) == book_id
+    with query_budget(1):
+        with pytest.raises(exceptions.NotAcceptableHTTPException):
+            await LibraryService.add_one_in_user_library(uow, user, id=book_id)
+    enqueue = AsyncMock()
+    monkeypatch.setattr(enrichment_queue, 'enqueue', enqueue)
+    with query_budget(1):
+        placeholder_id = await LibraryService.add_one_in_user_library(uow, user, gb_id="budget-test-0002")
+    enqueue.assert_awaited_once_with(["budget-test-0002"])
+    with query_budget(1):
+        page = await LibraryService.get_user_library_page(uow, user, 10)
+    assert [(book.id, book.metadata_status) for book in page.items] == [
+        (book_id, BookMetadataStatus.ready), (placeholder_id, BookMetadataStatus.pending),
+    ]
+    with query_budget(1):
+        assert (await BooksService.get_by_ISBN(uow, user, "0-00-000001-9")).id == book_id
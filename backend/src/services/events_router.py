@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+
+from src.services.books import LibraryService
+from src.services.books.enrichment import enrichment_queue
+from src.services.users import PasswordService
+from src.utils.logger import logger
+
+
+router = APIRouter()
+
+
+@router.on_event("startup")
+async def startup():
+    enrichment_queue.start(LibraryService.enrich_books, LibraryService.get_pending_gb_ids)
+
+
+@router.on_event("shutdown")
+async def shutdown():
+    await enrichment_queue.stop()
+    logger.info(f"Books enrichment queue stats: {enrichment_queue.stats()}")
+    logger.info(f"Password hashing pool stats: {PasswordService.executor.stats()}")
+    PasswordService.executor.shutdown()
@@ -2,30 +2,53 @@ import datetime
 from abc import ABC, abstractmethod
 from typing import Annotated, Any
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from config.jwt import jwt_settings
 from config.api_key import api_key_settings
+from config.password import password_settings
+from src.cache.auth import api_key_auth_cache
+from src.cache.token_versions import token_versions
 from src.repositories import UsersRepository, UserAPIKeysRepository
-from src.schemas.users import UserDTO, UserAPIKeyDTO
+from src.schemas.pagination import PageDTO
+from src.schemas.users import UserDTO, UserAPIKeyDTO, UserPermissions
 from src.utils.utils import generate_random_string
+from src.utils import password_hashing
+from src.utils.executor import BoundedExecutor
 from src.utils import exceptions
 from src.utils.session_context_manager import SessionContextManager
 
 
 class PasswordService:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    """
+    bcrypt takes hundreds of milliseconds, so the async methods run it in a bounded worker pool
+    (PASSWORD__* settings) instead of blocking the event loop.
+    """
+    pwd_context = password_hashing.pwd_context
+    executor = BoundedExecutor(
+        kind=password_settings.EXECUTOR,
+        workers=password_settings.WORKERS,
+        max_queue=password_settings.MAX_QUEUE,
+        queue_timeout=password_settings.QUEUE_TIMEOUT,
+    )
 
     @classmethod
     def verify_password(cls, plain_password, hashed_password):
-        return cls.pwd_context.verify(plain_password, hashed_password)
+        return password_hashing.verify_password(plain_password, hashed_password)
 
     @classmethod
     def get_password_hash(cls, password):
-        return cls.pwd_context.hash(password)
+        return password_hashing.get_password_hash(password)
+
+    @classmethod
+    async def averify_password(cls, plain_password: str, hashed_password: str) -> bool:
+        return await cls.executor.run(password_hashing.verify_password, plain_password, hashed_password)
+
+    @classmethod
+    async def aget_password_hash(cls, password: str) -> str:
+        return await cls.executor.run(password_hashing.get_password_hash, password)
 
 
 class AbstractAuthService(ABC):
@@ -42,15 +65,16 @@ class AbstractAuthService(ABC):
                            username: str,
                            password: str,
                            ) -> UserDTO:
-        session = SessionContextManager()
         async with session:
             users_repo = UsersRepository(session.session)
             user = await users_repo.get_one_by_username(username=username, with_password=True)
             await session.commit()
         if user is None:
             raise exceptions.UnauthorizedHTTPException(detail="Incorrect email or password")
-        if not PasswordService.verify_password(password, user.password):
+        if not await PasswordService.averify_password(password, user.password):
             raise exceptions.UnauthorizedHTTPException(detail="Incorrect email or password")
+        if user.banned:
+            raise exceptions.UnauthorizedHTTPException()
         return UserDTO.model_validate(user, from_attributes=True)
 
 
@@ -88,41 +112,70 @@ class APIKeyService(AbstractAuthService):
             await session.commit()
         return user_api_keys
 
+    @classmethod
+    async def get_page(cls,
+                       session: SessionContextManager,
+                       current_user: UserDTO,
+                       limit: int,
+                       cursor: str | None = None,
+                       ) -> PageDTO[UserAPIKeyDTO]:
+        async with session:
+            user_api_keys_repo = UserAPIKeysRepository(session.session)
+            page = await user_api_keys_repo.get_page(limit, cursor, user_id=current_user.id)
+            await session.commit()
+        return page
+
     @classmethod
     async def delete(cls,
                      session: SessionContextManager,
                      current_user: UserDTO,
                      id: int
                      ) -> None:
-        async with session as s:
-            user_api_keys_repo = UserAPIKeysRepository(s)
+        async with session:
+            user_api_keys_repo = UserAPIKeysRepository(session.session)
             api_key = await user_api_keys_repo.get_one(id=id)
             if api_key is None:
                 raise exceptions.NotFoundHTTPException()
             if api_key.user_id != current_user.id:
                 raise exceptions.ForbiddenHTTPException()
             await user_api_keys_repo.delete(id=id)
-            s.commit()
+            await session.commit()
+        await api_key_auth_cache.invalidate_key(api_key.key)
 
     @classmethod
     async def get_current_user(cls,
                                api_key: str,
+                               request: Request = None,
                                ) -> UserDTO:
-        session = SessionContextManager()
-        async with session:
-            user_api_keys_repo = UserAPIKeysRepository(session.session)
-            user_api_key = await user_api_keys_repo.get_one(key=api_key)
-            if user_api_key is None:
+        cached = api_key_auth_cache.get(api_key)
+        if cached is not None:
+            user, expire_date = cached
+        else:
+            # on the primary: a lagging replica could put a deleted key or banned user back in the cache
+            session = SessionContextManager(request)
+            async with session:
+                user_api_keys_repo = UserAPIKeysRepository(session.session)
+                user_and_expire_date = await user_api_keys_repo.get_user_by_key(api_key)
+            if user_and_expire_date is None:
                 raise exceptions.UnauthorizedHTTPException()
-            if user_api_key.expire_date < datetime.date.today():
-                raise exceptions.UnauthorizedHTTPException()
-            users_repo = UsersRepository(session.session)
-            user = await users_repo.get_one(id=user_api_key.user_id)
-            if user.banned:
-                raise exceptions.UnauthorizedHTTPException()
-            await session.commit()
+            user, expire_date = user_and_expire_date
+            api_key_auth_cache.set(api_key, user, expire_date)
+        if expire_date < datetime.date.today():
+            raise exceptions.UnauthorizedHTTPException()
+        if user.banned:
+            raise exceptions.UnauthorizedHTTPException()
         return user
 
+    @classmethod
+    async def get_optional_user(cls,
+                                api_key: str | None = None,
+                                request: Request = None,
+                                ) -> UserDTO | None:
+        """For routes that serve anonymous requests too; a key that is passed must still be valid"""
+        if api_key is None:
+            return None
+        return await cls.get_current_user(api_key, request)
+
     @classmethod
     def _generate_api_key(cls, length: int) -> str:
         return generate_random_string(length=length, only_digits=True, only_letters=True)
@@ -131,35 +184,31 @@ class APIKeyService(AbstractAuthService):
 class JWTService(AbstractAuthService):
     oauth2_password_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/jwt/tokens")
     token_type = 'Bearer'
+    required_claims = ("sub", "tv", "username", "name", "email", "permissions", "excluded_category_ids",
+                       "created_at")
 
     @classmethod
     async def get_current_user(cls,
                                token: Annotated[str, Depends(oauth2_password_scheme)],
+                               request: Request = None,
                                ) -> UserDTO:
-        session = SessionContextManager()
-        user = await cls.authenticate_by_token(session, token)
-        if user.banned:
-            raise exceptions.UnauthorizedHTTPException()
-        return user
+        """Serves the user from the token claims; only the user's token version is looked up"""
+        payload = cls._decode_token(token)
+        await cls._check_token_version(payload, request)
+        return cls._user_from_token_data(payload)
 
     @classmethod
-    async def authenticate_by_token(cls, session: SessionContextManager, token: str):
-        try:
-            payload = jwt.decode(token, jwt_settings.SECRET_KEY, algorithms=jwt_settings.ALGORITHM)
-        except JWTError:
-            raise exceptions.UnauthorizedHTTPException()
-        username = payload.get("username")
-        if username is None:
-            raise exceptions.UnauthorizedHTTPException()
+    async def authenticate_by_token(cls, session: SessionContextManager, token: str) -> UserDTO:
+        """Used to refresh tokens: the user row is loaded so new tokens carry an up-to-date snapshot"""
+        payload = cls._decode_token(token)
+        await cls._check_token_version(payload, session.request)
         async with session:
             users_repo = UsersRepository(session.session)
-            user = await users_repo.get_one_by_username(username=username)
-            if user.banned:
-                raise exceptions.UnauthorizedHTTPException()
+            user = await users_repo.get_row(id=int(payload["sub"]))
             await session.commit()
         if user is None:
             raise exceptions.UnauthorizedHTTPException()
-        if user.banned:
+        if user.banned or user.token_version != payload["tv"]:
             raise exceptions.UnauthorizedHTTPException()
         return user
 
@@ -171,6 +220,19 @@ class JWTService(AbstractAuthService):
                 detail="Expected 'grant_type' parameter with 'refresh_token' value")
         return await cls.authenticate_by_token(session, token)
 
+    @classmethod
+    def get_token_data(cls, user: UserDTO) -> dict[str, Any]:
+        return {
+            "sub": str(user.id),
+            "tv": user.token_version,
+            "username": user.username,
+            "name": user.name,
+            "email": user.email,
+            "permissions": user.permissions.model_dump(),
+            "excluded_category_ids": list(user.excluded_category_ids),
+            "created_at": user.created_at.isoformat(),
+        }
+
     @classmethod
     def create_tokens(cls,
                       data: dict,
@@ -188,3 +250,44 @@ class JWTService(AbstractAuthService):
         refresh_token = jwt.encode(to_encode, jwt_settings.SECRET_KEY, algorithm=jwt_settings.ALGORITHM)
 
         return cls.token_type, access_token, refresh_token
+
+    @classmethod
+    def _decode_token(cls, token: str) -> dict[str, Any]:
+        try:
+            payload = jwt.decode(token, jwt_settings.SECRET_KEY, algorithms=jwt_settings.ALGORITHM)
+        except JWTError:
+            raise exceptions.UnauthorizedHTTPException()
+        if any(claim not in payload for claim in cls.required_claims):
+            raise exceptions.UnauthorizedHTTPException()
+        return payload
+
+    @classmethod
+    async def _check_token_version(cls, payload: dict[str, Any], request: Request | None = None) -> None:
+        user_id = int(payload["sub"])
+        version = await token_versions.get(user_id, lambda: cls._load_token_version(user_id, request))
+        if version is None or version != payload["tv"]:
+            raise exceptions.UnauthorizedHTTPException()
+
+    @classmethod
+    async def _load_token_version(cls, user_id: int, request: Request | None = None) -> int | None:
+        session = SessionContextManager(request)
+        async with session:
+            users_repo = UsersRepository(session.session)
+            version = await users_repo.get_token_version(user_id)
+        return version
+
+    @classmethod
+    def _user_from_token_data(cls, payload: dict[str, Any]) -> UserDTO:
+        return UserDTO.model_construct(
+            id=int(payload["sub"]),
+            name=payload["name"],
+            email=payload["email"],
+            username=payload["username"],
+            password=None,
+            banned=False,
+            permissions=UserPermissions.model_construct(**payload["permissions"]),
+            excluded_category_ids=payload["excluded_category_ids"],
+            token_version=payload["tv"],
+            created_at=datetime.datetime.fromisoformat(payload["created_at"]),
+            api_keys=None,
+        )
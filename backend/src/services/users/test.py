@@ -1,9 +1,16 @@
+import asyncio
 import datetime
+import time
 import pytest
 from unittest.mock import Mock, patch, AsyncMock, MagicMock
-from src.services.users import APIKeyService, JWTService
-from src.schemas.users import UserDTO, UserAPIKeyDTO
+from src.services.users import APIKeyService, JWTService, PasswordService, UsersService
+from src.schemas.users import UserDTO, UserAPIKeyDTO, UserPermissions, UserUpdateSchema
 from src.utils import exceptions
+from src.cache.auth import api_key_auth_cache
+from src.cache.tags import CATALOG_TAG, user_tag
+from src.utils.executor import BoundedExecutor
+from src.utils.session_context_manager import RequestSession, SessionContextManager
+from src.utils.unitofwork import UnitOfWork
 
 
 @pytest.mark.asyncio
@@ -44,3 +51,226 @@ async def test_api_key_service_get_all():
         assert isinstance(keys[0], UserAPIKeyDTO)
         assert len(keys) == 1
 
+
+@pytest.mark.asyncio
+async def test_api_key_service_get_page():
+    mock_current_user = Mock(spec=UserDTO)
+    mock_current_user.id = 1
+
+    rows = [
+        {"id": id, "key": f"key{id}", "user_id": 1, "expire_date": datetime.date.today(),
+         "created_at": datetime.datetime.utcnow()}
+        for id in (1, 2, 3)
+    ]
+
+    mock_result = Mock()
+    mock_result.mappings.return_value = rows
+
+    mock_session = AsyncMock()
+    mock_session.session.execute.return_value = mock_result
+
+    page = await APIKeyService.get_page(mock_session, mock_current_user, limit=2)
+    assert [key.id for key in page.items] == [1, 2]
+    assert isinstance(page.items[0], UserAPIKeyDTO)
+    assert page.next_cursor is not None
+
+    mock_result.mappings.return_value = rows[2:]
+    page = await APIKeyService.get_page(mock_session, mock_current_user, limit=2, cursor=page.next_cursor)
+    assert [key.id for key in page.items] == [3]
+    assert page.next_cursor is None
+    stmt = mock_session.session.execute.call_args.args[0]
+    assert 2 in stmt.compile().params.values()
+
+    with pytest.raises(exceptions.NotAcceptableHTTPException):
+        await APIKeyService.get_page(mock_session, mock_current_user, limit=2, cursor="not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_api_key_service_get_current_user_from_cache():
+    mock_user = Mock(spec=UserDTO)
+    mock_user.id = 1
+    mock_user.banned = False
+
+    api_key_auth_cache.set('cached-key', mock_user, datetime.date.today())
+    with patch('src.services.users.auth.SessionContextManager', side_effect=AssertionError("DB must not be used")):
+        user = await APIKeyService.get_current_user('cached-key')
+    assert user is mock_user
+
+    mock_user.banned = True
+    with pytest.raises(exceptions.UnauthorizedHTTPException):
+        await APIKeyService.get_current_user('cached-key')
+    await api_key_auth_cache.invalidate_user(1)
+    assert api_key_auth_cache.get('cached-key') is None
+
+
+@pytest.mark.asyncio
+async def test_api_key_service_get_current_user_projection():
+    row = {
+        "id": 7, "name": "User", "email": "user@example.com", "username": "user", "banned": False,
+        "permissions": {"can_view_users": False, "can_add_users": False, "can_ban_users": False,
+                        "can_delete_users": False, "can_edit_user_profile": True,
+                        "can_edit_user_permissions": False, "super_user": False},
+        "excluded_category_ids": [], "token_version": 0, "created_at": datetime.datetime.utcnow(),
+        "expire_date": datetime.date.today(),
+    }
+    mock_result = Mock()
+    mock_result.mappings.return_value.one_or_none.return_value = row
+
+    mock_session = AsyncMock()
+    mock_session.session.execute.return_value = mock_result
+
+    with patch('src.services.users.auth.SessionContextManager', return_value=mock_session):
+        user = await APIKeyService.get_current_user('projection-key')
+    assert mock_session.session.execute.await_count == 1
+    assert user.id == 7 and user.password is None
+    assert isinstance(user.permissions, UserPermissions)
+    await api_key_auth_cache.invalidate_user(7)
+
+
+@pytest.mark.asyncio
+async def test_request_session_shared_between_auth_and_unit_of_work():
+    db_session = AsyncMock()
+    request_session = RequestSession(Mock(return_value=db_session), 'session-id')
+    request = Mock()
+    request.state.session_id = 'session-id'
+    request.state.db_session = request_session
+
+    auth_session = SessionContextManager(request)
+    async with auth_session:
+        assert auth_session.session is db_session
+    # the auth read ends its transaction: no connection is held while the handler calls upstream services
+    db_session.rollback.assert_awaited_once()
+
+    uow = UnitOfWork(request)
+    async with uow:
+        assert uow.users.session is db_session
+        await uow.commit()
+    # the handler's block ends the transaction, releasing the connection before the response is sent
+    assert db_session.rollback.await_count == 2
+    request_session.session_factory.assert_called_once()
+
+    await request_session.close()
+    db_session.close.assert_awaited_once()
+
+    # after the request (e.g. in a streamed response body) blocks get a private session
+    late_session = SessionContextManager(request)
+    late_session.session_factory = Mock(return_value=AsyncMock())
+    async with late_session:
+        assert late_session.session is not db_session
+
+
+@pytest.mark.asyncio
+async def test_read_only_unit_of_work_uses_replica_session_and_skips_commit():
+    db_session, replica_session = AsyncMock(), AsyncMock()
+    request = Mock()
+    request.state.session_id = 'session-id'
+    request.state.db_session = RequestSession(Mock(return_value=db_session), 'session-id')
+    request.state.db_readonly_session = RequestSession(Mock(return_value=replica_session), 'session-id')
+
+    uow = UnitOfWork.read_only(request)
+    async with uow:
+        assert uow.books.session is replica_session
+        await uow.commit()
+    replica_session.commit.assert_not_awaited()
+    replica_session.rollback.assert_awaited_once()
+    request.state.db_session.session_factory.assert_not_called()
+
+    # auth lookups stay on the primary, their results are cached
+    auth_session = SessionContextManager(request)
+    async with auth_session:
+        assert auth_session.session is db_session
+
+    # outside a request read-only blocks get a private session from the read-only factory
+    private_session = AsyncMock()
+    late_uow = UnitOfWork.read_only()
+    late_uow.session_factory = Mock(return_value=private_session)
+    async with late_uow:
+        await late_uow.commit()
+    private_session.commit.assert_not_awaited()
+    private_session.rollback.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_jwt_service_get_current_user_from_token():
+    permissions = UserPermissions(can_view_users=True, can_add_users=False, can_ban_users=False,
+                                  can_delete_users=False, can_edit_user_profile=False,
+                                  can_edit_user_permissions=False, super_user=False)
+    user = UserDTO(id=5, name="Name", email="user@example.com", username="user", password=None, banned=False,
+                   permissions=permissions, excluded_category_ids=[3], token_version=2,
+                   created_at=datetime.datetime(2024, 2, 6, 12, 0))
+    _, access_token, _ = JWTService.create_tokens(JWTService.get_token_data(user))
+
+    with patch('src.services.users.auth.token_versions.get', AsyncMock(return_value=2)), \
+            patch('src.services.users.auth.SessionContextManager',
+                  side_effect=AssertionError("DB must not be used")):
+        current_user = await JWTService.get_current_user(access_token)
+    assert current_user.id == 5
+    assert current_user.permissions.can_view_users
+    assert current_user.excluded_category_ids == [3]
+    assert current_user.created_at == user.created_at
+
+    with patch('src.services.users.auth.token_versions.get', AsyncMock(return_value=3)):
+        with pytest.raises(exceptions.UnauthorizedHTTPException):
+            await JWTService.get_current_user(access_token)
+
+
+@pytest.mark.asyncio
+async def test_bounded_executor_rejects_when_overloaded():
+    executor = BoundedExecutor(kind='thread', workers=1, max_queue=1, queue_timeout=0.05)
+    hashed = PasswordService.get_password_hash("secret")
+
+    results = await asyncio.gather(
+        executor.run(time.sleep, 0.2),
+        executor.run(PasswordService.verify_password, "secret", hashed),
+        executor.run(PasswordService.verify_password, "secret", hashed),
+        return_exceptions=True,
+    )
+    assert results[0] is None
+    assert all(isinstance(res, exceptions.ServiceUnavailableHTTPException) for res in results[1:])
+    assert executor.stats()["rejected"] == 2
+    assert executor.stats()["completed"] == 1
+    executor.shutdown()
+
+    assert await PasswordService.averify_password("secret", hashed)
+
+
+@pytest.mark.asyncio
+async def test_users_service_edit_revokes_tokens(monkeypatch):
+    mock_uow = AsyncMock(spec=UnitOfWork)
+    mock_uow.users = AsyncMock()
+    mock_uow.users.get_one.return_value = Mock(id=5)
+    mock_uow.users.bump_token_version.return_value = 3
+    mock_uow.books = AsyncMock()
+    mock_uow.books.categories_repo.add_missing.return_value = {}
+    mock_uow.books.categories_repo.get_ids.return_value = {"Horror": 4}
+    set_version = AsyncMock()
+    monkeypatch.setattr('src.services.users.users.token_versions.set', set_version)
+    bump = AsyncMock()
+    monkeypatch.setattr('src.services.users.users.cache_tags.bump', bump)
+
+    current_user = Mock(id=5)
+    await UsersService.edit(mock_uow, current_user, None, UserUpdateSchema(excluded_categories=["Horror"]))
+    mock_uow.users.edit_one.assert_awaited_once_with(5, {"excluded_category_ids": [4]})
+    # tokens still carrying the old excluded categories are rejected from now on
+    mock_uow.users.bump_token_version.assert_awaited_once_with(5)
+    set_version.assert_awaited_once_with(5, 3)
+    bump.assert_awaited_once_with(user_tag(5))
+
+
+@pytest.mark.asyncio
+async def test_users_service_edit_new_excluded_category_invalidates_catalog(monkeypatch):
+    mock_uow = AsyncMock(spec=UnitOfWork)
+    mock_uow.users = AsyncMock()
+    mock_uow.users.get_one.return_value = Mock(id=5)
+    mock_uow.books = AsyncMock()
+    mock_uow.books.categories_repo.add_missing.return_value = {"Gothic": 9}
+    mock_uow.books.categories_repo.get_ids.return_value = {"Horror": 4}
+    monkeypatch.setattr('src.services.users.users.token_versions.set', AsyncMock())
+    bump = AsyncMock()
+    monkeypatch.setattr('src.services.users.users.cache_tags.bump', bump)
+
+    await UsersService.edit(mock_uow, Mock(id=5), None, UserUpdateSchema(excluded_categories=["Horror", "Gothic"]))
+    mock_uow.books.categories_repo.get_ids.assert_awaited_once_with(["Horror"])
+    assert mock_uow.users.edit_one.await_args.args[1] == {"excluded_category_ids": [4, 9]}
+    # the new category shows up in the cached category list
+    bump.assert_awaited_once_with(user_tag(5), CATALOG_TAG)
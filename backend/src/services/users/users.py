@@ -1,3 +1,6 @@
+from src.cache.auth import api_key_auth_cache
+from src.cache.tags import CATALOG_TAG, cache_tags, user_tag
+from src.cache.token_versions import token_versions
 from src.schemas.users import UserDTO, UserPermissions, UserCreateSchema, UserUpdateSchema
 from .auth import PasswordService
 
@@ -21,13 +24,17 @@ class UsersService:
             user = await uow.users.get_one_by_username(user_create.username)
             if user is not None:
                 raise exceptions.NotAcceptableHTTPException("There is already an account with the same username")
-            user_create.password = PasswordService.get_password_hash(user_create.password)
+            user_create.password = await PasswordService.aget_password_hash(user_create.password)
             user_id = await uow.users.add_one(user_create.model_dump())
             if user_create.permissions.super_user:
                 new_permissions = current_user.permissions
                 new_permissions.super_user = False
                 await uow.users.edit_one(current_user.id, {"permissions": new_permissions.model_dump()})
+                current_user_token_version = await uow.users.bump_token_version(current_user.id)
             await uow.commit()
+        if user_create.permissions.super_user:
+            await api_key_auth_cache.invalidate_user(current_user.id)
+            await token_versions.set(current_user.id, current_user_token_version)
         return user_id
 
     @classmethod
@@ -41,7 +48,7 @@ class UsersService:
         if not current_user.permissions.can_view_users and current_user.id != user_id:
             raise exceptions.ForbiddenHTTPException()
         async with uow:
-            user = await uow.users.get_one(id=user_id)
+            user = await uow.users.get_row(id=user_id)
             if user is None:
                 raise exceptions.NotFoundHTTPException()
             await uow.commit()
@@ -62,8 +69,29 @@ class UsersService:
             user = await uow.users.get_one(id=user_id)
             if user is None:
                 raise exceptions.NotFoundHTTPException()
-            await uow.users.edit_one(user.id, user_update.model_dump(exclude_none=True))
+            values = user_update.model_dump(exclude_none=True)
+            created_categories = {}
+            if "excluded_categories" in values:
+                # categories that are not in the catalog yet are created, so their books are excluded once added
+                names = values.pop("excluded_categories")
+                created_categories = await uow.books.categories_repo.add_missing(names)
+                category_ids = await uow.books.categories_repo.get_ids(
+                    [name for name in names if name not in created_categories]
+                )
+                values["excluded_category_ids"] = sorted({**created_categories, **category_ids}.values())
+            await uow.users.edit_one(user.id, values)
+            # JWT requests are served from the profile snapshot in the token claims, including the excluded
+            # categories, so the user's tokens are revoked
+            token_version = await uow.users.bump_token_version(user.id)
             await uow.commit()
+        await api_key_auth_cache.invalidate_user(user_id)
+        await token_versions.set(user_id, token_version)
+        # cached responses are keyed by the user id only, excluded categories may have changed
+        tags = [user_tag(user_id)]
+        if created_categories:
+            # the new categories belong in the cached /books/categories response
+            tags.append(CATALOG_TAG)
+        await cache_tags.bump(*tags)
 
     @classmethod
     async def change_permissions(cls,
@@ -85,11 +113,18 @@ class UsersService:
             if user.permissions.can_edit_user_permissions and not current_user.permissions.super_user:
                 raise exceptions.ForbiddenHTTPException()
             await uow.users.edit_one(user_id, {"permissions": permissions.model_dump()})
+            token_version = await uow.users.bump_token_version(user_id)
             if permissions.super_user:
                 new_permissions = current_user.permissions
                 new_permissions.super_user = False
                 await uow.users.edit_one(current_user.id, {"permissions": new_permissions.model_dump()})
+                current_user_token_version = await uow.users.bump_token_version(current_user.id)
             await uow.commit()
+        await api_key_auth_cache.invalidate_user(user_id)
+        await token_versions.set(user_id, token_version)
+        if permissions.super_user:
+            await api_key_auth_cache.invalidate_user(current_user.id)
+            await token_versions.set(current_user.id, current_user_token_version)
 
     @classmethod
     async def ban(cls,
@@ -101,4 +136,7 @@ class UsersService:
             raise exceptions.ForbiddenHTTPException()
         async with uow:
             await uow.users.edit_one(user_id, {"banned": True})
+            token_version = await uow.users.bump_token_version(user_id)
             await uow.commit()
+        await api_key_auth_cache.invalidate_user(user_id)
+        await token_versions.set(user_id, token_version)
@@ -61,3 +61,8 @@ class ImUsedHTTPException(AbstractHttpException):
     _status_code = status.HTTP_226_IM_USED
     _detail = "Im used ;D"
     _description = "Email уже активирован. Можно продолжить регистрацию."
+
+
+class ServiceUnavailableHTTPException(AbstractHttpException):
+    _status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    _detail = "Service is overloaded, try again later"
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from src.utils import exceptions
+
+T = TypeVar('T')
+
+
+class BoundedExecutor:
+    """
+    Runs blocking functions in a thread or process pool with bounded concurrency.
+
+    At most `workers` calls run at once and at most `max_queue` calls wait for a free worker. A call that
+    finds the queue full or waits longer than `queue_timeout` seconds is rejected with 503.
+    """
+    def __init__(self, kind: str, workers: int, max_queue: int, queue_timeout: float):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor kind '{kind}', expected 'thread' or 'process'")
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(workers)
+
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.
+        self.max_seconds = 0.
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise exceptions.ServiceUnavailableHTTPException()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise exceptions.ServiceUnavailableHTTPException()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.running -= 1
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            self._semaphore.release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_seconds": self.total_seconds / self.completed if self.completed else 0.,
+            "max_seconds": self.max_seconds,
+        }
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bounded-executor')
+        return self._executor
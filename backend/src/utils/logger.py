@@ -1,7 +1,114 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import zipfile
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable
+
 from loguru import logger
 
 from config.server import server_settings
 
 
-logger.add('logs/debug.json', level=server_settings.LOG_LEVEL, rotation='5 MB', compression='zip', serialize=True)
+class BoundedQueueSink:
+    """
+    Loguru sink that hands formatted records to a background writer thread through a bounded queue.
+
+    The caller only formats the record and puts it in the queue, the write itself happens in the writer
+    thread. When the queue is full the record is dropped and counted instead of blocking the event loop.
+    """
+    def __init__(self, write: Callable[[str], None], max_queue: int, name: str):
+        self._write = write
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._write_loop, name=f'log-writer-{name}', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def write(self, message: str) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _write_loop(self) -> None:
+        stopped = False
+        while not stopped:
+            # write everything queued so far in one go
+            messages = [self._queue.get()]
+            while len(messages) < 1000:
+                try:
+                    messages.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in messages:
+                stopped = True
+                messages = [message for message in messages if message is not None]
+            if not messages:
+                continue
+            try:
+                self._write(''.join(messages))
+            except Exception as e:
+                print(f"Error writing log records: {e!r}", file=sys.stderr)
+
+
+def _zip_rotator(source: str, dest: str) -> None:
+    with zipfile.ZipFile(dest, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.write(source, os.path.basename(source))
+    os.remove(source)
+
+
+def rotating_file_writer(path: str, max_bytes: int, backup_count: int) -> Callable[[str], None]:
+    # like the loguru file sink, create the directory (it is only mounted under docker-compose)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+    handler.namer = lambda name: f"{name}.zip"
+    handler.rotator = _zip_rotator
+
+    def write(message: str) -> None:
+        handler.handle(logging.makeLogRecord({"msg": message.rstrip('\n')}))
+    return write
+
+
+def stream_writer(stream) -> Callable[[str], None]:
+    def write(message: str) -> None:
+        stream.write(message)
+        stream.flush()
+    return write
+
+
+def log_payload(message: str, payload: Any) -> None:
+    """Logs a sample (LOG_PAYLOAD_SAMPLE_RATE) of large payloads, truncated to LOG_PAYLOAD_MAX_CHARS"""
+    if random.random() >= server_settings.LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    text = repr(payload)
+    if len(text) > server_settings.LOG_PAYLOAD_MAX_CHARS:
+        text = f"{text[:server_settings.LOG_PAYLOAD_MAX_CHARS]}... ({len(text)} chars)"
+    logger.debug(f"{message}: {text}")
+
+
+logger.remove()
+logger.add(
+    BoundedQueueSink(stream_writer(sys.stderr), server_settings.LOG_QUEUE_SIZE, 'stderr'),
+    level=server_settings.LOG_LEVEL,
+)
+logger.add(
+    BoundedQueueSink(
+        rotating_file_writer('logs/debug.json', server_settings.LOG_MAX_BYTES, server_settings.LOG_BACKUP_COUNT),
+        server_settings.LOG_QUEUE_SIZE,
+        'file',
+    ),
+    level=server_settings.LOG_LEVEL,
+    serialize=True,
+)
 logger.opt(exception=True)
@@ -0,0 +1,22 @@
+import base64
+import json
+from typing import Any
+
+from src.utils import exceptions
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: list[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise exceptions.NotAcceptableHTTPException("Invalid cursor")
+    if not isinstance(values, list):
+        raise exceptions.NotAcceptableHTTPException("Invalid cursor")
+    return values
@@ -1,12 +1,16 @@
 from abc import ABC, abstractmethod
-from typing import TypeVar, Generic
+from typing import Any, Mapping, Sequence, TypeVar, Generic
 
 from pydantic import BaseModel
-from sqlalchemy import Table, insert, select, update, delete, and_
+from sqlalchemy import Column, Select, Table, insert, select, update, delete, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.database import async_session_maker
 from src.database.metadata import Base
+from src.schemas.pagination import PageDTO
+from src.utils import exceptions
+from src.utils.pagination import encode_cursor, decode_cursor
 
 SchemaType = TypeVar('SchemaType', bound=BaseModel)
 
@@ -39,6 +43,18 @@ class AbstractRepository(ABC):
     async def get_all_with_filters(self, **filter_by) -> list[SchemaType]:
         pass
 
+    @abstractmethod
+    async def get_row(self, columns: Sequence[str] | None = None, **filter_by) -> SchemaType | None:
+        pass
+
+    @abstractmethod
+    async def get_rows(self, columns: Sequence[str] | None = None, **filter_by) -> list[SchemaType]:
+        pass
+
+    @abstractmethod
+    async def get_page(self, limit: int, cursor: str | None = None, **filter_by) -> PageDTO[SchemaType]:
+        pass
+
     @abstractmethod
     async def delete(self, **filter_by) -> None:
         pass
@@ -46,6 +62,10 @@ class AbstractRepository(ABC):
 
 class SQLAlchemyRepository(Generic[SchemaType], AbstractRepository):
     model: Base = None
+    dto: type[SchemaType] = None
+    # columns selected by the projection read path when the caller does not choose a subset,
+    # by default every column of `model` that is a field of `dto`
+    dto_columns: tuple[str, ...] = None
 
     def __init__(self, session: AsyncSession | None = None):
         if session is None:
@@ -86,10 +106,64 @@ class SQLAlchemyRepository(Generic[SchemaType], AbstractRepository):
         res = res.all()
         return [row[0].to_DTO() for row in res]
 
+    async def get_row(self, columns: Sequence[str] | None = None, **filter_by) -> SchemaType | None:
+        stmt = select(*self._projection(columns)).filter_by(**filter_by)
+        res = await self.session.execute(stmt)
+        row = res.mappings().one_or_none()
+        return None if row is None else self._row_to_DTO(row, partial=columns is not None)
+
+    async def get_rows(self, columns: Sequence[str] | None = None, **filter_by) -> list[SchemaType]:
+        """
+        Projection read path: selects only `columns` (`dto_columns` by default) with Core and builds DTOs
+        straight from the rows, without hydrating ORM entities. DTOs of a column subset only have those
+        fields set.
+        """
+        stmt = select(*self._projection(columns)).filter_by(**filter_by)
+        res = await self.session.execute(stmt)
+        partial = columns is not None
+        return [self._row_to_DTO(row, partial) for row in res.mappings()]
+
+    async def get_page(self, limit: int, cursor: str | None = None, **filter_by) -> PageDTO[SchemaType]:
+        stmt = select(*self._projection()).filter_by(**filter_by)
+        return await self._get_page(stmt, limit, cursor)
+
     async def delete(self, **filter_by) -> None:
         stmt = delete(self.model).filter_by(**filter_by)
         await self.session.execute(stmt)
 
+    def _projection(self, columns: Sequence[str] | None = None) -> list[Column]:
+        if columns is None:
+            if self.dto_columns is None:
+                type(self).dto_columns = tuple(
+                    column.key for column in self.model.__table__.c if column.key in self.dto.model_fields
+                )
+            columns = self.dto_columns
+        return [self.model.__table__.c[name] for name in columns]
+
+    def _row_to_DTO(self, row: Mapping[str, Any], partial: bool = False) -> SchemaType:
+        if partial:
+            return self.dto.model_construct(**row)
+        return self.dto(**row)
+
+    async def _get_page(self, stmt: Select, limit: int, cursor: str | None = None) -> PageDTO[SchemaType]:
+        """
+        Keyset pagination ordered by id: the opaque cursor holds the last id of the previous page.
+        `stmt` must select the `_projection()` columns.
+        """
+        if cursor is not None:
+            values = decode_cursor(cursor)
+            if len(values) != 1 or not isinstance(values[0], int):
+                raise exceptions.NotAcceptableHTTPException("Invalid cursor")
+            stmt = stmt.where(self.model.id > values[0])
+        stmt = stmt.order_by(self.model.id).limit(limit + 1)
+        res = await self.session.execute(stmt)
+        items = [self._row_to_DTO(row) for row in res.mappings()]
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor([items[-1].id])
+        return PageDTO(items=items, next_cursor=next_cursor)
+
 
 class M2MRepository(Generic[SchemaType]):
     def __init__(self, session: AsyncSession, associations_table: Table, schema: BaseModel):
@@ -115,10 +189,29 @@ class M2MRepository(Generic[SchemaType]):
     #     res = await self.session.execute(stmt)
     #     return [self.schema.model_validate(row[0], from_attributes=True) for row in res.all()]
 
+    async def get_right_ids(self, left_ids: list[int]) -> list[int]:
+        if not left_ids:
+            return []
+        stmt = select(self.associations_table.c.right_id).where(
+            self.associations_table.c.left_id.in_(left_ids)
+        ).distinct()
+        res = await self.session.execute(stmt)
+        return list(res.scalars().all())
+
     async def add_association(self, left_id: int, right_id: int) -> None:
         stmt = self.associations_table.insert().values(left_id=left_id, right_id=right_id)
         await self.session.execute(stmt)
 
+    async def add_associations(self, pairs: list[tuple[int, int]]) -> set[tuple[int, int]]:
+        """Inserts all pairs in one statement and returns the pairs that did not exist before"""
+        if not pairs:
+            return set()
+        stmt = pg_insert(self.associations_table).values(
+            [{"left_id": left_id, "right_id": right_id} for left_id, right_id in pairs]
+        ).on_conflict_do_nothing().returning(self.associations_table.c.left_id, self.associations_table.c.right_id)
+        res = await self.session.execute(stmt)
+        return {(row.left_id, row.right_id) for row in res.all()}
+
     async def del_association(self, left_id: int, right_id: int) -> None:
         stmt = self.associations_table.delete().where(
             and_(self.associations_table.c.left_id == left_id,
@@ -1,7 +1,30 @@
+from typing import Any
+
+import orjson
 from fastapi import status
+from pydantic import BaseModel
 from starlette.responses import JSONResponse
 
 
+def _orjson_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson.
+
+    Routes return it to skip FastAPI's `response_model` revalidation and `jsonable_encoder`: DTOs built from
+    trusted rows are dumped as is. Pre-encoded `bytes` (e.g. a cached response body) are sent unchanged.
+    """
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, default=_orjson_default)
+
+
 class ObjectCreated:
     docs = {
         status.HTTP_200_OK: {
@@ -1,12 +1,33 @@
 import uuid
 from abc import ABC, abstractmethod
+from time import perf_counter
+from typing import AsyncIterator
 
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
 from starlette.requests import Request
 
-from src.database.database import async_session_maker
+from config.db import db_settings
+from src.database.database import async_readonly_session_maker, async_session_maker
+from src.metrics import db_connection_wait_seconds, db_session_duration_seconds, db_sessions_open
 from src.utils.logger import logger
 
 
+@event.listens_for(Session, 'do_orm_execute')
+def _start_connection_wait(orm_execute_state) -> None:
+    # the first statement outside a transaction checks a connection out of the pool
+    if not orm_execute_state.session.in_transaction():
+        orm_execute_state.session.info['connection_wait_start'] = perf_counter()
+
+
+@event.listens_for(Session, 'after_begin')
+def _end_connection_wait(session, transaction, connection) -> None:
+    start = session.info.pop('connection_wait_start', None)
+    if start is not None:
+        db_connection_wait_seconds.observe(perf_counter() - start)
+
+
 class AbstractSessionContextManager(ABC):
     @abstractmethod
     async def __aenter__(self):
@@ -25,12 +46,84 @@ class AbstractSessionContextManager(ABC):
         raise NotImplementedError
 
 
+class RequestSession:
+    """
+    One AsyncSession per request, shared by every SessionContextManager created with the request: auth
+    dependencies, UnitOfWork and ad-hoc repositories check out at most one pooled connection between them.
+
+    The connection is checked out lazily by the first statement. Every outermost block ends its transaction
+    on exit (rollback unless committed), which returns the connection to the pool between blocks: it is not
+    kept from the auth lookup through a handler's upstream calls, and it is released right after the
+    handler's last DB call rather than when the response is sent. Whatever is still open is rolled back by
+    `close()` when the request ends. Not meant for concurrent use.
+
+    Read-only blocks share a second RequestSession on the replica; without a replica they share this one.
+    """
+    def __init__(self, session_factory: async_sessionmaker, session_id: str):
+        self.session_factory = session_factory
+        self.session_id = session_id
+        self.closed = False
+
+        self._session: AsyncSession | None = None
+        self._depth = 0
+        self._opened_at = 0.
+
+    def enter(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self.session_factory()
+            self._opened_at = perf_counter()
+            db_sessions_open.inc()
+            logger.debug(f"{self.session_id} - Request session created")
+        self._depth += 1
+        return self._session
+
+    async def exit(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            await self._session.rollback()
+
+    async def close(self) -> None:
+        self.closed = True
+        if self._session is None:
+            return
+        await self._session.close()
+        self._session = None
+        db_sessions_open.dec()
+        db_session_duration_seconds.observe(perf_counter() - self._opened_at)
+        logger.debug(f"{self.session_id} - Request session closed")
+
+
+async def request_session(request: Request) -> AsyncIterator[RequestSession]:
+    """
+    Router dependency that opens the request's RequestSession (`request.state.db_session`) and the one for
+    read-only blocks (`request.state.db_readonly_session`)
+    """
+    session_id = getattr(request.state, 'session_id', None) or str(uuid.uuid4())
+    db_session = RequestSession(async_session_maker, session_id)
+    if db_settings.REPLICA_DSN is None:
+        # a read-only block may open the transaction the handler writes in, so it is not made read-only
+        db_readonly_session = db_session
+    else:
+        db_readonly_session = RequestSession(async_readonly_session_maker, session_id)
+    request.state.db_session = db_session
+    request.state.db_readonly_session = db_readonly_session
+    try:
+        yield db_session
+    finally:
+        await db_session.close()
+        if db_readonly_session is not db_session:
+            await db_readonly_session.close()
+
+
 class SessionContextManager:
 
     def __init__(self, request: Request = None) -> None:
         self._session = None
+        self._request_session: RequestSession | None = None
 
+        self.readonly = False
         self.session_factory = async_session_maker
+        self.request = request
 
         if request is not None:
             self.session_id = request.state.session_id
@@ -38,6 +131,20 @@ class SessionContextManager:
             logger.debug("Request was not set. May not called in http endpoint")
             self.session_id = str(uuid.uuid4())
 
+    @classmethod
+    def read_only(cls, request: Request = None) -> 'SessionContextManager':
+        """
+        For pure reads: the transaction runs on the read replica (the primary if DB__REPLICA_HOST is unset) as
+        `READ ONLY`. commit() is skipped; the block ends with a rollback. Usable as a dependency.
+
+        Not for reads that fill the tag-keyed response cache: right after a write bumps a tag, a lagging
+        replica would return the old rows and they would be cached under the new generation for the whole TTL.
+        """
+        session = cls(request)
+        session.readonly = True
+        session.session_factory = async_readonly_session_maker
+        return session
+
     @property
     def session(self):
         if self._session is None:
@@ -51,18 +158,40 @@ class SessionContextManager:
             raise RuntimeError("An attempt was made to initialize a session in another session. Possibly called "
                                "'async with' construct in another 'async with' construct")
         self._session = value
+        if self._request_session is not None:
+            return
+        self._opened_at = perf_counter()
+        db_sessions_open.inc()
         logger.debug(f"{self.session_id} - Session created and set")
 
     async def __aenter__(self):
-        self.session = self.session_factory()
+        self.session = self._open_session()
 
     async def __aexit__(self, *args):
+        if self._request_session is not None:
+            self._session = None
+            request_session, self._request_session = self._request_session, None
+            await request_session.exit()
+            return
         await self.rollback()
         await self._session.close()
         self._session = None
+        db_sessions_open.dec()
+        db_session_duration_seconds.observe(perf_counter() - self._opened_at)
         logger.debug(f"{self.session_id} - Session closed")
 
+    def _open_session(self) -> AsyncSession:
+        """The request's shared session while the request is being handled, a private one otherwise"""
+        attribute = 'db_readonly_session' if self.readonly else 'db_session'
+        request_session = getattr(self.request.state, attribute, None) if self.request is not None else None
+        if request_session is not None and not request_session.closed:
+            self._request_session = request_session
+            return request_session.enter()
+        return self.session_factory()
+
     async def commit(self):
+        if self.readonly:
+            return
         await self.session.commit()
 
     async def rollback(self):
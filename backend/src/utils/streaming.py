@@ -0,0 +1,34 @@
+from typing import AsyncIterable, AsyncIterator
+
+from pydantic import BaseModel
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+async def encode_json_stream(items: AsyncIterable[BaseModel],
+                             ndjson: bool,
+                             chunk_size: int,
+                             ) -> AsyncIterator[bytes]:
+    """
+    Encodes models one by one as NDJSON lines or as elements of a JSON array.
+
+    Encoded items are buffered and flushed once the buffer reaches `chunk_size` bytes, so the response is
+    written in a few large chunks instead of one tiny chunk per item.
+    """
+    separator = b'\n' if ndjson else b','
+    buffer = bytearray() if ndjson else bytearray(b'[')
+    first = True
+    async for item in items:
+        if not ndjson and not first:
+            buffer += separator
+        buffer += item.__pydantic_serializer__.to_json(item)
+        if ndjson:
+            buffer += separator
+        first = False
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if not ndjson:
+        buffer += b']'
+    if buffer:
+        yield bytes(buffer)
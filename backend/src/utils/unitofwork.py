@@ -15,7 +15,7 @@ class UnitOfWork(SessionContextManager):
     async def __aenter__(self):
         if self._session is not None:
             raise RuntimeError("Session init in other session")
-        self.session = self.session_factory()
+        self.session = self._open_session()
         self.init_repositories()
 
     def init_repositories(self):
@@ -1,4 +1,5 @@
 import random
+import re
 import string
 
 
@@ -13,3 +14,17 @@ def generate_random_string(length: int, only_digits: bool = False, only_letters:
     crypt_rand_string = ''.join(random.choice(array)
                                 for i in range(length))
     return crypt_rand_string
+
+
+def normalize_isbn(isbn: str | None) -> str | None:
+    """Keeps only digits and the 'X' check digit, so '0-440-33570-x' and '044033570X' are the same ISBN"""
+    if isbn is None:
+        return None
+    return re.sub(r'[^0-9X]', '', isbn.upper()) or None
+
+
+def split_names(names: str | None) -> list[str]:
+    """Categories and authors of Google Books books come joined with ', '; empty and repeated names are dropped"""
+    if not names:
+        return []
+    return list(dict.fromkeys(name.strip() for name in names.split(', ') if name.strip()))
@@ -0,0 +1,386 @@
+"""
+Bulk loads synthetic users, API keys, books (with categories and authors) and library associations, so query
+plans and indexes can be checked at production size.
+
+Rows are streamed with COPY by `--jobs` worker processes, chunk by chunk. Every chunk draws from its own
+random generator seeded by (`--seed`, table, chunk), so the same seed loaded into the same database gives
+the same rows no matter how many jobs run. New rows get ids after the existing ones, and category and author
+names are derived from those ids, so seeding an already seeded database again adds new names.
+
+    python -m tools.seed --scale 1 --seed 42           # 10k users, 100k books, ~500k associations
+    python -m tools.seed --scale 100 --jobs 16 --defer-indexes
+
+Distributions: libraries are log-normal (`--library-mean`, a long tail of heavy readers), the books in them
+follow a power law (a few bestsellers are in most libraries), books have 1-3 categories skewed towards the
+popular ones, 1-4 authors and descriptions of 50-400 words. Users log in with `--password`.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import multiprocessing
+import random
+import string
+import time
+from typing import Iterator, NamedTuple
+
+import asyncpg
+
+from config.api_key import api_key_settings
+from config.db import db_settings
+from src.utils import password_hashing
+
+CHUNK_SIZE = 50_000
+
+SUBJECTS = (
+    'Computers', 'Programming', 'Fiction', 'Science', 'History', 'Mathematics', 'Philosophy', 'Art', 'Music',
+    'Business & Economics', 'Juvenile Fiction', 'Biography & Autobiography', 'Cooking', 'Medical', 'Religion',
+    'Travel', 'Poetry', 'Psychology', 'Education', 'Law', 'Political Science', 'Sports & Recreation', 'Nature',
+)
+TOPICS = (
+    'General', 'History', 'Reference', 'Essays', 'Study & Teaching', 'Criticism', 'Methods', 'Theory',
+    'Research', 'Anthologies', 'Popular Culture', 'Modern', 'Ancient', 'Europe', 'Asia', 'Americas',
+)
+FIRST_NAMES = (
+    'Ada', 'Alan', 'Grace', 'Edsger', 'Barbara', 'Donald', 'Frances', 'John', 'Margaret', 'Niklaus', 'Anna',
+    'Leo', 'Fyodor', 'Jane', 'Mary', 'Charles', 'Virginia', 'Ernest', 'Agatha', 'Isaac', 'Ursula', 'Toni',
+)
+LAST_NAMES = (
+    'Lovelace', 'Turing', 'Hopper', 'Dijkstra', 'Liskov', 'Knuth', 'Allen', 'Backus', 'Hamilton', 'Wirth',
+    'Tolstoy', 'Dostoevsky', 'Austen', 'Shelley', 'Dickens', 'Woolf', 'Hemingway', 'Christie', 'Asimov',
+    'Le Guin', 'Morrison', 'Orwell',
+)
+WORDS = (
+    'python', 'systems', 'design', 'data', 'history', 'theory', 'practice', 'introduction', 'modern', 'art',
+    'algorithms', 'networks', 'story', 'guide', 'patterns', 'programming', 'science', 'world', 'language',
+    'mind', 'war', 'peace', 'journey', 'city', 'night', 'garden', 'river', 'empire', 'machine', 'secret',
+    'life', 'time', 'light', 'house', 'children', 'stars', 'sea', 'winter', 'memory', 'code', 'logic',
+)
+LANGUAGES = ('en', 'en', 'en', 'en', 'de', 'fr', 'ru', 'es', 'it')
+PERMISSIONS = json.dumps({
+    "can_view_users": False,
+    "can_add_users": False,
+    "can_ban_users": False,
+    "can_delete_users": False,
+    "can_edit_user_profile": False,
+    "can_edit_user_permissions": False,
+    "super_user": False,
+})
+
+TABLE_COLUMNS = {
+    'categories': ('id', 'name'),
+    'authors': ('id', 'name'),
+    'users': ('id', 'name', 'email', 'username', 'password', 'banned', 'permissions', 'excluded_category_ids',
+              'token_version', 'created_at'),
+    'books': ('id', 'gb_id', 'ISBN', 'title', 'subtitle', 'description', 'language', 'pub_date', 'categories',
+              'category_ids', 'authors', 'author_ids'),
+    'user_api_keys': ('id', 'key', 'user_id', 'expire_date', 'created_at'),
+    'books_users_associations': ('left_id', 'right_id'),
+}
+# tables that reference each other are loaded in separate phases
+PHASES = (('categories', 'authors', 'users'), ('books',), ('user_api_keys', 'books_users_associations'))
+SEQUENCE_TABLES = ('categories', 'authors', 'users', 'books', 'user_api_keys')
+
+
+class Plan(NamedTuple):
+    """Ids of the new rows are `first_ids[table] + 1 ...`; `counts` is the number of rows per id range"""
+    seed: int
+    first_ids: dict[str, int]
+    counts: dict[str, int]
+    keys_per_user: int
+    library_mean: float
+    popularity_skew: float
+    password_hash: str
+    key_length: int
+
+
+class Chunk(NamedTuple):
+    table: str
+    start: int
+    count: int
+
+
+# DATA
+def category_name(id: int) -> str:
+    index = id - 1
+    subject = SUBJECTS[index % len(SUBJECTS)]
+    topic = TOPICS[index // len(SUBJECTS) % len(TOPICS)]
+    cycle = index // (len(SUBJECTS) * len(TOPICS))
+    return f"{subject} / {topic}" + (f" {cycle + 1}" if cycle else '')
+
+
+def author_name(id: int) -> str:
+    index = id - 1
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[index // len(FIRST_NAMES) % len(LAST_NAMES)]
+    cycle = index // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return f"{first} {last}" + (f" {cycle + 1}" if cycle else '')
+
+
+def skewed_index(rnd: random.Random, count: int, skew: float) -> int:
+    """Index in [0, count) where small indexes are much more likely (a power law for skew > 1)"""
+    return min(count - 1, int(count * rnd.random() ** skew))
+
+
+def isbn10(rnd: random.Random) -> str:
+    digits = [rnd.randrange(10) for _ in range(9)]
+    check = (11 - sum((10 - i) * digit for i, digit in enumerate(digits)) % 11) % 11
+    return ''.join(map(str, digits)) + ('X' if check == 10 else str(check))
+
+
+def random_string(rnd: random.Random, length: int, alphabet: str = string.ascii_letters + string.digits) -> str:
+    return ''.join(rnd.choices(alphabet, k=length))
+
+
+def chunk_random(plan: Plan, chunk: Chunk) -> random.Random:
+    return random.Random(f"{plan.seed}:{chunk.table}:{chunk.start}")
+
+
+def category_rows(plan: Plan, chunk: Chunk) -> Iterator[tuple]:
+    for index in range(chunk.start, chunk.start + chunk.count):
+        id = plan.first_ids['categories'] + index + 1
+        yield id, category_name(id)
+
+
+def author_rows(plan: Plan, chunk: Chunk) -> Iterator[tuple]:
+    for index in range(chunk.start, chunk.start + chunk.count):
+        id = plan.first_ids['authors'] + index + 1
+        yield id, author_name(id)
+
+
+def user_rows(plan: Plan, chunk: Chunk) -> Iterator[tuple]:
+    rnd = chunk_random(plan, chunk)
+    categories = plan.counts['categories']
+    for index in range(chunk.start, chunk.start + chunk.count):
+        id = plan.first_ids['users'] + index + 1
+        excluded = sorted({
+            plan.first_ids['categories'] + skewed_index(rnd, categories, 2) + 1 for _ in range(rnd.randint(1, 3))
+        }) if rnd.random() < 0.1 else []
+        yield (
+            id,
+            f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+            f"seed{id}@example.com",
+            f"seed{id}",
+            plan.password_hash,
+            index > 0 and rnd.random() < 0.01,
+            PERMISSIONS,
+            excluded,
+            0,
+            datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=rnd.randrange(4 * 365 * 24 * 3600)),
+        )
+
+
+def book_rows(plan: Plan, chunk: Chunk) -> Iterator[tuple]:
+    rnd = chunk_random(plan, chunk)
+    categories, authors = plan.counts['categories'], plan.counts['authors']
+    for index in range(chunk.start, chunk.start + chunk.count):
+        id = plan.first_ids['books'] + index + 1
+        category_ids = list(dict.fromkeys(
+            plan.first_ids['categories'] + skewed_index(rnd, categories, 2) + 1 for _ in range(rnd.randint(1, 3))
+        ))
+        author_ids = list(dict.fromkeys(
+            plan.first_ids['authors'] + rnd.randrange(authors) + 1 for _ in range(rnd.choice((1, 1, 1, 2, 2, 3, 4)))
+        ))
+        yield (
+            id,
+            f"S{id:011d}",
+            isbn10(rnd) if rnd.random() < 0.9 else None,
+            ' '.join(rnd.sample(WORDS, rnd.randint(1, 5))).capitalize(),
+            ' '.join(rnd.sample(WORDS, rnd.randint(2, 6))) if rnd.random() < 0.4 else None,
+            ' '.join(rnd.choices(WORDS, k=rnd.randint(50, 400))),
+            rnd.choice(LANGUAGES),
+            f"{rnd.randint(1900, 2024)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            ', '.join(map(category_name, category_ids)),
+            category_ids,
+            ', '.join(map(author_name, author_ids)),
+            author_ids,
+        )
+
+
+def api_key_rows(plan: Plan, chunk: Chunk) -> Iterator[tuple]:
+    """`chunk` is a range of users; every user gets `keys_per_user` keys"""
+    rnd = chunk_random(plan, chunk)
+    today = datetime.date.today()
+    for index in range(chunk.start, chunk.start + chunk.count):
+        for key_index in range(plan.keys_per_user):
+            yield (
+                plan.first_ids['user_api_keys'] + index * plan.keys_per_user + key_index + 1,
+                random_string(rnd, plan.key_length),
+                plan.first_ids['users'] + index + 1,
+                # the first key of every user is valid, the others may have expired
+                today + datetime.timedelta(days=rnd.randint(-30 if key_index else 30, 365)),
+                datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=rnd.randrange(365 * 24 * 3600)),
+            )
+
+
+def association_rows(plan: Plan, chunk: Chunk) -> Iterator[tuple]:
+    """`chunk` is a range of users; library sizes are log-normal, books are picked by a power law"""
+    rnd = chunk_random(plan, chunk)
+    books = plan.counts['books']
+    sigma = 1.2
+    mu = math.log(plan.library_mean) - sigma ** 2 / 2
+    for index in range(chunk.start, chunk.start + chunk.count):
+        user_id = plan.first_ids['users'] + index + 1
+        size = min(books // 2, int(rnd.lognormvariate(mu, sigma)))
+        library = set()
+        while len(library) < size:
+            library.add(skewed_index(rnd, books, plan.popularity_skew))
+        for book_index in sorted(library):
+            yield plan.first_ids['books'] + book_index + 1, user_id
+
+
+ROWS = {
+    'categories': category_rows,
+    'authors': author_rows,
+    'users': user_rows,
+    'books': book_rows,
+    'user_api_keys': api_key_rows,
+    'books_users_associations': association_rows,
+}
+# row generators that take a range of users instead of a range of their own rows
+PER_USER_TABLES = ('user_api_keys', 'books_users_associations')
+
+
+# LOADING
+async def connect() -> asyncpg.Connection:
+    connection = await asyncpg.connect(
+        host=db_settings.HOST,
+        port=db_settings.PORT,
+        user=db_settings.USER,
+        password=db_settings.PASS,
+        database=db_settings.NAME,
+    )
+    await connection.execute("SET synchronous_commit TO off")
+    return connection
+
+
+async def copy_chunk(plan: Plan, chunk: Chunk) -> int:
+    connection = await connect()
+    try:
+        result = await connection.copy_records_to_table(
+            chunk.table, records=ROWS[chunk.table](plan, chunk), columns=TABLE_COLUMNS[chunk.table]
+        )
+    finally:
+        await connection.close()
+    # result is the COPY command tag, e.g. 'COPY 50000'
+    return int(result.split()[-1])
+
+
+def load_chunk(args: tuple[Plan, Chunk]) -> int:
+    return asyncio.run(copy_chunk(*args))
+
+
+async def max_ids(connection: asyncpg.Connection) -> dict[str, int]:
+    return {table: await connection.fetchval(f'SELECT coalesce(max(id), 0) FROM "{table}"')
+            for table in SEQUENCE_TABLES}
+
+
+async def drop_secondary_indexes(connection: asyncpg.Connection) -> list[str]:
+    """Drops indexes that do not back a constraint and returns their definitions to recreate them"""
+    rows = await connection.fetch("""
+        SELECT i.indexrelid::regclass::text AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        WHERE i.indrelid = ANY($1::regclass[])
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """, list(TABLE_COLUMNS))
+    for row in rows:
+        await connection.execute(f"DROP INDEX {row['name']}")
+    return [row['definition'] for row in rows]
+
+
+async def finish(connection: asyncpg.Connection, index_definitions: list[str]) -> None:
+    for definition in index_definitions:
+        started = time.perf_counter()
+        await connection.execute(definition)
+        print(f"  {definition} ({time.perf_counter() - started:.1f}s)")
+    for table in SEQUENCE_TABLES:
+        await connection.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT coalesce(max(id), 1) FROM \"{table}\"))"
+        )
+    for table in TABLE_COLUMNS:
+        await connection.execute(f'ANALYZE "{table}"')
+
+
+def chunks(plan: Plan, table: str) -> list[Chunk]:
+    # per-user tables produce several rows per user, so they are split into smaller user ranges
+    count = plan.counts['users'] if table in PER_USER_TABLES else plan.counts[table]
+    size = CHUNK_SIZE // 10 if table in PER_USER_TABLES else CHUNK_SIZE
+    return [Chunk(table, start, min(size, count - start)) for start in range(0, count, size)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1., help="multiplies every row count")
+    parser.add_argument('--users', type=int, default=10_000, help="users at scale 1")
+    parser.add_argument('--books', type=int, default=100_000, help="books at scale 1")
+    parser.add_argument('--categories', type=int, default=300)
+    parser.add_argument('--authors-per-book', type=float, default=0.3, help="distinct authors per book")
+    parser.add_argument('--keys-per-user', type=int, default=2)
+    parser.add_argument('--library-mean', type=float, default=50, help="mean library size")
+    parser.add_argument('--popularity-skew', type=float, default=3, help="power of the book popularity law")
+    parser.add_argument('--password', default='password', help="password of every seeded user")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help="drop secondary indexes while loading and rebuild them afterwards")
+    args = parser.parse_args()
+
+    users = max(1, int(args.users * args.scale))
+    books = max(1, int(args.books * args.scale))
+    counts = {
+        'categories': args.categories,
+        'authors': max(1, int(books * args.authors_per_book)),
+        'users': users,
+        'books': books,
+        'user_api_keys': users * args.keys_per_user,
+    }
+
+    async def prepare() -> tuple[dict[str, int], list[str]]:
+        connection = await connect()
+        try:
+            first_ids = await max_ids(connection)
+            index_definitions = await drop_secondary_indexes(connection) if args.defer_indexes else []
+        finally:
+            await connection.close()
+        return first_ids, index_definitions
+
+    first_ids, index_definitions = asyncio.run(prepare())
+    plan = Plan(
+        seed=args.seed,
+        first_ids=first_ids,
+        counts=counts,
+        keys_per_user=args.keys_per_user,
+        library_mean=args.library_mean,
+        popularity_skew=args.popularity_skew,
+        password_hash=password_hashing.get_password_hash(args.password),
+        key_length=api_key_settings.LENGTH,
+    )
+
+    total_started = time.perf_counter()
+    with multiprocessing.Pool(args.jobs) as pool:
+        for phase in PHASES:
+            for table in phase:
+                started = time.perf_counter()
+                rows = sum(pool.imap_unordered(load_chunk, [(plan, chunk) for chunk in chunks(plan, table)]))
+                elapsed = time.perf_counter() - started
+                print(f"{table:<26}{rows:>12,} rows{elapsed:>9.1f}s{rows / elapsed:>12,.0f} rows/s")
+
+    async def finalize() -> None:
+        connection = await connect()
+        try:
+            await finish(connection, index_definitions)
+        finally:
+            await connection.close()
+
+    print("Rebuilding indexes and analyzing tables" if index_definitions else "Analyzing tables")
+    asyncio.run(finalize())
+    print(f"Done in {time.perf_counter() - total_started:.1f}s")
+
+    first_user = Chunk('user_api_keys', 0, 1)
+    _, key, user_id, expire_date, _ = next(api_key_rows(plan, first_user))
+    print(f"User seed{user_id} / {args.password}, API key {key} (expires {expire_date})")
+
+
+if __name__ == '__main__':
+    main()